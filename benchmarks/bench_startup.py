@@ -0,0 +1,47 @@
+"""
+Cold-start benchmark for `import jvbot`.
+
+Each repeat imports jvbot in a fresh interpreter, reports the wall time, and checks that none
+of the heavy optional dependencies were pulled in at import time.
+
+    python benchmarks/bench_startup.py [repeats]
+"""
+import os
+import sys
+import json
+import subprocess
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["PyQt5", "matplotlib", "pandas", "pymeasure", "pyvisa", "frgtools"]
+
+PROBE = f"""
+import sys, time, json
+t0 = time.perf_counter()
+import jvbot
+dt = time.perf_counter() - t0
+print(json.dumps({{"seconds": dt, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def run(repeats=5):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times = []
+    loaded = set()
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded.update(result["loaded"])
+    print(f"import jvbot: median {statistics.median(times)*1000:.1f} ms, min {min(times)*1000:.1f} ms over {repeats} runs")
+    if loaded:
+        print(f"heavy modules imported eagerly: {sorted(loaded)}")
+    else:
+        print("no heavy modules imported at startup")
+    return times, loaded
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
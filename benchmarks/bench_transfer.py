@@ -0,0 +1,63 @@
+"""
+Benchmark of the Keithley reading transfer: pymeasure's ASCII path (every element of every
+reading as comma-separated text, parsed in Python) against the binary path of
+jvbot.hardware.transfer (FORM:ELEM VOLT,CURR, FORM:DATA SREAL, decoded with np.frombuffer).
+
+Replies are synthesized in the format the 2400 sends, so no instrument is needed. Only the
+decoding in Python is timed, along with the payload size of each reply. The time spent on the
+bus, which scales with the payload, and the instrument's own formatting time are not measured,
+so the end-to-end gain on a real sweep depends on the GPIB adapter and has to be measured on
+the station (ie with the SCPI tracer of Control_Keithley).
+
+    python benchmarks/bench_transfer.py [readings ...]
+"""
+import sys
+import time
+import numpy as np
+
+from jvbot.hardware.transfer import HEADER
+
+ASCII_ELEMENTS = 5  # voltage, current, resistance, time, status
+BINARY_ELEMENTS = 2  # voltage, current
+
+
+def ascii_reply(n, rng):
+    values = rng.normal(size=(n, ASCII_ELEMENTS))
+    return (",".join(f"{x:+.6E}" for x in values.ravel()) + "\n").encode()
+
+
+def binary_reply(n, rng):
+    values = rng.normal(size=(n, BINARY_ELEMENTS)).astype("<f4")
+    return HEADER + values.tobytes() + b"\n"
+
+
+def decode_ascii(raw):
+    # what pymeasure's Instrument.values does with the reply
+    values = [float(x) for x in raw.decode().strip().split(",")]
+    return np.array(values).reshape(-1, ASCII_ELEMENTS)[:, :2]
+
+
+def decode_binary(raw):
+    return np.frombuffer(raw[len(HEADER):-1], dtype="<f4").reshape(-1, BINARY_ELEMENTS)
+
+
+def timeit(func, arg, repeats=50):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes=(1, 100, 2500)):
+    rng = np.random.default_rng(0)
+    print(f"{'readings':>8} | {'ascii bytes':>11} {'binary bytes':>12} | {'ascii decode':>12} {'binary decode':>13} | decode speedup")
+    for n in sizes:
+        a, b = ascii_reply(n, rng), binary_reply(n, rng)
+        ta, tb = timeit(decode_ascii, a), timeit(decode_binary, b)
+        print(f"{n:>8} | {len(a):>11} {len(b):>12} | {ta*1e6:>10.1f}us {tb*1e6:>11.1f}us | {ta/tb:>6.1f}x")
+
+
+if __name__ == "__main__":
+    run([int(n) for n in sys.argv[1:]] or (1, 100, 2500))
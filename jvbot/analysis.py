@@ -0,0 +1,352 @@
+import os
+import math
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+VOLTAGE_COLUMN = "Measured Voltage (V)"
+CURRENT_DENSITY_COLUMN = "Current Density (mA/cm2)"
+METRICS = ["pce", "ff", "voc", "jsc", "rsh", "rs", "vmpp", "jmpp"]
+P_IN = 100  # incident power density (mW/cm2), 1 sun
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".jvbot", "metrics_cache.sqlite")
+NAME_FIELDS = ["name", "pixel", "repeat", "scan", "direction", "light"]
+# below this many files/curves, starting worker processes costs more than the analysis itself
+POOL_MIN_ITEMS = 256
+
+
+class MetricsCache:
+    """
+    Small on-disk LRU cache of extracted JV metrics, so re-running analysis over a tray only
+    recomputes files that changed. Files are keyed by path + mtime + size, in-memory curves
+    by a hash of their contents.
+    """
+
+    def __init__(self, fpath=DEFAULT_CACHE_PATH, max_entries=100000):
+        os.makedirs(os.path.dirname(os.path.abspath(fpath)), exist_ok=True)
+        self.fpath = fpath
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fpath, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics (key TEXT PRIMARY KEY, metrics TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS metrics_last_used ON metrics (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def file_key(fpath):
+        """
+            Returns:
+                str: cache key of the file as it is now, None if it cannot be stat'ed
+        """
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return None
+        return f"file:{os.path.abspath(fpath)}:{st.st_mtime_ns}:{st.st_size}"
+
+    @staticmethod
+    def array_key(v, j):
+        h = hashlib.sha1()
+        for arr in (v, j):
+            h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+        return f"sha1:{h.hexdigest()}"
+
+    def get_many(self, keys):
+        """
+            Returns:
+                dict: key -> metrics dict, for the keys found in the cache
+        """
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for k in range(0, len(keys), 500):  # stay under sqlite's bound variable limit
+                chunk = keys[k : k + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, metrics FROM metrics WHERE key IN ({marks})", chunk)
+                found.update({key: json.loads(m) for key, m in rows})
+                self._conn.execute(
+                    f"UPDATE metrics SET last_used = ? WHERE key IN ({marks})", [time.time()] + chunk
+                )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+            Args:
+                items (dict): key -> metrics dict
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metrics (key, metrics, last_used) VALUES (?, ?, ?)",
+                [(key, json.dumps(m), now) for key, m in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM metrics")
+            self._conn.commit()
+
+    def _evict(self):
+        (n,) = self._conn.execute("SELECT COUNT(*) FROM metrics").fetchone()
+        if n > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM metrics WHERE key IN (SELECT key FROM metrics ORDER BY last_used ASC LIMIT ?)",
+                (n - self.max_entries,),
+            )
+
+
+def parse_name(fname):
+    """
+        Splits a JV filename into its parts
+
+        Args:
+            fname (string): filename or path, ie x05_P1_S1_fwd_light.csv or 05_P1_S1_120_rev_dark.csv
+
+        Returns:
+            dict: name, pixel, repeat, scan, direction, light
+    """
+    parts = os.path.splitext(os.path.basename(fname))[0].split("_")
+    info = dict.fromkeys(NAME_FIELDS)
+    if len(parts) >= 3:
+        info["light"] = parts[-1] == "light"
+        info["direction"] = parts[-2]
+        parts = parts[:-2]
+    for key, part in zip(["name", "pixel", "repeat", "scan"], parts):
+        info[key] = part
+    if info["name"] is not None:
+        info["name"] = info["name"].lstrip("x")
+    return info
+
+
+def load_jv(fpath):
+    """
+        Reads voltage and current density from a JV csv written by Control_Keithley._format_jv
+
+        Returns:
+            tuple(np.ndarray): voltage (V), current density (mA/cm2)
+    """
+    with open(fpath, "r") as f:
+        header = f.readline().strip().split(",")
+    usecols = (header.index(VOLTAGE_COLUMN), header.index(CURRENT_DENSITY_COLUMN))
+    v, j = np.loadtxt(fpath, delimiter=",", skiprows=1, usecols=usecols, unpack=True, ndmin=2)
+    return v, j
+
+
+def _slope_resistance(v, j, v0, npts=3):
+    # -dV/dJ around v0, in ohm*cm2 (J is in mA/cm2)
+    idx = np.argsort(np.abs(v - v0))[:npts]
+    if len(np.unique(v[idx])) < 2:
+        return np.nan
+    slope = np.polyfit(j[idx], v[idx], 1)[0]
+    return -slope * 1000
+
+
+def jv_metrics(v, j):
+    """
+        Extracts solar cell figures of merit from a single JV curve
+
+        Args:
+            v (np.ndarray): voltage (V)
+            j (np.ndarray): current density (mA/cm2), positive under illumination
+
+        Returns:
+            dict: pce (%), ff (%), voc (V), jsc (mA/cm2), rsh and rs (ohm cm2), vmpp (V), jmpp (mA/cm2)
+    """
+    v = np.asarray(v, dtype=float)
+    j = np.asarray(j, dtype=float)
+    order = np.argsort(v)
+    v, j = v[order], j[order]
+    out = dict.fromkeys(METRICS, np.nan)
+    if len(v) < 2:
+        return out
+
+    out["jsc"] = np.interp(0, v, j)
+    crossings = np.where((j[:-1] > 0) & (j[1:] <= 0) & (v[1:] > 0))[0]
+    if len(crossings):
+        k = crossings[0]
+        out["voc"] = v[k] + (v[k + 1] - v[k]) * j[k] / (j[k] - j[k + 1])
+    else:
+        return out
+
+    mask = (v >= 0) & (v <= out["voc"])
+    if mask.any():
+        p = v[mask] * j[mask]
+        k = np.argmax(p)
+        out["vmpp"], out["jmpp"] = v[mask][k], j[mask][k]
+        out["pce"] = p[k] / P_IN * 100
+        if out["jsc"] > 0:
+            out["ff"] = p[k] / (out["voc"] * out["jsc"]) * 100
+    out["rs"] = _slope_resistance(v, j, out["voc"])
+    out["rsh"] = _slope_resistance(v, j, 0)
+    return out
+
+
+def _failed(metrics):
+    # _metrics_from_file could not read the file, retry next time instead of caching it
+    return all(np.isnan(metrics[m]) for m in METRICS)
+
+
+def _metrics_from_file(fpath):
+    try:
+        return jv_metrics(*load_jv(fpath))
+    except (ValueError, OSError) as e:
+        print(f"Could not analyze {fpath}: {e}")
+        return dict.fromkeys(METRICS, np.nan)
+
+
+def _use_pool(n, max_workers):
+    if max_workers is None:
+        return n >= POOL_MIN_ITEMS
+    return max_workers > 1 and n >= 2
+
+
+def _default_chunksize(n, max_workers):
+    workers = max_workers or os.cpu_count() or 1
+    return max(1, math.ceil(n / (workers * 4)))
+
+
+def analyze_files(fpaths, max_workers=None, chunksize=None, cache=None):
+    """
+        Computes JV metrics for many files in parallel, one file per task
+
+        Args:
+            fpaths (list): JV csv paths
+            max_workers (int = None): worker processes, defaults to the number of cores. 1 runs serially,
+                as do fewer than POOL_MIN_ITEMS files unless max_workers is given.
+            chunksize (int = None): files handed to a worker at a time, defaults to ~4 chunks per worker
+            cache (MetricsCache = None): if given, only files not already in the cache are analyzed
+
+        Returns:
+            pd.DataFrame: one row per file, with parsed name fields and metrics
+    """
+    import pandas as pd
+
+    fpaths = list(fpaths)
+    metrics = {}
+    if cache is not None:
+        keys = {f: MetricsCache.file_key(f) for f in fpaths}
+        keys = {f: k for f, k in keys.items() if k is not None}  # missing files are analyzed, and fail, below
+        cached = cache.get_many(keys.values())
+        metrics = {f: cached[k] for f, k in keys.items() if k in cached}
+    todo = [f for f in fpaths if f not in metrics]
+
+    if not _use_pool(len(todo), max_workers):
+        new = [_metrics_from_file(f) for f in todo]
+    else:
+        if chunksize is None:
+            chunksize = _default_chunksize(len(todo), max_workers)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            new = list(executor.map(_metrics_from_file, todo, chunksize=chunksize))
+    metrics.update(zip(todo, new))
+    if cache is not None and todo:
+        cache.put_many({keys[f]: m for f, m in zip(todo, new) if f in keys and not _failed(m)})
+
+    rows = []
+    for f in fpaths:
+        row = parse_name(f)
+        row["fpath"] = f
+        row.update(metrics[f])
+        rows.append(row)
+    return pd.DataFrame(rows, columns=NAME_FIELDS + ["fpath"] + METRICS)
+
+
+def jv_files(rootdir="."):
+    """
+        Returns:
+            list: paths of the JV csvs in a directory (not recursive), sorted by name
+    """
+    return [
+        os.path.join(rootdir, f)
+        for f in sorted(os.listdir(rootdir))
+        if f.endswith("_light.csv") or f.endswith("_dark.csv")
+    ]
+
+
+def analyze_directory(rootdir=".", max_workers=None, chunksize=None, cache=None):
+    """
+        Computes JV metrics for every JV csv in a directory (not recursive). See analyze_files.
+    """
+    return analyze_files(jv_files(rootdir), max_workers=max_workers, chunksize=chunksize, cache=cache)
+
+
+def _analyze_curve_chunk(shm_name, shape, start, stop):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        vj = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        return [jv_metrics(vj[0, k], vj[1, k]) for k in range(start, stop)]
+    finally:
+        shm.close()
+
+
+def analyze_curves(v, j, max_workers=None, chunksize=None, cache=None):
+    """
+        Computes JV metrics for a stack of curves, ie a jv_time series. The curves are placed in
+        a shared memory block once and workers read their chunk of rows from it directly, so
+        nothing is pickled per curve.
+
+        Args:
+            v (np.ndarray): voltage, shape (ncurves, npoints)
+            j (np.ndarray): current density, shape (ncurves, npoints)
+            max_workers (int = None): worker processes, defaults to the number of cores. 1 runs serially,
+                as do fewer than POOL_MIN_ITEMS curves unless max_workers is given.
+            chunksize (int = None): curves per task, defaults to ~4 chunks per worker
+            cache (MetricsCache = None): if given, curves are looked up by content hash first
+
+        Returns:
+            pd.DataFrame: one row of metrics per curve
+    """
+    import pandas as pd
+
+    v = np.atleast_2d(np.asarray(v, dtype=np.float64))
+    j = np.atleast_2d(np.asarray(j, dtype=np.float64))
+    if v.shape != j.shape:
+        raise ValueError(f"v and j must have the same shape, got {v.shape} and {j.shape}")
+
+    rows = [None] * v.shape[0]
+    if cache is not None:
+        keys = [MetricsCache.array_key(v_, j_) for v_, j_ in zip(v, j)]
+        cached = cache.get_many(keys)
+        rows = [cached.get(k) for k in keys]
+    todo = [k for k, row in enumerate(rows) if row is None]
+
+    new = _analyze_curve_stack(v[todo], j[todo], max_workers, chunksize)
+    for k, row in zip(todo, new):
+        rows[k] = row
+    if cache is not None and todo:
+        cache.put_many({keys[k]: row for k, row in zip(todo, new)})
+    return pd.DataFrame(rows, columns=METRICS)
+
+
+def _analyze_curve_stack(v, j, max_workers, chunksize):
+    ncurves = v.shape[0]
+    if not _use_pool(ncurves, max_workers):
+        return [jv_metrics(v_, j_) for v_, j_ in zip(v, j)]
+
+    if chunksize is None:
+        chunksize = _default_chunksize(ncurves, max_workers)
+    shape = (2,) + v.shape
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        vj = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        vj[0], vj[1] = v, j
+        bounds = [(k, min(k + chunksize, ncurves)) for k in range(0, ncurves, chunksize)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_analyze_curve_chunk, shm.name, shape, start, stop)
+                for start, stop in bounds
+            ]
+            rows = [row for fut in futures for row in fut.result()]
+        del vj
+    finally:
+        shm.close()
+        shm.unlink()
+    return rows
@@ -0,0 +1,279 @@
+"""
+Declarative batch runs across one or more trays. A batch recipe lists trays, named slot groups
+and the measurement protocols to run on each group:
+
+    output: ./run1
+    area: 0.07
+    home: true
+    trays:
+      - version: 10mm_v2
+        profile: gentle     # optional, defaults to the recipe level profile, then the tray's own
+        groups:
+          control: [A1, A2, A3, A4]
+          treated: [B1, B2, B3, B4]
+        protocols:
+          - type: jv            # light JV on every group, twice per contact
+            light: true
+            light_and_dark: false  # true adds a dark JV at the same contact, shutter closed
+            direction: fwdrev
+            vmin: -0.1
+            vmax: 1.2
+            repeat: 2
+          - type: jv
+            light: false
+            groups: [control]
+            direction: fwd
+            vmin: -0.1
+            vmax: 1.2
+          - type: spo
+            groups: [treated]
+            vstart: 0.9
+            vstep: 0.005
+            vdelay: 0.05
+            interval: 0.5
+            interval_count: 120
+
+Protocols run in passes over the tray, one pass per measurement kind in KIND_ORDER (all light
+JVs, then all dark JVs, ..., then SPO), so the shutter and light state change once per pass
+instead of at every slot. Within a pass slots are visited in a serpentine order, and
+successive passes start from whichever end is closest to where the previous pass ended.
+"""
+import os
+import numpy as np
+
+PROTOCOL_TYPES = ["jv", "jsc_time", "voc_time", "spo", "jv_time"]
+# (required, optional) keys of each protocol type, the arguments of the Control_Keithley method
+PROTOCOL_KEYS = {
+    "jv": (["direction", "vmin", "vmax"], ["vsteps", "light", "light_and_dark", "scan_number"]),
+    "jv_time": (["direction", "vmin", "vmax", "interval", "interval_count"], ["vsteps", "light"]),
+    "jsc_time": (["interval", "interval_count"], []),
+    "voc_time": (["interval", "interval_count"], []),
+    "spo": (["vstart", "vstep", "vdelay", "interval", "interval_count"], ["algorithm", "vseed_max"]),
+}
+RECIPE_PROTOCOL_KEYS = ["type", "groups", "repeat"]  # handled by the executor, not passed on
+KIND_ORDER = ["jv_light", "jv_dark", "jsc_time", "voc_time", "spo", "jv_time_light", "jv_time_dark"]
+
+
+def protocol_kind(protocol):
+    """
+        Measurement kind used to group protocols into passes, ie jv_light or spo
+    """
+    if protocol["type"] in ("jv", "jv_time"):
+        return f'{protocol["type"]}_{"light" if protocol.get("light", True) else "dark"}'
+    return protocol["type"]
+
+
+def validate_batch_recipe(recipe):
+    if not recipe.get("trays"):
+        raise ValueError("Batch recipe must list at least one tray")
+    for t, tray in enumerate(recipe["trays"]):
+        if "version" not in tray:
+            raise ValueError(f"Tray {t} is missing its version")
+        groups = tray.get("groups")
+        if not groups:
+            raise ValueError(f"Tray {t} must define at least one slot group")
+        for protocol in tray.get("protocols", []):
+            if protocol.get("type") not in PROTOCOL_TYPES:
+                raise ValueError(f"Tray {t}: protocol type must be one of {PROTOCOL_TYPES}, got {protocol.get('type')}")
+            required, optional = PROTOCOL_KEYS[protocol["type"]]
+            missing = [k for k in required if k not in protocol]
+            if missing:
+                raise ValueError(f"Tray {t}: {protocol['type']} protocol is missing {missing}")
+            unknown_keys = set(protocol) - set(required) - set(optional) - set(RECIPE_PROTOCOL_KEYS)
+            if unknown_keys:
+                raise ValueError(f"Tray {t}: {protocol['type']} protocol has unknown keys {sorted(unknown_keys)}")
+            unknown = set(protocol.get("groups", groups)) - set(groups)
+            if unknown:
+                raise ValueError(f"Tray {t}: protocol refers to undefined groups {sorted(unknown)}")
+    return recipe
+
+
+def serpentine(slots, coordinates):
+    """
+        Orders slots row by row, alternating the direction along each row, so the gantry never
+        travels back across the tray between neighbouring slots
+
+        Args:
+            slots (list): slot names
+            coordinates (dict): slot name -> [x, y, z]
+    """
+    rows = {}
+    for slot in slots:
+        rows.setdefault(round(float(coordinates[slot][1]), 3), []).append(slot)
+    ordered = []
+    for k, y in enumerate(sorted(rows)):
+        row = sorted(rows[y], key=lambda s: coordinates[s][0], reverse=bool(k % 2))
+        ordered.extend(row)
+    return ordered
+
+
+def plan_tray(tray, coordinates):
+    """
+        Compiles one tray of a batch recipe into measurement passes
+
+        Args:
+            tray (dict): tray entry of a batch recipe
+            coordinates (dict): slot name -> [x, y, z] for this tray version
+
+        Returns:
+            list(list(tuple)): passes, each an ordered list of (slot, protocol index, protocol)
+    """
+    groups = tray["groups"]
+    by_kind = {}
+    for p_idx, protocol in enumerate(tray.get("protocols", [])):
+        for group in protocol.get("groups", list(groups)):
+            for slot in groups[group]:
+                by_kind.setdefault(protocol_kind(protocol), []).append((slot, p_idx, protocol))
+
+    def distance(a, b):
+        return float(np.linalg.norm(np.asarray(coordinates[a][:2]) - np.asarray(coordinates[b][:2])))
+
+    passes = []
+    last = None
+    for kind in KIND_ORDER:
+        if kind not in by_kind:
+            continue
+        steps = by_kind[kind]
+        order = serpentine(list(dict.fromkeys(s for s, _, _ in steps)), coordinates)
+        if last is not None and distance(last, order[-1]) < distance(last, order[0]):
+            order = order[::-1]  # start the pass from whichever end is closer to where we are
+        rank = {slot: k for k, slot in enumerate(order)}
+        passes.append(sorted(steps, key=lambda step: (rank[step[0]], step[1])))
+        last = order[-1]
+    return passes
+
+
+def _run_protocol(control_keithley, name, protocol, preview):
+    params = {k: v for k, v in protocol.items() if k not in ("type", "groups", "repeat")}
+    kind = protocol["type"]
+    repeat = protocol.get("repeat", 1)
+    for r in range(repeat):
+        scan_name = f"{name}_S{r + 1}"
+        if kind == "jv":
+            control_keithley.jv(scan_name, preview=preview, **params)
+        elif kind == "spo":
+            control_keithley.spo(scan_name, preview=preview, **params)
+        elif kind == "jv_time":
+            control_keithley.jv_time(scan_name, preview=preview, **params)
+        elif kind == "jsc_time":
+            control_keithley.jsc_time(scan_name, preview=preview, **params)
+        elif kind == "voc_time":
+            control_keithley.voc_time(scan_name, preview=preview, **params)
+
+
+class TrayChangeRequired(Exception):
+    """
+    raised by a non-interactive on_tray_change handler. The gantry is parked at the load position
+    and the journal notes that the tray was requested, so once it is loaded the batch continues
+    with resume=True
+    """
+
+    def __init__(self, version):
+        super().__init__(f"Load tray {version} and resume the batch")
+        self.version = version
+
+
+def _prompt_tray_change(version):
+    input(f"Load tray {version} and press Enter to continue...")
+
+
+def park_for_tray_change(version):
+    """
+    on_tray_change handler for unattended runs: stops the batch instead of waiting for input
+    """
+    raise TrayChangeRequired(version)
+
+
+def run_batch(control, recipe, resume=False, preview=False, on_tray_change=_prompt_tray_change, interrupt=None, journal=None):
+    """
+        Executes a batch recipe. Every finished (tray, protocol, slot) step is recorded in the
+        scan journal, so an interrupted batch can be resumed.
+
+        Args:
+            control (Control): connected jvbot Control
+            recipe (dict): batch recipe, see module docstring
+            resume (boolean = False): skip steps already in the journal. The trays and protocols
+                must match the interrupted batch, else JournalMismatch is raised
+            preview (boolean = False): plot measurements as they are taken
+            on_tray_change (callable): called with the tray version, with the gantry at the load
+                position, before every tray after the first. It may raise TrayChangeRequired to
+                stop the batch there; resuming then takes the new tray as loaded
+            interrupt (callable = None): checked before every step, returning True stops the batch
+                there with ScanInterrupted. Resume it later with resume=True.
+            journal (str = None): journal file, defaults to JOURNAL_FNAME in the current directory
+
+        Returns:
+            dict: completed step keys and written files
+    """
+    from natsort import natsorted
+    from jvbot.journal import ScanJournal, ScanInterrupted, JOURNAL_FNAME
+    from jvbot.status import ScanProgress
+
+    validate_batch_recipe(recipe)
+    ck = control.control_keithley
+    if any(
+        protocol_kind(protocol).endswith("_dark") or protocol.get("light_and_dark")
+        for tray in recipe["trays"]
+        for protocol in tray.get("protocols", [])
+    ):
+        ck.require_shutter()  # before hours of light passes, not at the first dark one
+    journal = ScanJournal(os.path.abspath(JOURNAL_FNAME if journal is None else journal))
+    done = journal.begin({"trays": recipe["trays"]}, resume=resume)
+
+    for t, tray in enumerate(recipe["trays"]):
+        trayname = f'tray{t + 1}_{tray["version"]}'
+        load_key = f"{trayname}:load"
+        if t > 0 and load_key not in done:
+            control.gantry.movetoload()
+            try:
+                on_tray_change(tray["version"])
+            except TrayChangeRequired:
+                journal.record(load_key, tray=trayname)
+                raise
+            journal.record(load_key, tray=trayname)
+        control.set_tray(
+            tray["version"],
+            calibrate=tray.get("calibrate", False),
+            profile=tray.get("profile", recipe.get("profile")),
+        )
+        coordinates = control.tray._coordinates
+        allslots = natsorted(coordinates.keys())
+
+        os.makedirs(trayname, exist_ok=True)
+        os.chdir(trayname)
+        plan = plan_tray(tray, coordinates)
+        progress = ScanProgress(
+            control.status,
+            sum(f"{trayname}:{p_idx}:{slot}" not in done for steps in plan for slot, p_idx, _ in steps),
+            scan=trayname,
+        )
+        try:
+            for steps in plan:
+                for slot, p_idx, protocol in steps:
+                    key = f"{trayname}:{p_idx}:{slot}"
+                    if key in done:
+                        continue
+                    if interrupt is not None and interrupt():
+                        raise ScanInterrupted(f"Batch interrupted before {key}")
+                    progress.slot(slot)
+                    if control.index is not None:
+                        control.index.set_context(slot=slot, tray=tray["version"])
+                    control.tray.moveto(slot)
+                    name = "x" + str(allslots.index(slot) + 1).zfill(2) + "_P1"
+                    n_saved = len(ck.saved_files)
+                    progress.phase(protocol["type"])
+                    _run_protocol(ck, name, protocol, preview)
+                    journal.record(key, tray=trayname, protocol=p_idx, files=ck.saved_files[n_saved:])
+                    progress.slot_done()
+        finally:
+            os.chdir("..")
+            if control.index is not None:
+                control.index.set_context(slot=None, tray=None)
+
+    control.gantry.movetoload()
+    progress.finish()
+    done = journal.completed()
+    return {
+        "completed_steps": [key for key in done if not key.endswith(":load")],
+        "files": [f for entry in done.values() for f in entry.get("files", [])],
+    }
@@ -0,0 +1,208 @@
+"""
+Headless command line entry point for scheduled tray runs, ie from cron:
+
+    jvbot recipe.yaml --output /data/2026-10-19 --resume
+
+A recipe is a YAML or JSON mapping, for example
+
+    tray: 10mm_v2
+    final_slot: H4        # or slots: [A1, A2, B1]
+    direction: fwdrev
+    vmin: -0.1
+    vmax: 1.2
+    vsteps: 50
+    light_and_dark: false # also measure dark JVs at each contact
+    area: 0.07
+    output: ./run1
+    home: true
+    profile: gentle       # optional gantry motion profile, see hardwareconstants.yaml
+
+A recipe with a `trays:` list is run as a multi-tray batch instead, see jvbot/batch.py. Between
+trays an unattended run parks the gantry at the load position and exits with status
+"tray_change" (exit code 3); load the named tray and run again with --resume. Pass --interactive
+to wait for Enter instead.
+
+A one-line JSON summary of the run is printed to stdout when it finishes. Everything else the
+run prints goes to stderr, so stdout stays machine-readable.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+RECIPE_DEFAULTS = {
+    "slots": None,
+    "final_slot": None,
+    "direction": "fwdrev",
+    "vsteps": 50,
+    "light_and_dark": False,
+    "area": 0.07,
+    "output": ".",
+    "home": False,
+    "resume": False,
+    "profile": None,
+}
+REQUIRED_KEYS = ["tray", "vmin", "vmax"]
+BATCH_DEFAULTS = {key: RECIPE_DEFAULTS[key] for key in ["area", "output", "home", "resume", "profile"]}
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BAD_RECIPE = 2
+EXIT_TRAY_CHANGE = 3
+
+
+def load_recipe(fpath):
+    """
+        Reads a YAML or JSON run recipe and fills in defaults
+
+        Returns:
+            dict: recipe
+    """
+    with open(fpath, "r") as f:
+        if fpath.endswith(".json"):
+            recipe = json.load(f)
+        else:
+            import yaml
+
+            recipe = yaml.safe_load(f)
+    if not isinstance(recipe, dict):
+        raise ValueError(f"Recipe {fpath} must be a mapping")
+    if "trays" in recipe:
+        from jvbot.batch import validate_batch_recipe
+
+        validate_batch_recipe(recipe)
+        return {**BATCH_DEFAULTS, **recipe}
+    missing = [k for k in REQUIRED_KEYS if k not in recipe]
+    if missing:
+        raise ValueError(f"Recipe {fpath} is missing {missing}")
+    if recipe.get("slots") is None and recipe.get("final_slot") is None:
+        raise ValueError("Recipe must specify either slots or final_slot")
+    return {**RECIPE_DEFAULTS, **recipe}
+
+
+def run_recipe(recipe, trace=None, record=None, status_port=None, interactive=False):
+    """
+        Runs a tray scan from a recipe without opening any GUI or preview window
+
+        Args:
+            trace (str = None): write every SCPI command sent to the Keithley to this file and
+                print a per-operation summary of the traffic
+            record (str = None): record the whole gantry and Keithley conversation to this
+                transcript file, for replay with jvbot.hardware.transcript.replay_control
+            status_port (int = None): serve live progress and curves on this local http port,
+                see jvbot/status.py
+            interactive (bool = False): prompt for tray changes in a batch instead of parking
+                the gantry and raising TrayChangeRequired
+
+        Returns:
+            dict: run summary
+    """
+    from jvbot.jvbot import Control
+
+    output = os.path.abspath(recipe["output"])
+    os.makedirs(output, exist_ok=True)
+    os.chdir(output)
+
+    status, server = None, None
+    if status_port is not None:
+        from jvbot.status import StatusFeed, StatusServer
+
+        status = StatusFeed()
+        server = StatusServer(status, port=status_port).start()
+    c = Control(area=recipe["area"], savedir=output, trace=trace is not None, record=record, status=status)
+    try:
+        return _run(c, recipe, output, interactive)
+    finally:
+        if server is not None:
+            server.stop()
+        if trace is not None:
+            c.control_keithley.tracer.summary()
+            c.control_keithley.tracer.save(trace)
+
+
+def _run(c, recipe, output, interactive=False):
+    from jvbot.journal import ScanJournal, JOURNAL_FNAME
+
+    if recipe["home"]:
+        c.gantry.gohome()
+    if "trays" in recipe:
+        from jvbot.batch import run_batch, park_for_tray_change, _prompt_tray_change
+
+        on_tray_change = _prompt_tray_change if interactive else park_for_tray_change
+        return run_batch(c, recipe, resume=recipe["resume"], preview=False, on_tray_change=on_tray_change)
+    c.set_tray(recipe["tray"], profile=recipe["profile"])
+    flagged = c.scan_tray(
+        recipe["tray"],
+        recipe["direction"],
+        recipe["vmin"],
+        recipe["vmax"],
+        vsteps=recipe["vsteps"],
+        final_slot=recipe["final_slot"],
+        slots=recipe["slots"],
+        resume=recipe["resume"],
+        preview=False,
+        light_and_dark=recipe["light_and_dark"],
+    )
+    done = ScanJournal(os.path.join(output, JOURNAL_FNAME)).completed()
+    return {
+        "completed_slots": list(done.keys()),
+        "files": [f for entry in done.values() for f in entry.get("files", [])],
+        "flagged_slots": flagged,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="jvbot", description="Run a JV tray scan headless from a recipe file.")
+    parser.add_argument("recipe", help="YAML or JSON run recipe")
+    parser.add_argument("--output", help="output directory, overrides the recipe")
+    parser.add_argument("--resume", action="store_true", help="skip slots already completed in the output directory")
+    parser.add_argument("--trace", metavar="FILE", help="record all Keithley SCPI traffic to FILE and print a summary")
+    parser.add_argument("--record", metavar="FILE", help="record the gantry and Keithley conversation to a replayable transcript")
+    parser.add_argument("--status", metavar="PORT", type=int, help="serve live scan progress on this local http port")
+    parser.add_argument("--interactive", action="store_true", help="wait for Enter at batch tray changes instead of exiting")
+    args = parser.parse_args(argv)
+
+    summary = {"recipe": os.path.abspath(args.recipe)}
+    start = time.time()
+    try:
+        recipe = load_recipe(args.recipe)
+    except (OSError, ValueError) as e:
+        summary.update(status="bad_recipe", error=str(e))
+        print(json.dumps(summary))
+        return EXIT_BAD_RECIPE
+    if args.output is not None:
+        recipe["output"] = args.output
+    if args.resume:
+        recipe["resume"] = True
+
+    from jvbot.batch import TrayChangeRequired
+
+    stdout = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            summary.update(
+                run_recipe(
+                    recipe,
+                    trace=args.trace and os.path.abspath(args.trace),
+                    record=args.record and os.path.abspath(args.record),
+                    status_port=args.status,
+                    interactive=args.interactive,
+                )
+            )
+        summary["status"] = "ok"
+        code = EXIT_OK
+    except TrayChangeRequired as e:
+        summary.update(status="tray_change", load_tray=e.version, error=str(e))
+        code = EXIT_TRAY_CHANGE
+    except Exception as e:
+        summary.update(status="failed", error=f"{type(e).__name__}: {e}")
+        code = EXIT_FAILED
+    summary["duration_s"] = round(time.time() - start, 1)
+    print(json.dumps(summary), file=stdout)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
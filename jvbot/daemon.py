@@ -0,0 +1,275 @@
+"""
+Long-lived hardware daemon. One process owns the Gantry and Control_Keithley connections, so
+their position and instrument state survive notebook and kernel restarts: there is no re-home,
+set_defaults or Keithley reset when a new session starts. Start it once per station
+
+    python -m jvbot.daemon --home
+
+and connect from any number of notebooks or scripts
+
+    from jvbot.daemon import connect
+    c = connect()
+    c.set_tray("10mm_v2")
+    c.scan_tray("10mm_v2", "fwdrev", -0.1, 1.2, final_slot="H4", preview=False)
+
+The client is a thin proxy of Control: attribute access and method calls, ie c.gantry.moveto(...),
+are forwarded over a Unix socket (a named pipe on Windows) and run in the daemon. Calls from
+concurrent clients are serialized, so they cannot interleave commands on the serial or GPIB
+stream. Each call runs in the working directory of the client that made it, so files land where
+the caller expects. Plain values (numbers, strings, lists, dicts, arrays) are returned by value,
+other attributes (ie c.tray) as another proxy, and other call results by value. A result that
+cannot be pickled raises DaemonError in the client. Previews should be turned off, since they
+would be drawn by the daemon.
+
+Requests are pickles, so clients must prove they know a shared key before the daemon reads
+them. By default both sides use a per-user key in ~/.jvbot/daemon.key, created on first use and
+readable only by its owner; pass authkey to use another one.
+"""
+import os
+import sys
+import secrets
+import argparse
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+if sys.platform == "win32":
+    DEFAULT_ADDRESS = r"\\.\pipe\jvbot"
+    FAMILY = "AF_PIPE"
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "jvbot.sock")
+    FAMILY = "AF_UNIX"
+
+VALUE_TYPES = (type(None), bool, int, float, complex, str, bytes, list, tuple, dict, set)
+DEFAULT_AUTHKEY_PATH = os.path.join(os.path.expanduser("~"), ".jvbot", "daemon.key")
+
+
+def load_authkey(fpath=None):
+    """
+    Reads the shared key, creating a random one (only readable by the current user) if missing
+
+    Args:
+        fpath (str = None): key file, defaults to DEFAULT_AUTHKEY_PATH
+
+    Returns:
+        bytes
+    """
+    fpath = DEFAULT_AUTHKEY_PATH if fpath is None else fpath
+    os.makedirs(os.path.dirname(os.path.abspath(fpath)), exist_ok=True)
+    try:
+        fd = os.open(fpath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass  # created earlier, or by the other side just now
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    if os.name == "posix" and os.stat(fpath).st_mode & 0o077:
+        raise PermissionError(f"{fpath} is readable by other users, run chmod 600 on it")
+    with open(fpath, "r") as f:
+        return f.read().strip().encode()
+
+
+def _is_value(obj):
+    if isinstance(obj, VALUE_TYPES):
+        return True
+    return type(obj).__module__.split(".")[0] in ("numpy", "pandas", "datetime")
+
+
+class DaemonError(Exception):
+    """the daemon raised an exception that could not be sent back as is"""
+
+
+class HardwareDaemon:
+    def __init__(self, control, address=DEFAULT_ADDRESS, authkey=None):
+        """
+        Args:
+            control (Control): connected jvbot Control to serve
+            address (str = DEFAULT_ADDRESS): socket path (named pipe on Windows)
+            authkey (bytes = None): shared key clients must present, see multiprocessing.connection.
+                Defaults to the per-user key of load_authkey
+        """
+        self.control = control
+        self.address = address
+        self.authkey = load_authkey() if authkey is None else authkey
+        self.lock = threading.Lock()  # one call at a time reaches the hardware
+        self._listener = None
+
+    def serve_forever(self):
+        self._remove_stale_socket()
+        self._listener = Listener(self.address, family=FAMILY, authkey=self.authkey)
+        if FAMILY == "AF_UNIX":
+            os.chmod(self.address, 0o600)  # other users cannot even connect
+        print(f"jvbot daemon listening on {self.address}")
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    break  # listener closed by shutdown()
+                except Exception as e:  # ie a client with the wrong authkey
+                    print(f"Rejected client: {e}")
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _remove_stale_socket(self):
+        if FAMILY != "AF_UNIX" or not os.path.exists(self.address):
+            return
+        try:
+            Client(self.address, family=FAMILY, authkey=self.authkey).close()
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(self.address)  # left behind by a daemon that died
+            return
+        except AuthenticationError:
+            pass  # alive, with another key
+        raise RuntimeError(f"A jvbot daemon is already listening on {self.address}")
+
+    def _serve_client(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return  # client went away
+                reply = self._handle(*request)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:  # pickling the result failed, ie it holds a lock or a handle
+                    path = request[1]
+                    conn.send(("error", DaemonError(f"Result of {'.'.join(path)} cannot be sent to the client: {type(e).__name__}: {e}")))
+
+    def _resolve(self, path):
+        obj = self.control
+        for name in path:
+            obj = getattr(obj, name)
+        return obj
+
+    def _handle(self, op, path, cwd, args=(), kwargs=None):
+        """
+        Returns:
+            tuple: ("value", obj), ("proxy", None) or ("error", exception)
+        """
+        with self.lock:
+            try:
+                os.chdir(cwd)
+                if op == "get":
+                    result = self._resolve(path)
+                elif op == "call":
+                    result = self._resolve(path)(*args, **(kwargs or {}))
+                elif op == "set":
+                    setattr(self._resolve(path[:-1]), path[-1], args[0])
+                    result = None
+                else:
+                    raise ValueError(f"Unknown daemon request {op}")
+            except Exception as e:
+                return "error", _sendable(e)
+        if op == "get" and not _is_value(result):
+            return "proxy", None
+        return "value", result
+
+
+def _picklable(obj):
+    import pickle
+
+    try:
+        pickle.dumps(obj)
+        return True
+    except Exception:
+        return False
+
+
+def _sendable(error):
+    if _picklable(error):
+        return error
+    return DaemonError(f"{type(error).__name__}: {error}")
+
+
+class RemoteObject:
+    """
+    proxy of an object living in the daemon, ie Control or Control.gantry
+    """
+
+    def __init__(self, conn, path=(), lock=None):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_path", tuple(path))
+        object.__setattr__(self, "_lock", threading.Lock() if lock is None else lock)  # shared by all proxies on conn
+
+    def _request(self, op, path, *args, **kwargs):
+        with self._lock:
+            self._conn.send((op, path, os.getcwd(), args, kwargs))
+            kind, value = self._conn.recv()
+        if kind == "error":
+            raise value
+        if kind == "proxy":
+            return RemoteObject(self._conn, path, self._lock)
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._request("get", self._path + (name,))
+
+    def __setattr__(self, name, value):
+        self._request("set", self._path + (name,), value)
+
+    def __call__(self, *args, **kwargs):
+        return self._request("call", self._path, *args, **kwargs)
+
+    def __repr__(self):
+        return f"<jvbot daemon proxy {'.'.join(('control',) + self._path)}>"
+
+    def close(self):
+        """
+        Disconnects this client. The daemon and its hardware connections stay up
+        """
+        self._conn.close()
+
+
+def connect(address=DEFAULT_ADDRESS, authkey=None):
+    """
+    Connects to a running daemon
+
+    Args:
+        authkey (bytes = None): shared key of the daemon, defaults to the per-user key of load_authkey
+
+    Returns:
+        RemoteObject: proxy of the daemon's Control
+    """
+    authkey = load_authkey() if authkey is None else authkey
+    return RemoteObject(Client(address, family=FAMILY, authkey=authkey))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="jvbot-daemon", description="Serve the jvbot hardware to local clients.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="socket path (named pipe on Windows)")
+    parser.add_argument("--authkey", help=f"shared key clients must present, defaults to the one in {DEFAULT_AUTHKEY_PATH}")
+    parser.add_argument("--area", type=float, default=0.07, help="device area (cm2)")
+    parser.add_argument("--home", action="store_true", help="home the gantry once after connecting")
+    args = parser.parse_args(argv)
+
+    from jvbot.jvbot import Control
+
+    control = Control(area=args.area)
+    if args.home:
+        control.gantry.gohome()
+    authkey = args.authkey.encode() if args.authkey else None
+    try:
+        HardwareDaemon(control, args.address, authkey).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        control.gantry.disconnect()
+        control.control_keithley.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,33 @@
-from pymeasure.instruments.keithley import Keithley2400
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
 import time
 import csv
+import os
+from contextlib import contextmanager
+from jvbot.hardware.mppt import MPPT_ALGORITHMS, GoldenSection
+from jvbot.hardware.timeseries import TimeSeriesBuffer
+from jvbot.hardware.shutter import connect_shutter
+from jvbot.hardware.transfer import BinaryTransfer
+from jvbot.hardware.trace import VisaTracer
+from jvbot.hardware.transcript import RecordingConnection
+
+JV_DIRECTIONS = {
+	'fwd': ['fwd'],
+	'rev': ['rev'],
+	'fwdrev': ['fwd', 'rev'],
+	'revfwd': ['rev', 'fwd'],
+}
+
+MAX_SWEEP_POINTS = 2500 # trigger count limit of the 2400
+SOURCE_LIST_CHUNK = 100 # max points per :SOUR:LIST:VOLT command, the rest is appended
+
+SPO_COLUMNS = [
+	'Voltage (V)',
+	'Current Density (mA/cm2)',
+	'Current (A)',
+	'Measured Voltage (V)',
+	'Power Density (mW/cm2)',
+	'Time Elapsed (s)',
+]
 
 
 
@@ -11,10 +35,30 @@ import csv
 class Control_Keithley:
 
 
-	def __init__(self, area = 0.07, address='GPIB0::22::INSTR'): 
+	def __init__(self, area = 0.07, address='GPIB0::22::INSTR', shutter = None, trace = False, adapter = None, record = None): 
 		"""
 			Initializes Keithley 2400 class SMUs
-		"""
+
+			Args:
+				area (float = 0.07): device area (cm2)
+				address (string): VISA address of the Keithley
+				shutter (Shutter = None): light shutter, defaults to the one in hardwareconstants.yaml
+					(a SimulatedShutter if it is disabled there)
+				trace (boolean = False): record every SCPI command in self.tracer, see trace.py
+				adapter (pymeasure Adapter = None): use this adapter instead of opening address, ie to
+					replay a transcript
+				record (Transcript = None): append the whole VISA conversation to this transcript,
+					see transcript.py
+
+			self.status can be set to a StatusFeed (see jvbot/status.py) to stream every curve, and
+			self.index to a ScanIndex (see jvbot/index.py) to record every file saved
+		"""
+		self.status = None
+		self.index = None
+		self.tracer = VisaTracer(owner = self) if trace else None
+		self._transcript = record
+		self._adapter = adapter
+		self.shutter = connect_shutter() if shutter is None else shutter
 		self.area = area
 		self.pause = 0.001
 		self.wires = 4
@@ -22,10 +66,13 @@ class Control_Keithley:
 		self.compliance_voltage = 2 # V
 		self.buffer_points = 2
 		self.counts = 2
+		self.nplc = 1 # integration time, power line cycles
+		self.line_frequency = 60 # Hz
 		self.__previewFigure = None
 		self.__previewAxes = None
 		self.connect(keithley_address=address)
 		self.preview_figs = {}
+		self.saved_files = [] # absolute paths of every JV csv written this session
 
 
 	def help(self):
@@ -44,7 +91,18 @@ class Control_Keithley:
 		"""
 			Connects to the GPIB interface
 		"""
-		self.keithley = Keithley2400(keithley_address)
+		from pymeasure.instruments.keithley import Keithley2400 # deferred, pymeasure/pyvisa are slow to import
+		if self._adapter is not None:
+			adapter = self._adapter
+		else:
+			from pymeasure.adapters import VISAAdapter
+			adapter = VISAAdapter(keithley_address)
+		# wrap the connection before Keithley2400 talks to it, so nothing goes unrecorded
+		if self._transcript is not None:
+			adapter.connection = RecordingConnection(adapter.connection, self._transcript)
+		if self.tracer is not None:
+			self.tracer.attach(adapter)
+		self.keithley = Keithley2400(adapter)
 		self.keithley.reset()
 		self.keithley.use_front_terminals()
 		self.keithley.apply_voltage()
@@ -52,33 +110,61 @@ class Control_Keithley:
 		self.keithley.compliance_current = self.compliance_current
 		self.keithley.buffer_points = self.buffer_points
 		self.keithley.source_voltage = 0
-		# self.shutter = serial.Serial(shutter_port)
-		# self.close_shutter()
+		self.transfer = BinaryTransfer(self.keithley) # binary readings, see transfer.py
+		self._srq = self._enable_srq()
+		self.close_shutter()
+
+
+	def start_trace(self):
+		"""
+			Starts recording SCPI traffic on an already connected instrument
+
+			Returns:
+				VisaTracer: the tracer, also kept in self.tracer
+		"""
+		if self.tracer is None:
+			self.tracer = VisaTracer(owner = self)
+		self.tracer.attach(self.keithley.adapter)
+		return self.tracer
+
+
+	def stop_trace(self):
+		if self.tracer is not None:
+			self.tracer.detach(self.keithley.adapter)
 
 
 	def disconnect(self):
 		"""
-			Disconnects from the GPIB interface
+			Disconnects from the GPIB interface, leaving the instrument in the ASCII format
+			pymeasure expects
 		"""
+		self.transfer.ascii()
 		self.keithley.shutdown()
+		self.shutter.disconnect()
 
 
 	def open_shutter(self):
 		"""
 			Opens homebuilt shutter
 		"""
-		# self.shutter.write(b'1')
-		# self._shutteropen = True
-		return
+		self.shutter.open()
 
 
 	def close_shutter(self):
 		"""
 			Closes homebuilt shutter
 		"""
-		# self.shutter.write(b'0')
-		# self._shutteropen = False
-		return
+		self.shutter.close()
+
+
+	def require_shutter(self):
+		"""
+			Raises RuntimeError if the shutter cannot block the lamp, ie it is disabled in
+			hardwareconstants.yaml and simulated, since a dark measurement would then be taken
+			under light
+		"""
+		if not getattr(self.shutter, 'blocks_light', True):
+			raise RuntimeError("Dark measurement requested but the shutter is simulated (disabled in hardwareconstants.yaml), the lamp would stay on")
 
 
 	def _source_voltage_measure_current(self):
@@ -86,7 +172,7 @@ class Control_Keithley:
 			Sets up sourcing voltage and measuring current
 		"""
 		self.keithley.apply_voltage()
-		self.keithley.measure_current()
+		self.keithley.measure_current(nplc = self.nplc)
 		self.keithley.compliance_current = self.compliance_current
 		self.keithley.souce_voltage = 0
 
@@ -96,22 +182,94 @@ class Control_Keithley:
 			Sets up sourcing current and measuring voltage
 		"""
 		self.keithley.apply_current()
-		self.keithley.measure_voltage()
+		self.keithley.measure_voltage(nplc = self.nplc)
 		self.keithley.compliance_voltage = self.compliance_voltage
 		self.keithley.source_current = 0
 
 
-	def _measure(self):
+	def _measure(self, elements = ('VOLT', 'CURR')):
 		"""
-			Measures voltage, current, and resistance
+			Measures the mean of self.counts readings
+			
+			Args:
+				elements (tuple = ('VOLT', 'CURR')): data elements to read back, ie ('CURR',) when
+					the measured voltage is not needed
 			
 			Returns:
-				list(np.ndarray): voltage (V), current (A), resistance (Ohms)
+				np.ndarray: mean of every element, ie voltage (V), current (A)
 		"""
 		self.keithley.config_buffer(self.counts)
-		self.keithley.start_buffer()
-		self.keithley.wait_for_buffer()
-		return self.keithley.means
+		self._run_buffer(self.counts)
+		return self.transfer.query(':CALC3:FORM MEAN;:CALC3:DATA?', 1, elements)[0].astype(np.float64)
+
+
+	def _enable_srq(self):
+		"""
+			Queues service request events from the instrument, so buffer completion can be waited
+			on without polling. Returns False if the interface does not support them (ie RS-232)
+		"""
+		from pyvisa import constants
+		from pyvisa.errors import VisaIOError
+
+		try:
+			self.keithley.adapter.connection.enable_event(constants.EventType.service_request, constants.EventMechanism.queue)
+		except (AttributeError, NotImplementedError, VisaIOError):
+			return False
+		return True
+
+
+	def _completion_timeout(self, n_readings):
+		"""
+			Returns:
+				float: time (s) n_readings should take at most, integration plus autozero for every
+					reading with a 2x margin, plus 1 s for the bus
+		"""
+		return 2*n_readings*(2*self.nplc/self.line_frequency + 0.005) + 1
+
+
+	def jv_duration(self, direction, vsteps = 50, light_and_dark = False):
+		"""
+			Returns:
+				float: nominal time (s) jv takes with these settings, integration plus autozero for
+					every reading without any margin
+		"""
+		n_readings = len(JV_DIRECTIONS[direction])*vsteps*(2 if light_and_dark else 1)
+		return n_readings*(2*self.nplc/self.line_frequency + 0.005)
+
+
+	@contextmanager
+	def _visa_timeout(self, seconds):
+		"""
+			Temporarily raises the VISA timeout, ie for a :READ? that blocks until a sweep is done
+		"""
+		connection = self.keithley.adapter.connection
+		previous = connection.timeout
+		connection.timeout = max(previous, 1000*seconds) # ms
+		try:
+			yield
+		finally:
+			connection.timeout = previous
+
+
+	def _run_buffer(self, n_readings):
+		"""
+			Triggers a configured buffer and blocks until it is full. With service requests the
+			VISA driver wakes us on the buffer-full SRQ enabled by config_buffer, otherwise *OPC?
+			returns once the readings are done. Either way there is no polling and no fixed sleep.
+		"""
+		from pyvisa import constants
+
+		timeout = self._completion_timeout(n_readings)
+		connection = self.keithley.adapter.connection
+		if self._srq:
+			connection.discard_events(constants.EventType.service_request, constants.EventMechanism.queue) # stale requests from an earlier buffer
+			self.keithley.start_buffer()
+			connection.wait_on_event(constants.EventType.service_request, int(1000*timeout))
+			connection.read_stb() # serial poll clears the request
+		else:
+			self.keithley.start_buffer()
+			with self._visa_timeout(timeout):
+				self.keithley.ask('*OPC?')
 
 
 	def _preview(self,xd,yd,xl,yl,label):
@@ -126,6 +284,8 @@ class Control_Keithley:
 				label (string): label for graph
 		"""
 
+		import matplotlib.pyplot as plt # deferred so headless runs never import matplotlib
+
 		def handle_close(evt, self):
 			del self.preview_figs[f'{xl},{yl}']
 
@@ -165,27 +325,74 @@ class Control_Keithley:
 			Returns:
 				list: Voltage (V), Current Density (mA/cm2), Current (A), and Measured Voltage (V) arrays and Light Boolean
 		"""
-		
-		# setup v, vmeas, i
-		v = np.linspace(vstart, vend, vsteps)
-		vmeas = np.zeros((vsteps,))
-		i = np.zeros((vsteps,))
-		
+		return self._jv_sweeps([(vstart, vend)], vsteps, light = light)[0]
+
+
+	def _jv_sweeps(self, legs, vsteps, light = True):
+		"""
+			Runs several JV sweeps back to back (ie fwd then rev) as one concatenated list sweep,
+			so the source is configured and armed once and there is no dead time between legs.
+			
+			Args:
+				legs (list(tuple)): (vstart, vend) of every sweep, in order (V)
+				vsteps (int): number of voltage steps per sweep
+				light (boolean = True): boolean to describe light status
+			
+			Returns:
+				list(list): one [v, i, vmeas, light] per leg, as returned by _jv_sweep
+		"""
+		v = [np.linspace(vstart, vend, vsteps) for vstart, vend in legs]
+		vmeas, i = self._list_sweep(np.concatenate(v), light = light)
+		vmeas = np.split(vmeas, len(legs))
+		i = np.split(i, len(legs))
+		return [[v[n], i[n], vmeas[n], light] for n in range(len(legs))]
+
+
+	def _list_sweep(self, v, light = True):
+		"""
+			Sources every voltage in v in a single armed SOUR:LIST sweep, taking self.counts readings
+			per point, and reads all of them back at once
+			
+			Args:
+				v (np.ndarray): voltages to source, in order (V)
+				light (boolean = True): boolean to describe light status
+			
+			Returns:
+				list(np.ndarray): Measured Voltage (V) and Current (A), averaged per point
+		"""
+		if not light:
+			self.require_shutter()
+		vlist = np.repeat(v, self.counts)
+		if len(vlist) > MAX_SWEEP_POINTS:
+			raise ValueError(f"A sweep can take at most {MAX_SWEEP_POINTS} readings, {len(v)} points x {self.counts} counts requested")
+
 		# set scan
 		self._source_voltage_measure_current()
-		self.keithley.source_voltage = vstart
+		self.keithley.source_voltage = vlist[0]
+		self.keithley.write(':TRAC:FEED:CONT NEV') # readings come back from :READ?, not the buffer
+		for n in range(0, len(vlist), SOURCE_LIST_CHUNK):
+			command = ':SOUR:LIST:VOLT' if n == 0 else ':SOUR:LIST:VOLT:APP'
+			self.keithley.write(f"{command} {','.join(f'{x:.6g}' for x in vlist[n:n + SOURCE_LIST_CHUNK])}")
+		self.keithley.write(':SOUR:VOLT:MODE LIST')
+		self.keithley.write(f':TRIG:COUN {len(vlist)}')
 		self.keithley.enable_source()
 		if light:
 			self.open_shutter()
-		for m, v_ in enumerate(v):
-			self.keithley.source_voltage = v_
-			vmeas[m], i[m], _ = self._measure()
-		if light:
-			self.close_shutter()
-		self.keithley.disable_source()
-		
-		# build dataframe and return
-		return v, i, vmeas, light
+		else:
+			self.close_shutter() # make sure a dark sweep is dark
+		try:
+			with self._visa_timeout(self._completion_timeout(len(vlist))):
+				readings = self.transfer.query(':READ?', len(vlist), ('VOLT', 'CURR')).astype(np.float64)
+		finally:
+			if light:
+				self.close_shutter()
+			self.keithley.disable_source()
+			self.keithley.write(':SOUR:VOLT:MODE FIX')
+			self.keithley.write(':TRIG:COUN 1')
+
+		# readings are [voltage, current] per trigger
+		readings = readings.reshape(len(v), self.counts, -1).mean(axis = 1)
+		return readings[:, 0], readings[:, 1]
 
 
 	def _format_jv(self, v, i, vmeas, light, name, dir, scan_number, preview = True):
@@ -202,6 +409,8 @@ class Control_Keithley:
 				scan_number (int): suffix for multiple scans in a row
 				preview (boolean = True): option to preview in graph
 		"""
+		import pandas as pd
+
 		# calc param
 		j = []
 		for value in i:
@@ -226,7 +435,14 @@ class Control_Keithley:
 			scan_n = ""
 		else:
 			scan_n = f'_{scan_number}'
-		data.to_csv(f'{name}{scan_n}_{dir}_{light_on_off}.csv')
+		fpath = os.path.abspath(f'{name}{scan_n}_{dir}_{light_on_off}.csv')
+		data.to_csv(fpath)
+		self.saved_files.append(fpath)
+		self._index_file(fpath, 'add_jv', vmeas, j, area = self.area)
+
+		# stream to remote monitors, see jvbot/status.py
+		if self.status is not None:
+			self.status.curve(f'{name}{scan_n}_{dir}_{light_on_off}', vmeas, j, name=name, direction=dir, light=light)
 
 		# preview
 		if preview:
@@ -235,44 +451,42 @@ class Control_Keithley:
 		return data
 
 
-	def _format_spo(self, v, i, vmeas, t, name, preview = True):
+	def _index_file(self, fpath, method, *args, **kwargs):
 		"""
-			Uses output of _jv_sweep along with crucial info to preview and save JV data
+			Records a saved file in self.index. The file is already on disk, so a failure here
+			(bad metrics, locked database...) is printed rather than aborting the scan
+		"""
+		if self.index is None:
+			return
+		try:
+			getattr(self.index, method)(fpath, *args, **kwargs)
+		except Exception as e:
+			print(f'Could not index {fpath}: {type(e).__name__}: {e}')
+
+
+	def _format_spo(self, buffer, name, preview = True):
+		"""
+			Finishes an SPO run: flushes the remaining points to {name}_SPO.csv and previews them
 			
 			Args:
-				v (np.ndarray(float)): voltage array (output from _sweep_jv)
-				i (np.ndarray(float)): current array (output from _sweep_jv)
-				t (np.ndarray(float)): current density array (output from _sweep_jv)
-				vmeas (np.ndarray(float)): measured voltage array (output from _sweep_jv)
-				light (boolean = True): boolean to describe status of light
+				buffer (TimeSeriesBuffer): SPO time series (filled by spo)
 				name (string): name of device
-				dir (string): direction -- fwd or rev
-				scan_number (int): suffix for multiple scans in a row
 				preview (boolean = True): option to preview in graph
-		"""
 
-		# calc params
-		j = []
-		for value in i:
-			j.append(-value*1000/self.area) #amps to mA/cm2. sign flip for solar cell current convention)	
-		p = [num1*num2 for num1, num2 in zip(j,vmeas)]
-
-		# build dataframe
-		data = pd.DataFrame({
-			'Voltage (V)': v,
-			'Current Density (mA/cm2)': j,
-			'Current (A)': i,
-			'Measured Voltage (V)': vmeas,
-			'Power Density (mW/cm2)': p,
-			'Time Elapsed (s)': t,
-		})
+			Returns:
+				pd.DataFrame: the full series, read back from {name}_SPO.csv
+		"""
+		buffer.close()
+		if self.index is not None and len(buffer):
+			tail = buffer.tail(10) # stabilized output, averaged over the last points
+			cols = buffer.columns
+			self._index_file(os.path.abspath(buffer.fpath), 'add_spo', tail[:, cols.index('Measured Voltage (V)')], tail[:, cols.index('Current Density (mA/cm2)')], area = self.area)
 
-		# save csv
-		data.to_csv(f'{name}_SPO.csv', sep=',')
+		data = buffer.read()
 
 		# preview
 		if preview:
-			self._preview(t, p,'Time (s)','Power (mW/cm2)', f'{name}_SPO')
+			self._preview(data['Time Elapsed (s)'].values, data['Power Density (mW/cm2)'].values,'Time (s)','Power (mW/cm2)', f'{name}_SPO')
 
 		return data
 
@@ -291,7 +505,7 @@ class Control_Keithley:
 		self.keithley.source_voltage = 0
 		self.keithley.enable_source()
 		self.open_shutter()
-		isc = -self._measure()[1]
+		isc = -self._measure(('CURR',))[0]
 		jsc_val = isc*1000/self.area
 		self.close_shutter()
 		self.keithley.disable_source()
@@ -314,7 +528,7 @@ class Control_Keithley:
 		self.souce_current = 0
 		self.keithley.enable_source()
 		self.open_shutter()
-		voc_val = self._measure()[0]
+		voc_val = self._measure(('VOLT',))[0]
 		self.close_shutter()
 		self.keithley.disable_source()
 		if printed:
@@ -322,7 +536,7 @@ class Control_Keithley:
 		return voc_val
 
 
-	def jv(self, name, direction, vmin, vmax, vsteps = 50, light = True, preview = True):
+	def jv(self, name, direction, vmin, vmax, vsteps = 50, light = True, preview = True, scan_number = None, light_and_dark = False):
 		"""
 			Conducts a JV scan, previews data, saves file
 			
@@ -334,7 +548,14 @@ class Control_Keithley:
 				vsteps (int = 50): number of voltage steps between max and min
 				light (boolean = True): boolean to describe status of light
 				preview (boolean = True): boolean to determine if data is plotted
+				scan_number (int = None): suffix for multiple scans of the same device, ie elapsed time
+				light_and_dark (boolean = False): measure under light, then close the shutter and measure
+					dark at the same contact. overrides light
 		"""
+		if direction not in JV_DIRECTIONS:
+			raise ValueError(f"direction must be one of {list(JV_DIRECTIONS.keys())}")
+		if light_and_dark or not light:
+			self.require_shutter() # before the light sweep of light_and_dark is taken
 
 		# fwd is going to be from the lower abs v to higher abs v, reverse will be opposite
 		if abs(vmin) < abs(vmax):
@@ -344,46 +565,18 @@ class Control_Keithley:
 			v0 = vmax
 			v1 = vmin
 
-		# seperate on call using _jv_sweep and _format_jv functions for light and dark
-		if light:
-			if (direction == 'fwd'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-			elif (direction == 'rev'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-			elif (direction == 'fwdrev'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-			elif (direction == 'revfwd'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-		if not light:
-			if (direction == 'fwd'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-			elif (direction == 'rev'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-			elif (direction == 'fwdrev'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-			elif (direction == 'revfwd'):
-				v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=None, preview = preview)
-				v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=None, preview = preview)
-
-
-	def spo(self, name, vstart, vstep, vdelay, interval, interval_count, preview = True):
+		# every direction of a fwdrev/revfwd scan runs in one list sweep, then gets its own file
+		dirs = JV_DIRECTIONS[direction]
+		legs = [(v0, v1) if dir == 'fwd' else (v1, v0) for dir in dirs]
+		for light in ([True, False] if light_and_dark else [light]):
+			for dir, (v, i, vmeas, leg_light) in zip(dirs, self._jv_sweeps(legs, vsteps, light = light)):
+				data = self._format_jv(v=v, i=i, vmeas=vmeas, light=leg_light, name=name, dir=dir, scan_number=scan_number, preview = preview)
+
+
+	def spo(self, name, vstart, vstep, vdelay, interval, interval_count, preview = True, algorithm = 'po', vseed_max = None):
 		""" 
-			Function to run a SPO test.
+			Function to run a SPO test. Points are taken on a fixed deadline every `interval`
+			seconds and the next voltage is chosen by a pluggable MPP tracker (see mppt.py).
 			
 			Args:
 				name (string): name of device/file
@@ -393,129 +586,76 @@ class Control_Keithley:
 				interval (float) : time between measurements (s)
 				interval_count (int): number of times to repeat interval
 				preview (boolean = True): boolean to determine if data is plotted
+				algorithm (string = 'po'): MPP tracker -- 'po' (adaptive perturb and observe),
+					'incremental_conductance', or 'golden' (golden-section search seeded from a fast JV)
+				vseed_max (float = None): upper voltage of the seed JV for 'golden', defaults to 1.5*vstart
 
-		"""
+			Returns:
+				pd.DataFrame: the SPO series, as saved to {name}_SPO.csv
+		"""
+		if algorithm not in MPPT_ALGORITHMS:
+			raise ValueError(f"algorithm must be one of {list(MPPT_ALGORITHMS.keys())}")
+
+		# seed golden-section search from a fast, coarse JV
+		vlimits = (0, self.compliance_voltage)
+		if algorithm == 'golden':
+			if vseed_max is None:
+				vseed_max = 1.5*vstart
+			vseed, iseed, _, _ = self._jv_sweep(vstart = 0, vend = vseed_max, vsteps = 15, light = True)
+			tracker = GoldenSection.from_jv(vseed, -iseed, vstep, vlimits = vlimits)
+		else:
+			tracker = MPPT_ALGORITHMS[algorithm](vstart, vstep, vlimits = vlimits)
 		
-		# setup v, vmeas, i arrays for MPP tracking
-		v = [] # positive
-		vmeas = [] # positive
-		i = [] # negative
-		t = [] # time
+		# spo data goes straight into a flat-memory buffer that spills to disk as it runs
+		buffer = TimeSeriesBuffer(f'{name}_SPO.csv', SPO_COLUMNS)
 		
 		# setup keithly config
 		self._source_voltage_measure_current()
 		self.open_shutter()
 		self.keithley.source_voltage = 0
 		self.keithley.enable_source()
-		vapplied = vstart
-
-		# first measurement
-		stime = time.time()
-		ctime = time.time() - stime
-		n = 0
-
-		# make two measurements, iterating voltage in + direction
-		while ctime < interval*(2):
-
-			# if we arent at the next time, sleep; else run
-			if (ctime <= n*interval):
-				time.sleep(1e-3)
-			else:
+		vapplied = tracker.start()
+
+		# measure on a fixed deadline, sleeping until each one instead of polling
+		try:
+			stime = time.time()
+			for n in range(interval_count):
+				delay = stime + n*interval - time.time()
+				if delay > 0:
+					time.sleep(delay)
 				self.keithley.source_voltage = vapplied
-				time.sleep(vdelay)
-				tempv, tempi, _ = self._measure()
-				vmeas.append(tempv)
-				v.append(vapplied)
-				i.append(tempi)
-				t.append(ctime)
-				print(vapplied,tempv,tempi,n)
-				n+=1 
-				vapplied += vstep
-			ctime = time.time() - stime
-
-		# until we have passed the interval 
-		while ctime < interval*(interval_count):
-
-			# if we arent at the next time, sleep; else run
-			if ctime < interval*n:
-				time.sleep(1e-3)
-			else:
-
-				# calculate last powers
-				p0 = vmeas[-2]*i[-2]
-				p1 = vmeas[-1]*i[-1]
-
-				# iterate in appropriate direction
-				if p1 <= p0: #p dec
-					if v[-1] < v[-2]: #v dec
-						vapplied += vstep 
-					else:
-						vapplied -= vstep
-				else: # p inc
-					if v[-1] > v[-2]: #v dec
-						vapplied -= vstep 
-					else:
-						vapplied += vstep
-
-					# apply voltage, measure current and voltage
-					self.keithley.source_voltage = vapplied
+				if vdelay:
 					time.sleep(vdelay)
-					tempv, tempi, _ = self._measure()
-					
-					# update dictionary & arrays
-					vmeas.append(tempv)
-					v.append(vapplied)
-					i.append(tempi)
-					t.append(ctime)
-					print(vapplied,tempv,tempi,n)
-					n+=1
-			ctime = time.time() - stime
-		
-		# shutoff keithley
-		self.keithley.disable_source()
-		self.close_shutter()
+				tempv, tempi = self._measure()
+				j = -tempi*1000/self.area #amps to mA/cm2. sign flip for solar cell current convention
+				buffer.append(vapplied, j, tempi, tempv, j*tempv, time.time() - stime)
+				if self.status is not None:
+					self.status.publish('spo', name=name, t=time.time() - stime, v=tempv, p=j*tempv)
+				vapplied = tracker.update(tempv, -tempi) # tracker works with generated (positive) current
+		finally:
+			# shutoff keithley
+			self.keithley.disable_source()
+			self.close_shutter()
+			buffer.close()
 
 		# save data
-		data = self._format_spo(v=v,i=i,t=t,vmeas=vmeas,name=name, preview = preview)
+		return self._format_spo(buffer, name=name, preview = preview)
 
 
 	def jsc_time(self, name, interval, interval_count, preview = True):
 		"""
-			Conducts multiple jcc scans over a period of time, preveiws data, saves file
+			Conducts multiple jsc scans over a period of time, preveiws data, saves file
 			
 			Args:
 				name (string): name of device
 				interval (float): time between JV scans (s)
 				interval_count (int): number of times to repeat interval
 				preview (boolean = True): boolean to determine if data is plotted
-		"""
-		
-		# create header
-		data_df = pd.DataFrame(columns = ["Time", "Jsc (mA/cm2)"])
-		data_df.to_csv(f'{name}_jsc.csv', sep = ',')
-		del data_df
-		xs = []
-		ys = []
-
-		# cycle through for duration of test
-		n = 0
-		stime = time.time()
-		ctime = time.time()-stime
-		while (ctime <= interval*(interval_count+1)):
 
-			# if we arent at the next time, sleep; else run
-			if (ctime < n*interval):
-				time.sleep(1e-3)
-			else:
-				jsc_val = self.voc(printed = False)
-				new_data_df = pd.DataFrame(data=zip([ctime],[jsc_val]), index =[n])
-				new_data_df.to_csv(f'{name}_jsc.csv', mode='a', header=False, sep=',')
-				if preview:
-					self._preview([ctime], [jsc_val],'Time (s)','Short Circut Current Density (mA/cm2)', f'{name}')
-				del new_data_df
-				n += 1
-
-			ctime = time.time()-stime
+			Returns:
+				pd.DataFrame: the series, read back from the csv
+		"""
+		return self._point_time(self.jsc, name, f'{name}_jsc.csv', "Jsc (mA/cm2)", 'Short Circut Current Density (mA/cm2)', interval, interval_count, preview)
 
 
 	def voc_time(self, name, interval, interval_count, preview = True):
@@ -527,33 +667,33 @@ class Control_Keithley:
 				interval (float) : time between JV scans (s)
 				interval_count (int): number of times to repeat interval
 				preview (boolean = True): boolean to determine if data is plotted
+
+			Returns:
+				pd.DataFrame: the series, read back from the csv
 		"""
-		
-		# create header
-		data_df = pd.DataFrame(columns = ["Time", "Voc (V)"])
-		data_df.to_csv(f'{name}_voc.csv', sep = ',')
-		del data_df
+		return self._point_time(self.voc, name, f'{name}_voc.csv', "Voc (V)", 'Open Circut Voltage (V)', interval, interval_count, preview)
 
-		# cycle through for duration of test
-		n = 0
-		stime = time.time()
-		ctime = time.time()-stime
-		
-		while (ctime <= interval*(interval_count+1)):
 
-			# if we arent at the next time, sleep; else run
-			if (ctime < n*interval):
-				time.sleep(1e-3)
-			else:	
-				voc_val = self.voc(printed = False)
-				new_data_df = pd.DataFrame(data=zip([ctime],[voc_val]), index =[n])
-				new_data_df.to_csv(f'{name}_voc.csv', mode='a', header=False, sep=',')
+	def _point_time(self, measure, name, fpath, column, label, interval, interval_count, preview):
+		"""
+			Shared loop for jsc_time and voc_time: calls measure() on a fixed deadline every interval
+			and streams the values into a TimeSeriesBuffer
+		"""
+		buffer = TimeSeriesBuffer(fpath, ["Time", column])
+		try:
+			stime = time.time()
+			for n in range(interval_count + 1):
+				delay = stime + n*interval - time.time()
+				if delay > 0:
+					time.sleep(delay)
+				ctime = time.time() - stime
+				val = measure(printed = False)
+				buffer.append(ctime, val)
 				if preview:
-					self._preview([ctime], [voc_val],'Time (s)','Open Circut Voltage (V)', f'{name}')
-				del new_data_df
-				n += 1
-
-			ctime = time.time()-stime
+					self._preview([ctime], [val],'Time (s)', label, f'{name}')
+		finally:
+			buffer.close()
+		return buffer.read()
 
 	def jv_time(self, name, direction, vmin, vmax, interval, interval_count, vsteps = 50, light = True, preview = True):
 		"""
@@ -582,50 +722,7 @@ class Control_Keithley:
 			if (ctime <= n*interval):
 				time.sleep(1e-3)
 			else:
-						
-				# fwd is going to be from the lower abs v to higher abs v, reverse will be opposite
-				if abs(vmin) < abs(vmax):
-					v0 = vmin
-					v1 = vmax
-				elif abs(vmin) > abs(vmax):
-					v0 = vmax
-					v1 = vmin
-
-				# seperate on call using _jv_sweep and _format_jv functions for light and dark
-				if light:
-					if (direction == 'fwd'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
-					elif (direction == 'rev'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-					elif (direction == 'fwdrev'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-					elif (direction == 'revfwd'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = True)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
-				if not light:
-					if (direction == 'fwd'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
-					elif (direction == 'rev'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-					elif (direction == 'fwdrev'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-					elif (direction == 'revfwd'):
-						v, i, vmeas, light = self._jv_sweep(vstart = v1, vend = v0, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='rev', scan_number=int(ctime), preview = True)
-						v, i, vmeas, light = self._jv_sweep(vstart = v0, vend = v1, vsteps = vsteps, light = False)
-						data = self._format_jv(v=v, i=i, vmeas=vmeas, light=light, name=name, dir='fwd', scan_number=int(ctime), preview = True)
+				self.jv(name, direction, vmin, vmax, vsteps = vsteps, light = light, preview = preview, scan_number = int(ctime))
 				n+=1
 			ctime = time.time()-stime
 
@@ -2,31 +2,75 @@ import serial
 import time
 import re
 import numpy as np
-from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton
-import PyQt5
-import yaml
-import os
 
 # from PyQt5.QtCore.Qt import AlignHCenter
 from functools import partial
-from jvbot.hardware.helpers import get_port
+from jvbot.hardware.helpers import get_port, invalidate_port, load_constants
+from jvbot.hardware.transcript import RecordingSerial
 
+LINK_ERRORS = (serial.SerialException, OSError)  # raised by pyserial when the usb link drops
+POSITION_REGEX = re.compile(r"X:(\S+)\s+Y:(\S+)\s+Z:(\S+)")  # M114 report
 
-MODULE_DIR = os.path.dirname(__file__)
-with open(os.path.join(MODULE_DIR, "hardwareconstants.yaml"), "r") as f:
-    constants = yaml.load(f, Loader=yaml.FullLoader)
+
+class GantryConnectionError(Exception):
+    """the serial link to the gantry was lost and could not be restored"""
+
+
+class _MoveInterrupted(Exception):
+    """a move was cut off by a reconnect that lost the stage position"""
 
 
 class Gantry:
-    def __init__(self, port=None):
+    def __init__(self, port=None, handle=None, record=None):
+        """
+        handle replaces the pyserial handle, ie a ReplaySerial. record is a Transcript that every
+        byte sent and received is appended to
+        """
+        constants = load_constants()
         # communication variables
-        if port is None:
-            self.port = get_port(constants["gantry"]["device_identifiers"])
+        self._injected_handle = handle
+        self._transcript = record
+        if handle is not None:
+            self._device_identifiers = None
+            self.port = port
+        elif port is None:
+            self._device_identifiers = constants["gantry"]["device_identifiers"]
+            self.port = get_port(self._device_identifiers)
         else:
+            self._device_identifiers = None  # explicit port, never re-resolved
             self.port = port
         self.POLLINGDELAY = constants["gantry"][
             "pollingrate"
         ]  # delay between sending a command and reading a response, in seconds
+        self.RECONNECT_ATTEMPTS = constants["gantry"].get(
+            "reconnect_attempts", 5
+        )  # times to try reopening the serial port after the link drops
+        self.RECONNECT_DELAY = constants["gantry"].get(
+            "reconnect_delay", 0.5
+        )  # initial wait (s) before reopening, doubled after every failed attempt
+        self.UPDATE_ATTEMPTS = constants["gantry"].get(
+            "update_attempts", 10
+        )  # M114 queries without a position report before the link is considered dead
+        self.COMMANDTIMEOUT = constants["gantry"].get(
+            "command_timeout", 5
+        )  # max time (s) to wait for the board to acknowledge a command
+        self.HOMETIMEOUT = constants["gantry"].get(
+            "home_timeout", 240
+        )  # max time (s) to wait for homing to finish
+        self.VERIFY_EVERY = constants["gantry"].get(
+            "verify_every", 10
+        )  # moves between M114 position checks, 0 to never check
+        self.MAX_SPEED = [
+            constants["gantry"]["max_speed"][ax] for ax in "xyz"
+        ]  # mm/s per axis, sent with M203
+        self.MAX_ACCELERATION = [
+            constants["gantry"]["max_acceleration"][ax] for ax in "xyz"
+        ]  # mm/s2 per axis, sent with M201
+        self.MOTION_PROFILES = constants["gantry"]["motion_profiles"]
+        self.set_motion_profile("default")
+        self._acceleration = None  # travel acceleration last sent with M204
+        self._moves_since_verify = 0
+        self._reconnecting = False  # set while _reconnect runs, so its own writes do not reconnect again
 
         # gantry variables
         self.__LIMITS = constants["gantry"]["limits"]  # coordinate system for gantry
@@ -41,6 +85,7 @@ class Gantry:
             None,
         ]  # start at None's to indicate stage has not been homed.
         self.__targetposition = [None, None, None]
+        self._targetspeed = None
         self.GANTRYTIMEOUT = constants["gantry"][
             "timeout"
         ]  # max time allotted to gantry motion before flagging an error, in seconds
@@ -55,7 +100,17 @@ class Gantry:
 
     # communication methods
     def connect(self):
-        self._handle = serial.Serial(port=self.port, timeout=1, baudrate=115200)
+        try:
+            self._open()
+        except serial.SerialException:
+            if self._device_identifiers is None:
+                raise
+            # cached port is stale (device re-enumerated), look it up again once
+            invalidate_port(self._device_identifiers)
+            self.port = get_port(self._device_identifiers, use_cache=False)
+            self._open()
+        time.sleep(self.POLLINGDELAY)
+        self._handle.reset_input_buffer()  # drop the boot banner
         self.update()
         # self.update_gripper()
         if self.position == [
@@ -72,6 +127,84 @@ class Gantry:
         self.set_defaults()
         print("Connected to gantry")
 
+    def _open(self):
+        # timeouts on both directions, so a dead link raises instead of blocking forever
+        if self._injected_handle is not None:
+            handle = self._injected_handle
+        else:
+            handle = serial.Serial(
+                port=self.port, timeout=1, write_timeout=1, baudrate=115200
+            )
+        if self._transcript is not None:
+            handle = RecordingSerial(handle, self._transcript)
+        self._handle = handle
+
+    def _reconnect(self):
+        """
+        reopens the serial link with exponential backoff, then checks that the board still
+        knows where the stage is. re-homes if it does not. returns True if the stage was re-homed.
+        a link that drops again while restoring the defaults counts as a failed attempt, after
+        RECONNECT_ATTEMPTS of them GantryConnectionError is raised
+        """
+        if self._reconnecting:
+            raise GantryConnectionError("Gantry link dropped again while reconnecting")
+        self._reconnecting = True
+        try:
+            return self._restore_link()
+        finally:
+            self._reconnecting = False
+
+    def _restore_link(self):
+        last_position = list(self.position)
+        delay = self.RECONNECT_DELAY
+        for attempt in range(self.RECONNECT_ATTEMPTS):
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+            time.sleep(delay)
+            try:
+                if self._device_identifiers is not None:
+                    # the board may come back on a different port after re-enumerating
+                    invalidate_port(self._device_identifiers)
+                    self.port = get_port(self._device_identifiers, use_cache=False)
+                self._open()
+                self._handle.reset_input_buffer()
+                self.set_defaults()
+                self.write(
+                    "M400", timeout=self.HOMETIMEOUT
+                )  # let a move that was already queued finish before reading back
+                self.update()
+                break
+            except (*LINK_ERRORS, ValueError, GantryConnectionError) as e:
+                print(f"Gantry reconnect attempt {attempt + 1} failed: {e}")
+                delay *= 2
+        else:
+            raise GantryConnectionError(
+                f"Could not reconnect to gantry after {self.RECONNECT_ATTEMPTS} attempts"
+            )
+
+        unhomed = self.position == [
+            self.__LIMITS["x_max"],
+            self.__LIMITS["y_max"],
+            self.__LIMITS["z_max"],
+        ]
+        if None in last_position:
+            print("Reconnected to gantry")
+            return False
+        # the interrupted move may or may not have been executed before the link dropped
+        known = [p for p in (last_position, self.__targetposition) if None not in p]
+        if unhomed or all(
+            np.linalg.norm([a - b for a, b in zip(self.position, p)])
+            > self.POSITIONTOLERANCE
+            for p in known
+        ):
+            print("Reconnected to gantry, position was lost - rehoming")
+            self._home()
+            return True
+        print("Reconnected to gantry, position verified")
+        return False
+
     def disconnect(self):
         self._handle.close()
         del self._handle
@@ -82,32 +215,72 @@ class Gantry:
         self.write(
             "M92 X53.0 Y53.0 Z3200.0"
         )  # feedrate steps/mm, randomly resets to defaults sometimes idk why
+        x, y, z = self.MAX_ACCELERATION
         self.write(
-            "M201 X250.0 Y250.0 Z10.0"
+            f"M201 X{x} Y{y} Z{z}"
         )  # acceleration steps/mm/mm, randomly resets to defaults sometimes idk why
+        self._acceleration = None
         self.write(
             "M906 X580 Y580 Z25 E1"
         )  # set max stepper RMS currents (mA) per axis. E = extruder, unused to set low
         self.write(
             "M84 S0"
         )  # disable stepper timeout, steppers remain engaged all the time
+        x, y, z = self.MAX_SPEED
         self.write(
-            f"M203 X50 Y50 Z1.00"
+            f"M203 X{x} Y{y} Z{z:.2f}"
         )  # set max speeds, steps/mm. Z is hardcoded, limited by lead screw hardware.
 
-    def write(self, msg):
-        #print("We are in selfwrite")
+    def set_motion_profile(self, profile="default"):
+        """
+        sets speeds and accelerations used by moveto. profile is either the name of a profile in
+        hardwareconstants.yaml or a dict overriding parts of the default profile
+        """
+        if isinstance(profile, str):
+            if profile not in self.MOTION_PROFILES:
+                raise ValueError(
+                    f'Invalid motion profile "{profile}". Available profiles are: {list(self.MOTION_PROFILES.keys())}.'
+                )
+            profile = self.MOTION_PROFILES[profile]
+        merged = {}
+        for key, value in self.MOTION_PROFILES["default"].items():
+            if isinstance(value, dict):
+                merged[key] = {**value, **profile.get(key, {})}
+            else:
+                merged[key] = profile.get(key, value)
+        self.motion_profile = merged
+
+    def write(self, msg, timeout=None):
+        try:
+            return self._write(msg, timeout)
+        except LINK_ERRORS as e:
+            if self._reconnecting:
+                raise  # _reconnect counts it as a failed attempt
+            print(f"Gantry link dropped while sending {msg} ({e}), reconnecting")
+            rehomed = self._reconnect()
+            if rehomed and msg.startswith(("G0", "M400")):
+                raise _MoveInterrupted(msg)  # caller replays the move from the new position
+            return self._write(msg, timeout)
+
+    def _write(self, msg, timeout=None):
+        """
+        sends one command and reads until the board acknowledges it with "ok". returns the
+        other lines it sent back. marlin acknowledges M400 and G28 only once motion is done
+        """
+        if timeout is None:
+            timeout = self.COMMANDTIMEOUT
         self._handle.write(f"{msg}\n".encode())
-        time.sleep(self.POLLINGDELAY)
+        deadline = time.time() + timeout
         output = []
-        while self._handle.in_waiting:
+        while time.time() < deadline:
             line = self._handle.readline().decode("utf-8").strip()
-            if line != "ok":
-                #print('this is the variable line in write function which is appended to output', line)
+            if line.startswith("ok"):
+                return output
+            if line:
                 output.append(line)
-            time.sleep(self.POLLINGDELAY)
-        #print('this is the value the variable "output" holds while it is in the write function:', output)
-        return output
+        raise serial.SerialTimeoutException(
+            f"No acknowledgement from gantry for {msg} within {timeout} s"
+        )
 
     def _enable_steppers(self):
         self.write("M17")
@@ -117,29 +290,37 @@ class Gantry:
 
     def update(self):
         found_coordinates = False
+        attempts = 0
         while not found_coordinates:
+            if attempts >= self.UPDATE_ATTEMPTS:
+                raise GantryConnectionError(
+                    f"No position report from gantry after {attempts} M114 queries"
+                )
+            attempts += 1
             output = self.write("M114")  # get current position
             #print('This is the value the variable "output" holds in the update function:',output)
             for line in output:
-                if line.startswith("X:"):
-                    x = float(re.findall(r"X:(\S*)", line)[0])
-                    y = float(re.findall(r"Y:(\S*)", line)[0])
-                    z = float(re.findall(r"Z:(\S*)", line)[0])
+                match = POSITION_REGEX.match(line)
+                if match:
+                    x, y, z = (float(v) for v in match.groups())
                     found_coordinates = True
                     break
         self.position = [x, y, z]
+        self._moves_since_verify = 0
 
         #print('This is the value x,y,z have in the update function which is then passed on to position:',x,y,z)
 
     # gantry methods
     def gohome(self):
         #print("Go home is sent")
-        self.write("G28 Z")
-        self.update()
-        self.write("G28 X Y")
-        self.update()
+        self._home()
         self.movetoload()
 
+    def _home(self):
+        self.write("G28 Z", timeout=self.HOMETIMEOUT)
+        self.write("G28 X Y", timeout=self.HOMETIMEOUT)
+        self.update()
+
     def premove(self, x, y, z):
         """
         checks to confirm that all target positions are valid
@@ -216,9 +397,12 @@ class Gantry:
 
         return x, y, z
 
-    def moveto(self, x=None, y=None, z=None, zhop=True):
+    def moveto(self, x=None, y=None, z=None, zhop=True, zhop_height=None, speed=None, acceleration=None):
         """
-        moves to target position in x,y,z (mm)
+        moves to target position in x,y,z (mm). with zhop the gantry lifts, traverses and then
+        approaches the target using the speeds of the current motion profile. zhop_height (mm)
+        overrides the lift height of self.ZHOP_HEIGHT. speed (mm/s) and acceleration (mm/s2)
+        override the profile's traverse for this move, lift and approach keep theirs
         """
         try:
             if len(x) == 3:
@@ -229,37 +413,103 @@ class Gantry:
         # here it seems to override that x,y,z
         x, y, z = self.premove(x, y, z)  # will error out if invalid move
 
+        profile = self.motion_profile
+        traverse = dict(profile["traverse"])
+        if speed is not None:
+            traverse["speed"] = speed
+        if acceleration is not None:
+            traverse["acceleration"] = acceleration
         if (x == self.position[0]) and (y == self.position[1]):
             zhop = False  # no use zhopping for no lateral movement
         if zhop:
+            hop = self.ZHOP_HEIGHT if zhop_height is None else -abs(zhop_height)
             z_ceiling = (
-                min(self.position[2], z) + self.ZHOP_HEIGHT
+                min(self.position[2], z) + hop
             )
             # closest z coordinate to bottom along path
             z_floor = max(
                 z_ceiling, self.__ZLIM
             )  # cant z-hop above build volume. mostly here for first move after homing.
-            self.moveto(z=z_ceiling, zhop=False)
-            self.moveto(x, y, z_ceiling, zhop=False)
-            self.moveto(z=z, zhop=False)
+            self._movecommand(self.position[0], self.position[1], z_floor, **profile["lift"])
+            self._movecommand(x, y, z_floor, **traverse)
+            self._approach(x, y, z)
+        elif z > self.position[2] and (x, y) == tuple(self.position[:2]):
+            self._approach(x, y, z)
         else:
-            self._movecommand(x, y, z)
+            self._movecommand(x, y, z, **traverse)
+
+    def move_duration(self, start, end, zhop_height=None):
+        """
+        nominal time (s) moveto(end, zhop_height=zhop_height) takes from start with the current
+        motion profile, ignoring acceleration
+        """
+        profile = self.motion_profile
+        lateral = float(np.hypot(end[0] - start[0], end[1] - start[1]))
+        if lateral == 0:
+            return abs(end[2] - start[2]) / profile["approach"]["speed"]
+        hop = abs(self.ZHOP_HEIGHT if zhop_height is None else zhop_height)
+        z_ceiling = max(min(start[2], end[2]) - hop, self.__ZLIM)
+        down = end[2] - z_ceiling
+        slow = min(profile["approach_distance"], down)
+        return (
+            (start[2] - z_ceiling) / profile["lift"]["speed"]
+            + lateral / profile["traverse"]["speed"]
+            + (down - slow) / profile["lift"]["speed"]
+            + slow / profile["approach"]["speed"]
+        )
+
+    def _approach(self, x, y, z):
+        """lowers onto the target, slowing down for the last approach_distance mm"""
+        profile = self.motion_profile
+        z_slow = z - profile["approach_distance"]
+        if z_slow > self.position[2]:
+            self._movecommand(x, y, z_slow, **profile["lift"])
+        self._movecommand(x, y, z, **profile["approach"])
 
     def movetoload(self):
         self.moveto(self.LOAD_COORDINATES)
 
-    def _movecommand(self, x: float, y: float, z: float):
-        """internal command to execute a direct move from current location to new location"""
+    def _movecommand(
+        self, x: float, y: float, z: float, speed: float = None, acceleration: float = None
+    ):
+        """
+        internal command to execute a direct move from current location to new location. speed
+        (mm/s) and acceleration (mm/s2) apply to this move only, limited by the axis maximums
+        """
         if self.position == [x, y, z]:
             return True  # already at target position
         else:
             self.__targetposition = [x, y, z]
-            self.write(f"G0 X{x} Y{y} Z{z}")
-            return self._waitformovement()
-
-    def moverel(self, x=0, y=0, z=0, zhop=False):
+            self._targetspeed = speed
+            command = f"G0 X{x} Y{y} Z{z}"
+            if speed is not None:
+                command += f" F{speed * 60:g}"  # marlin feedrates are mm/min
+            try:
+                self._set_acceleration(acceleration)
+                self.write(command)
+                return self._waitformovement()
+            except _MoveInterrupted:
+                pass
+            except (*LINK_ERRORS, GantryConnectionError) as e:
+                print(f"Gantry link dropped during move to {[x, y, z]} ({e}), reconnecting")
+                if not self._reconnect():
+                    # position verified, the board is where we think it is. resend the move
+                    self._set_acceleration(acceleration)
+                    self.write(command)
+                    return self._waitformovement()
+            # stage was re-homed, go back to the interrupted target with a z hop
+            self.moveto(x, y, z)
+            return True
+
+    def _set_acceleration(self, acceleration):
+        if acceleration is not None and acceleration != self._acceleration:
+            self.write(f"M204 T{acceleration}")  # travel acceleration, mm/s2
+            self._acceleration = acceleration
+
+    def moverel(self, x=0, y=0, z=0, zhop=False, speed=None, acceleration=None):
         """
-        moves by coordinates relative to the current position
+        moves by coordinates relative to the current position, see moveto for speed and
+        acceleration
         """
         try:
             if len(x) == 3:
@@ -269,41 +519,43 @@ class Gantry:
         x += self.position[0]
         y += self.position[1]
         z += self.position[2]
-        self.moveto(x, y, z, zhop)
+        self.moveto(x, y, z, zhop, speed=speed, acceleration=acceleration)
 
     def _waitformovement(self):
         """
-        confirm that gantry has reached target position. returns False if
-        target position is not reached in time allotted by self.GANTRYTIMEOUT
+        confirm that gantry has reached target position. a single M400 is acknowledged once the
+        move is done, the commanded position is then taken as the new position. the position is
+        read back with M114 every self.VERIFY_EVERY moves, returns False if it is off target
         """
         self.inmotion = True
-        start_time = time.time()
-        time_elapsed = time.time() - start_time
-        self._handle.write(f"M400\n".encode())
-        self._handle.write(f"M118 E1 FinishedMoving\n".encode())
-        reached_destination = False
-        while not reached_destination and time_elapsed < self.GANTRYTIMEOUT:
-            time.sleep(self.POLLINGDELAY)
-            while self._handle.in_waiting:
-                line = self._handle.readline().decode("utf-8").strip()
-                if line == "echo:FinishedMoving":
-                    self.update()
-                    if (
-                        np.linalg.norm(
-                            [
-                                a - b
-                                for a, b in zip(self.position, self.__targetposition)
-                            ]
-                        )
-                        < self.POSITIONTOLERANCE
-                    ):
-                        reached_destination = True
-                time.sleep(self.POLLINGDELAY)
-            time_elapsed = time.time() - start_time
-
-        self.inmotion = ~reached_destination
+        distance = [
+            abs(a - b) if a is not None else 0
+            for a, b in zip(self.position, self.__targetposition)
+        ]
+        speeds = [
+            v if self._targetspeed is None else min(v, self._targetspeed)
+            for v in self.MAX_SPEED
+        ]
+        travel_time = max(d / v for d, v in zip(distance, speeds))
+        self.write("M400", timeout=self.GANTRYTIMEOUT + 2 * travel_time)
+        self.inmotion = False
+        self.position = list(self.__targetposition)
+        self._moves_since_verify += 1
+        if self.VERIFY_EVERY and self._moves_since_verify >= self.VERIFY_EVERY:
+            return self.verify_position()
+        return True
+
+    def verify_position(self):
+        """
+        reads the position back with M114, returns True if it matches the commanded position
+        """
+        target = list(self.position)
         self.update()
-        return reached_destination
+        error = np.linalg.norm([a - b for a, b in zip(self.position, target)])
+        if error > self.POSITIONTOLERANCE:
+            print(f"Gantry is {error:.2f} mm off the commanded position {target}")
+            return False
+        return True
 
     # GUI
     def gui(self):
@@ -312,6 +564,11 @@ class Gantry:
 
 class GantryGUI:
     def __init__(self, gantry):
+        # PyQt5 is only imported when the GUI is actually opened, headless runs never pay for it
+        import PyQt5
+        import PyQt5.QtCore
+        from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton
+
         AlignHCenter = PyQt5.QtCore.Qt.AlignHCenter
         self.gantry = gantry
         self.app = PyQt5.QtCore.QCoreApplication.instance()
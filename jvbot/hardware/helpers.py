@@ -1,5 +1,23 @@
 import serial.tools.list_ports as lp
 import sys
+import os
+import json
+import yaml
+from functools import lru_cache
+
+MODULE_DIR = os.path.dirname(__file__)
+BY_ID_DIR = "/dev/serial/by-id"
+PORT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".jvbot", "ports.json")
+_IDENTIFIER_ALIASES = {"serialid": "serial_number"}
+
+
+@lru_cache(maxsize=None)
+def load_constants():
+    """
+    reads hardwareconstants.yaml. cached, so the file is only parsed on first use rather than at import
+    """
+    with open(os.path.join(MODULE_DIR, "hardwareconstants.yaml"), "r") as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
 
 
 def which_os():
@@ -14,34 +32,107 @@ def which_os():
         raise EnvironmentError("Unsupported platform")
 
 
-def _get_port_windows(device_identifiers):
-    for p in lp.comports():
-        match = True
-        for attr, value in device_identifiers.items():
-            if getattr(p, attr) != value:
-                match = False
-        if match:
-            return p.device
-    raise ValueError("Cannot find a matching port!")
+def _normalize_identifiers(device_identifiers):
+    # "serialid" is the old name for pyserial's serial_number
+    return {
+        _IDENTIFIER_ALIASES.get(attr, attr): value
+        for attr, value in device_identifiers.items()
+    }
+
 
+def _matches(p, device_identifiers):
+    return all(getattr(p, attr, None) == value for attr, value in device_identifiers.items())
 
-def _get_port_linux(serial_number):
+
+def _find_port(device_identifiers):
     """
-    finds port number for a given hardware serial number
+    enumerates serial ports once and returns the first whose vid/pid/serial_number/... all match
     """
     for p in lp.comports():
-        if p.serial_number and p.serial_number == serial_number:
+        if _matches(p, device_identifiers):
             return p.device
     return None
 
 
-def get_port(device_identifiers):
-    operatingsystem = which_os()
-    if operatingsystem == "Windows":
-        port = _get_port_windows(device_identifiers)
-    elif operatingsystem == "Linux":
-        port = _get_port_linux(device_identifiers["serialid"])
+def _by_id_path(device):
+    """
+    linux only: returns the stable /dev/serial/by-id symlink pointing at device, if there is one
+    """
+    if not os.path.isdir(BY_ID_DIR):
+        return device
+    target = os.path.realpath(device)
+    for name in sorted(os.listdir(BY_ID_DIR)):
+        path = os.path.join(BY_ID_DIR, name)
+        if os.path.realpath(path) == target:
+            return path
+    return device
+
+
+def _read_port_cache():
+    try:
+        with open(PORT_CACHE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_port_cache(cache):
+    os.makedirs(os.path.dirname(PORT_CACHE_PATH), exist_ok=True)
+    tmp = PORT_CACHE_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, PORT_CACHE_PATH)
+
 
+def _cache_key(device_identifiers):
+    return json.dumps(sorted(device_identifiers.items()))
+
+
+def _cached_port_valid(port, device_identifiers):
+    """
+    checks that a cached port still belongs to the device. by-id links name the device and vanish
+    when it is unplugged, so they only need to exist. other paths (/dev/ttyACM0, COM3) can be
+    handed to another device after a re-plug, so they are checked against the identifiers
+    """
+    if port.startswith(BY_ID_DIR + "/"):
+        return os.path.exists(port)
+    device = os.path.realpath(port) if port.startswith("/dev/") else port
+    for p in lp.comports():
+        if p.device == device or (port.startswith("/dev/") and os.path.realpath(p.device) == device):
+            return _matches(p, device_identifiers)
+    return False
+
+
+def get_port(device_identifiers, use_cache=True):
+    """
+    resolves the serial port of a device from its identifiers (vid, pid, serial_number). the result
+    is cached on disk, and on linux the stable /dev/serial/by-id path is stored, so reconnects skip
+    port enumeration. other cached ports are checked against the identifiers before use.
+    use_cache=False forces a fresh lookup.
+    """
+    identifiers = _normalize_identifiers(device_identifiers)
+    key = _cache_key(identifiers)
+    if use_cache:
+        port = _read_port_cache().get(key)
+        if port is not None and _cached_port_valid(port, identifiers):
+            return port
+
+    port = _find_port(identifiers)
     if port is None:
         raise ValueError(f"Device not found!")
+    if which_os() == "Linux":
+        port = _by_id_path(port)
+
+    cache = _read_port_cache()
+    cache[key] = port
+    _write_port_cache(cache)
     return port
+
+
+def invalidate_port(device_identifiers):
+    """
+    drops a cached port, ie after it failed to open
+    """
+    cache = _read_port_cache()
+    if cache.pop(_cache_key(_normalize_identifiers(device_identifiers)), None) is not None:
+        _write_port_cache(cache)
@@ -1,16 +1,12 @@
 from pymeasure.instruments.keithley import Keithley2400
 import time
-import yaml
 import numpy as np
-import os
-
-MODULE_DIR = os.path.dirname(__file__)
-with open(os.path.join(MODULE_DIR, "hardwareconstants.yaml"), "r") as f:
-    constants = yaml.load(f, Loader=yaml.FullLoader)["keithley"]
+from jvbot.hardware.helpers import load_constants
 
 
 class Keithley(Keithley2400):
     def __init__(self, address=None):
+        constants = load_constants()["keithley"]
         if address is None:
             address = constants["address"]
         super().__init__(address)
@@ -0,0 +1,185 @@
+"""
+Maximum power point trackers used by Control_Keithley.spo. Every tracker takes the measured
+voltage and generated current (positive under illumination) of the last point and returns the
+next voltage to apply.
+"""
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+GOLDEN_RATIO = (1 + 5**0.5) / 2
+
+
+class MPPTracker(ABC):
+    def __init__(self, vstart, vstep, vlimits=(0, 2)):
+        self.vstart = vstart
+        self.vstep = vstep
+        self.vlimits = vlimits
+        self.v_cmd = vstart
+
+    def start(self):
+        """
+            Returns:
+                float: first voltage to apply (V)
+        """
+        self.v_cmd = self._clip(self.vstart)
+        return self.v_cmd
+
+    @abstractmethod
+    def update(self, v, i):
+        """
+            Args:
+                v (float): measured voltage (V)
+                i (float): generated current (A), positive under illumination
+
+            Returns:
+                float: next voltage to apply (V)
+        """
+
+    def _clip(self, v):
+        return float(np.clip(v, *self.vlimits))
+
+
+class PerturbObserve(MPPTracker):
+    """
+    Perturb and observe with an adaptive step. The step grows while power keeps increasing in the
+    same direction and shrinks every time the direction has to be reversed, so it moves quickly
+    towards the MPP and then dithers around it with a small amplitude.
+    """
+
+    def __init__(self, vstart, vstep, vlimits=(0, 2), vstep_min=None, vstep_max=None, grow=1.5, shrink=0.5):
+        super().__init__(vstart, vstep, vlimits)
+        self.vstep_min = vstep / 10 if vstep_min is None else vstep_min
+        self.vstep_max = vstep * 5 if vstep_max is None else vstep_max
+        self.grow = grow
+        self.shrink = shrink
+        self.step = vstep
+        self.direction = 1
+        self.streak = 0  # consecutive power increases in the current direction
+        self.p_last = None
+
+    def update(self, v, i):
+        p = v * i
+        if self.p_last is not None:
+            if p > self.p_last:
+                self.streak += 1
+                if self.streak >= 2:
+                    self.step = min(self.step * self.grow, self.vstep_max)
+            else:
+                self.direction = -self.direction
+                self.streak = 0
+                self.step = max(self.step * self.shrink, self.vstep_min)
+        self.p_last = p
+        self.v_cmd = self._clip(self.v_cmd + self.direction * self.step)
+        return self.v_cmd
+
+
+class IncrementalConductance(MPPTracker):
+    """
+    Incremental conductance: at the MPP dI/dV = -I/V. The step is scaled by how far the measured
+    incremental conductance is from that condition, so it slows down near the MPP.
+    """
+
+    def __init__(self, vstart, vstep, vlimits=(0, 2), vstep_min=None, tolerance=0.01):
+        super().__init__(vstart, vstep, vlimits)
+        self.vstep_min = vstep / 10 if vstep_min is None else vstep_min
+        self.tolerance = tolerance
+        self.last = None
+
+    def update(self, v, i):
+        if self.last is None or v <= 0:
+            self.last = (v, i)
+            self.v_cmd = self._clip(self.v_cmd + self.vstep)
+            return self.v_cmd
+
+        v0, i0 = self.last
+        self.last = (v, i)
+        dv, di = v - v0, i - i0
+        if abs(dv) < 1e-9:
+            if abs(di) < 1e-12:
+                return self.v_cmd  # nothing changed, hold
+            direction, error = np.sign(di), 1
+        else:
+            # dP/dV normalized by I/V: >0 left of the MPP, <0 right of it
+            error = (di / dv + i / v) / abs(i / v) if i != 0 else -1
+            if abs(error) < self.tolerance:
+                return self.v_cmd
+            direction = np.sign(error)
+        step = max(self.vstep * min(abs(error), 1), self.vstep_min)
+        self.v_cmd = self._clip(self.v_cmd + direction * step)
+        return self.v_cmd
+
+
+class GoldenSection(MPPTracker):
+    """
+    Golden-section search for the power maximum inside a bracket, ie around the MPP of a fast
+    JV. Once the bracket is narrower than `tolerance` it is re-opened around the best point so
+    the search keeps following drift in the MPP.
+    """
+
+    def __init__(self, vlow, vhigh, vstep, vlimits=(0, 2), tolerance=None):
+        super().__init__((vlow + vhigh) / 2, vstep, vlimits)
+        self.width = vhigh - vlow
+        self.tolerance = vstep / 2 if tolerance is None else tolerance
+        self._bracket(vlow, vhigh)
+
+    @classmethod
+    def from_jv(cls, v, i, vstep, **kwargs):
+        """
+            Builds the search bracket around the maximum power point of a (coarse) JV sweep
+
+            Args:
+                v (np.ndarray): voltage (V)
+                i (np.ndarray): generated current (A), positive under illumination
+        """
+        v = np.asarray(v)
+        k = int(np.argmax(v * np.asarray(i)))
+        vlow = v[max(k - 1, 0)]
+        vhigh = v[min(k + 1, len(v) - 1)]
+        if vhigh - vlow < 2 * vstep:
+            vlow, vhigh = v[k] - vstep, v[k] + vstep
+        return cls(min(vlow, vhigh), max(vlow, vhigh), vstep, **kwargs)
+
+    def _bracket(self, a, b):
+        a, b = self._clip(a), self._clip(b)
+        self.a, self.b = a, b
+        self.c = b - (b - a) / GOLDEN_RATIO
+        self.d = a + (b - a) / GOLDEN_RATIO
+        self.pc = self.pd = None
+        self.pending = "c"
+
+    def start(self):
+        self.v_cmd = self.c
+        return self.v_cmd
+
+    def update(self, v, i):
+        p = v * i
+        if self.pending == "c":
+            self.pc = p
+        else:
+            self.pd = p
+
+        if self.pc is None:
+            self.pending, self.v_cmd = "c", self.c
+        elif self.pd is None:
+            self.pending, self.v_cmd = "d", self.d
+        elif self.b - self.a < self.tolerance:
+            best = self.c if self.pc > self.pd else self.d
+            self._bracket(best - self.width / 4, best + self.width / 4)
+            self.v_cmd = self.c
+        elif self.pc > self.pd:
+            self.b, self.d, self.pd = self.d, self.c, self.pc
+            self.c = self.b - (self.b - self.a) / GOLDEN_RATIO
+            self.pc, self.pending, self.v_cmd = None, "c", self.c
+        else:
+            self.a, self.c, self.pc = self.c, self.d, self.pd
+            self.d = self.a + (self.b - self.a) / GOLDEN_RATIO
+            self.pd, self.pending, self.v_cmd = None, "d", self.d
+        return self.v_cmd
+
+
+MPPT_ALGORITHMS = {
+    "po": PerturbObserve,
+    "incremental_conductance": IncrementalConductance,
+    "golden": GoldenSection,
+}
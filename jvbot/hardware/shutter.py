@@ -0,0 +1,86 @@
+import time
+from jvbot.hardware.helpers import get_port, load_constants
+
+
+class Shutter:
+    """
+    homebuilt serial shutter: writing b'1' opens it, b'0' closes it
+    """
+
+    blocks_light = True  # closing it makes a sweep dark
+
+    def __init__(self, port, baudrate=9600, settle_time=0.1):
+        import serial
+
+        self.port = port
+        self.settle_time = settle_time  # wait (s) after a transition for the blade to stop moving
+        self._handle = serial.Serial(
+            port=port, baudrate=baudrate, timeout=1, write_timeout=1
+        )
+        self.is_open = None  # unknown until the first command
+        self.close()
+
+    def open(self):
+        self._set(True)
+
+    def close(self):
+        self._set(False)
+
+    def _set(self, is_open):
+        if is_open == self.is_open:
+            return  # already there, skip the settle time
+        self._send(is_open)
+        time.sleep(self.settle_time)
+        self.is_open = is_open
+
+    def _send(self, is_open):
+        self._handle.write(b"1" if is_open else b"0")
+        self._handle.flush()
+
+    def disconnect(self):
+        self.close()
+        self._handle.close()
+
+
+class SimulatedShutter(Shutter):
+    """
+    stands in for the shutter when none is connected. keeps the state and a history of
+    (time, is_open) transitions. nothing blocks the lamp, so dark measurements are refused
+    unless blocks_light is set, ie when replaying a transcript recorded with a real shutter
+    """
+
+    def __init__(self, settle_time=0, blocks_light=False):
+        self.port = None
+        self.settle_time = settle_time
+        self.blocks_light = blocks_light
+        self.history = []
+        self.is_open = None
+        self.close()
+
+    def _send(self, is_open):
+        self.history.append((time.time(), is_open))
+
+    def disconnect(self):
+        self.close()
+
+
+def connect_shutter():
+    """
+    builds the shutter described in hardwareconstants.yaml, or a SimulatedShutter if it is
+    disabled there
+    """
+    constants = load_constants()["shutter"]
+    if not constants["enabled"]:
+        return SimulatedShutter()
+    port = constants.get("port")
+    if port is None:
+        if not constants.get("device_identifiers"):
+            raise ValueError(
+                "Shutter is enabled in hardwareconstants.yaml but neither its port nor device_identifiers are set"
+            )
+        port = get_port(constants["device_identifiers"])
+    return Shutter(
+        port=port,
+        baudrate=constants["baudrate"],
+        settle_time=constants["settle_time"],
+    )
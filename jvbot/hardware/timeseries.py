@@ -0,0 +1,88 @@
+import os
+import time
+import numpy as np
+
+
+class TimeSeriesBuffer:
+    """
+    Fixed-size ring buffer of typed NumPy columns for long time series (spo, jsc_time, voc_time).
+    Rows are spilled to a csv on disk every `chunk_size` rows or `flush_interval` seconds, whichever
+    comes first, so memory stays flat for multi-hour runs and a crash loses at most one chunk.
+    The newest `chunk_size` rows stay available in memory through tail().
+
+    The csv has the same layout pandas.DataFrame.to_csv writes: an unnamed index column followed
+    by the named columns.
+    """
+
+    def __init__(self, fpath, columns, chunk_size=256, flush_interval=10, dtype=np.float64):
+        self.fpath = fpath
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self._ring = np.full((chunk_size, len(self.columns)), np.nan, dtype=dtype)
+        self.count = 0  # rows appended in total
+        self._spilled = 0  # rows already written to disk
+        self._last_flush = time.time()
+        with open(self.fpath, "w") as f:
+            f.write(",".join([""] + self.columns) + "\n")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, *values):
+        """
+            Adds one row, with one value per column in order
+        """
+        self._ring[self.count % self.chunk_size] = values
+        self.count += 1
+        if (self.count - self._spilled >= self.chunk_size) or (
+            time.time() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+            Writes rows not yet on disk to the csv and fsyncs it
+        """
+        if self._spilled < self.count:
+            idx = np.arange(self._spilled, self.count)
+            rows = np.column_stack([idx, self._ring[idx % self.chunk_size]])
+            with open(self.fpath, "a") as f:
+                np.savetxt(f, rows, delimiter=",", fmt=["%d"] + ["%.10g"] * len(self.columns))
+                f.flush()
+                os.fsync(f.fileno())
+            self._spilled = self.count
+        self._last_flush = time.time()
+
+    def close(self):
+        self.flush()
+
+    def tail(self, n=None):
+        """
+            Returns:
+                np.ndarray: the newest n rows (at most chunk_size) still held in memory, oldest first
+        """
+        n = min(self.count, self.chunk_size if n is None else min(n, self.chunk_size))
+        idx = np.arange(self.count - n, self.count) % self.chunk_size
+        return self._ring[idx]
+
+    def column(self, name, n=None):
+        return self.tail(n)[:, self.columns.index(name)]
+
+    def read(self):
+        """
+            Reads the whole series back from disk
+
+            Returns:
+                pd.DataFrame
+        """
+        import pandas as pd
+
+        self.flush()
+        return pd.read_csv(self.fpath, index_col=0)
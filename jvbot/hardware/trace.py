@@ -0,0 +1,181 @@
+"""
+Opt-in tracing of the SCPI traffic between Control_Keithley and the Keithley. The pyvisa resource
+behind the pymeasure adapter is wrapped so every write, read and query is recorded with its
+direction, size and latency, and attributed to the Control_Keithley method that issued it:
+
+    ck = Control_Keithley(trace=True)
+    ck.jv("x01", "fwdrev", -0.1, 1.2)
+    ck.tracer.summary()
+    ck.tracer.save("jv_trace.jsonl")
+"""
+import sys
+import json
+import time
+
+# pyvisa resource methods that move data, and the direction they move it in
+TRACED_METHODS = {
+    "write": "out",
+    "write_raw": "out",
+    "write_bytes": "out",
+    "read": "in",
+    "read_raw": "in",
+    "read_bytes": "in",
+    "query": "query",
+    "read_stb": "in",
+    "wait_on_event": "event",
+}
+
+
+def _nbytes(data):
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    return len(str(data).encode())
+
+
+class VisaTracer:
+    def __init__(self, owner=None):
+        """
+        Args:
+            owner (object = None): commands are grouped by the outermost and innermost methods of
+                this object on the call stack, ie jv and _measure. None groups everything as "-"
+        """
+        self.owner = owner
+        self.events = []
+        self.t0 = time.perf_counter()
+
+    def attach(self, adapter):
+        """
+        Starts tracing the pyvisa resource of a pymeasure adapter
+        """
+        if not isinstance(adapter.connection, _TracedConnection):
+            adapter.connection = _TracedConnection(adapter.connection, self)
+
+    def detach(self, adapter):
+        if isinstance(adapter.connection, _TracedConnection):
+            adapter.connection = adapter.connection._connection
+
+    def clear(self):
+        self.events = []
+        self.t0 = time.perf_counter()
+
+    def _operations(self):
+        """
+        Returns:
+            tuple: (outermost, innermost) owner method names on the current call stack
+        """
+        if self.owner is None:
+            return "-", "-"
+        names = []
+        frame = sys._getframe(2)
+        while frame is not None:
+            if frame.f_locals.get("self") is self.owner:
+                names.append(frame.f_code.co_name)
+            frame = frame.f_back
+        if not names:
+            return "-", "-"
+        return names[-1], names[0]
+
+    def record(self, method, data, start, end):
+        operation, step = self._operations()
+        text = data.decode(errors="replace") if isinstance(data, (bytes, bytearray)) else data
+        self.events.append(
+            {
+                "t": start - self.t0,
+                "operation": operation,
+                "step": step,
+                "method": method,
+                "direction": TRACED_METHODS[method],
+                "data": None if text is None else str(text).strip()[:200],
+                "bytes": _nbytes(data),
+                "latency": end - start,
+            }
+        )
+
+    def table(self, by=("operation", "step")):
+        """
+        Returns:
+            list(dict): per group, number of writes/reads/queries, bytes each way and latency
+        """
+        groups = {}
+        for e in self.events:
+            key = tuple(e[k] for k in by)
+            g = groups.setdefault(
+                key,
+                {**dict(zip(by, key)), "writes": 0, "reads": 0, "queries": 0, "events": 0,
+                 "bytes_out": 0, "bytes_in": 0, "latency": 0.0},
+            )
+            if e["direction"] == "out":
+                g["writes"] += 1
+                g["bytes_out"] += e["bytes"]
+            elif e["direction"] == "in":
+                g["reads"] += 1
+                g["bytes_in"] += e["bytes"]
+            elif e["direction"] == "query":
+                g["queries"] += 1
+                g["bytes_in"] += e["bytes"]
+            else:
+                g["events"] += 1
+            g["latency"] += e["latency"]
+        return sorted(groups.values(), key=lambda g: -g["latency"])
+
+    def summary(self, by=("operation", "step"), file=None):
+        """
+        Prints the traffic per group, slowest first
+        """
+        rows = self.table(by)
+        header = [*by, "writes", "reads", "queries", "events", "bytes_out", "bytes_in", "latency (ms)"]
+        lines = [header]
+        for g in rows:
+            lines.append([*(str(g[k]) for k in by), *(str(g[k]) for k in header[len(by):-1]), f'{g["latency"]*1000:.1f}'])
+        total = sum(g["latency"] for g in rows)
+        lines.append(["total", *[""] * (len(by) - 1), *(str(sum(g[k] for g in rows)) for k in header[len(by):-1]), f"{total*1000:.1f}"])
+        widths = [max(len(line[c]) for line in lines) for c in range(len(header))]
+        for n, line in enumerate(lines):
+            print("  ".join(cell.ljust(w) for cell, w in zip(line, widths)), file=file)
+            if n == 0 or n == len(lines) - 2:
+                print("  ".join("-" * w for w in widths), file=file)
+
+    def save(self, fpath):
+        """
+        Writes every recorded command as one json object per line
+        """
+        with open(fpath, "w") as f:
+            for e in self.events:
+                f.write(json.dumps(e) + "\n")
+
+
+class _TracedConnection:
+    """
+    forwards everything to the wrapped pyvisa resource, timing and recording the data methods
+    """
+
+    def __init__(self, connection, tracer):
+        object.__setattr__(self, "_connection", connection)
+        object.__setattr__(self, "_tracer", tracer)
+
+    def __getattr__(self, name):
+        attr = getattr(self._connection, name)
+        if name not in TRACED_METHODS or not callable(attr):
+            return attr
+
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            end = time.perf_counter()
+            if TRACED_METHODS[name] == "out":
+                data = args[0] if args else None
+            elif name == "query":
+                data = f"{args[0]} -> {result}"
+            elif name == "wait_on_event":
+                data = None
+            else:
+                data = result
+            self._tracer.record(name, data, start, end)
+            return result
+
+        return traced
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)  # ie timeout
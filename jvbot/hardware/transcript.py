@@ -0,0 +1,268 @@
+"""
+Record and replay of the byte-level conversation with the hardware. During a real run the
+Gantry serial handle and the pyvisa resource of the Keithley are wrapped so every call is
+appended, with its arguments, reply and latency, to a transcript file (one json object per line):
+
+    c = Control(record="run1_transcript.jsonl")
+    c.scan_tray(...)
+
+replay_control() later builds a Control whose gantry and Keithley are fed from that transcript
+instead of the station, so host-side code can be benchmarked with realistic timing and field
+issues reproduced on a laptop:
+
+    c = replay_control("run1_transcript.jsonl", realtime=True)
+    c.scan_tray(...)  # same calls as the recorded run
+
+Replay is strict by default: every command written must match the recording, so a code change
+that alters the traffic fails loudly at the first divergent command.
+"""
+import json
+import time
+
+SERIAL_METHODS = ["write", "read", "readline", "reset_input_buffer", "flush", "close"]
+VISA_METHODS = [
+    "write",
+    "write_raw",
+    "read",
+    "read_raw",
+    "read_bytes",
+    "query",
+    "read_stb",
+    "wait_on_event",
+    "enable_event",
+    "discard_events",
+]
+REPLAYED_ERRORS = {"AttributeError": AttributeError, "NotImplementedError": NotImplementedError}
+
+
+class TranscriptMismatch(Exception):
+    """replayed code issued a different command than the recorded run"""
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"bytes": bytes(value).decode("latin-1")}  # lossless, one char per byte
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return None  # ie pyvisa event responses, nothing the callers use
+
+
+def _decode(value):
+    if isinstance(value, dict) and "bytes" in value:
+        return value["bytes"].encode("latin-1")
+    return value
+
+
+class Transcript:
+    def __init__(self, fpath, mode="w"):
+        """
+        Args:
+            fpath (str): transcript file
+            mode (str = "w"): "w" to record (the file is truncated), "r" to load for replay
+        """
+        self.fpath = fpath
+        self.t0 = time.perf_counter()
+        if mode == "w":
+            self.entries = None
+            self._file = open(fpath, "w")
+        else:
+            with open(fpath, "r") as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+            self._file = None
+
+    def record(self, device, method, args, result, start, end, error=None):
+        entry = {
+            "t": start - self.t0,
+            "device": device,
+            "method": method,
+            "args": [_encode(a) for a in args],
+            "result": _encode(result),
+            "latency": end - start,
+        }
+        if error is not None:
+            entry["error"] = [type(error).__name__, str(error)]
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()  # a crashed run keeps everything up to the crash
+
+    def device(self, name):
+        """
+        Returns:
+            list(dict): recorded entries of one device, in order
+        """
+        return [e for e in self.entries if e["device"] == name]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class _Recorder:
+    """forwards everything to the wrapped handle, recording calls of the listed methods"""
+
+    def __init__(self, handle, transcript, device, methods):
+        object.__setattr__(self, "_handle", handle)
+        object.__setattr__(self, "_transcript", transcript)
+        object.__setattr__(self, "_device", device)
+        object.__setattr__(self, "_methods", methods)
+
+    def __getattr__(self, name):
+        try:
+            attr = getattr(self._handle, name)
+        except AttributeError as e:
+            if name in self._methods:  # ie enable_event on an interface without events
+                now = time.perf_counter()
+                self._transcript.record(self._device, name, (), None, now, now, error=e)
+            raise
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        def recorded(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self._transcript.record(self._device, name, args, None, start, time.perf_counter(), error=e)
+                raise
+            self._transcript.record(self._device, name, args, result, start, time.perf_counter())
+            return result
+
+        return recorded
+
+    def __setattr__(self, name, value):
+        setattr(self._handle, name, value)
+
+
+class RecordingSerial(_Recorder):
+    """
+    wraps a pyserial handle. in_waiting is recorded too, since the reply depends on it
+    """
+
+    def __init__(self, handle, transcript, device="gantry"):
+        super().__init__(handle, transcript, device, SERIAL_METHODS)
+
+    @property
+    def in_waiting(self):
+        start = time.perf_counter()
+        n = self._handle.in_waiting
+        self._transcript.record(self._device, "in_waiting", (), n, start, time.perf_counter())
+        return n
+
+
+class RecordingConnection(_Recorder):
+    """
+    wraps a pyvisa resource, ie the .connection of a pymeasure adapter
+    """
+
+    def __init__(self, connection, transcript, device="keithley"):
+        super().__init__(connection, transcript, device, VISA_METHODS)
+
+
+class _Replayer:
+    """
+    returns the recorded replies in order. with realtime the recorded latency of every call is
+    slept, so host-side timing can be compared against the real run
+    """
+
+    def __init__(self, entries, device, methods, realtime=False, strict=True):
+        self._entries = entries
+        self._device = device
+        self._methods = methods
+        self._position = 0
+        self.realtime = realtime
+        self.strict = strict
+
+    def _next(self, method, args):
+        if self._position >= len(self._entries):
+            raise TranscriptMismatch(f"{self._device}: {method}{args} issued after the end of the transcript")
+        entry = self._entries[self._position]
+        self._position += 1
+        if self.strict:
+            if entry["method"] != method or (
+                "error" not in entry and [_encode(a) for a in args] != entry["args"]
+            ):
+                raise TranscriptMismatch(
+                    f"{self._device} call {self._position}: expected {entry['method']}{tuple(_decode(a) for a in entry['args'])}, got {method}{args}"
+                )
+        if self.realtime:
+            time.sleep(entry["latency"])
+        if "error" in entry:
+            name, message = entry["error"]
+            raise REPLAYED_ERRORS.get(name, TranscriptMismatch)(f"replayed {name}: {message}")
+        return _decode(entry["result"])
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self._methods:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._next(name, args)
+
+    @property
+    def done(self):
+        return self._position >= len(self._entries)
+
+
+class ReplaySerial(_Replayer):
+    def __init__(self, transcript, device="gantry", realtime=False, strict=True):
+        super().__init__(transcript.device(device), device, SERIAL_METHODS, realtime, strict)
+
+    @property
+    def in_waiting(self):
+        return self._next("in_waiting", ())
+
+
+class ReplayConnection(_Replayer):
+    def __init__(self, transcript, device="keithley", realtime=False, strict=True):
+        super().__init__(transcript.device(device), device, VISA_METHODS, realtime, strict)
+        self.timeout = 2000  # ms, only kept for the callers that read it back
+
+    def close(self):
+        pass
+
+
+def replay_adapter(transcript, device="keithley", realtime=False, strict=True):
+    """
+    Builds a pymeasure adapter whose pyvisa resource is a ReplayConnection, to pass to
+    Control_Keithley(adapter=...)
+    """
+    from pymeasure.adapters import Adapter
+
+    class ReplayAdapter(Adapter):
+        def __init__(self):
+            super().__init__()
+            self.connection = ReplayConnection(transcript, device, realtime, strict)
+
+        def _write(self, command, **kwargs):
+            self.connection.write(command)
+
+        def _write_bytes(self, content, **kwargs):
+            self.connection.write_raw(content)
+
+        def _read(self, **kwargs):
+            return self.connection.read()
+
+        def _read_bytes(self, count, break_on_termchar=False, **kwargs):
+            return self.connection.read_bytes(count)
+
+    return ReplayAdapter()
+
+
+def replay_control(fpath, area=0.07, savedir=".", realtime=False, strict=True):
+    """
+    Builds a Control whose gantry and Keithley replay a recorded transcript. The shutter is
+    simulated, and replayed files are kept out of the scan index.
+
+    Returns:
+        Control
+    """
+    from jvbot.jvbot import Control
+    from jvbot.hardware.gantry import Gantry
+    from jvbot.hardware.control3 import Control_Keithley
+    from jvbot.hardware.shutter import SimulatedShutter
+
+    transcript = Transcript(fpath, mode="r")
+    control_keithley = Control_Keithley(
+        area=area,
+        adapter=replay_adapter(transcript, realtime=realtime, strict=strict),
+        shutter=SimulatedShutter(blocks_light=True),  # the recorded dark sweeps were dark
+    )
+    gantry = Gantry(port="replay", handle=ReplaySerial(transcript, realtime=realtime, strict=strict))
+    return Control(area=area, savedir=savedir, gantry=gantry, control_keithley=control_keithley, index=False)
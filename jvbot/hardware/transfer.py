@@ -0,0 +1,90 @@
+"""
+Binary data transfer from the Keithley 2400. Readings are returned as IEEE-754 single precision
+floats (FORM:DATA SREAL) containing only the elements that are actually used, instead of
+comma-separated ASCII with voltage, current, resistance, time and status for every reading.
+
+pymeasure's own measurement properties (ie Keithley2400.current or .means) parse ASCII replies,
+so use them inside ascii_readings(). Control_Keithley switches back to ASCII on disconnect.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+HEADER = b"#0"  # the 2400 starts binary blocks with an indefinite length header
+
+
+class BinaryTransfer:
+    def __init__(self, instrument, little_endian=True):
+        """
+        Args:
+            instrument (Keithley2400): pymeasure instrument, its adapter must expose the pyvisa
+                resource as .connection
+            little_endian (bool = True): byte order requested from the instrument (FORM:BORD SWAP)
+        """
+        self.instrument = instrument
+        self.little_endian = little_endian
+        self.dtype = np.dtype("<f4" if little_endian else ">f4")
+        self.elements = None  # FORM:ELEM currently set on the instrument
+        self.binary()
+
+    def binary(self):
+        """
+        Selects binary readings, done on construction
+        """
+        self.instrument.write(":FORM:DATA SREAL")
+        self.instrument.write(f":FORM:BORD {'SWAP' if self.little_endian else 'NORM'}")
+
+    @property
+    def connection(self):
+        return self.instrument.adapter.connection  # looked up every time, it may be wrapped for tracing
+
+    def set_elements(self, elements):
+        """
+        Selects the data elements sent for every reading, ie ("VOLT", "CURR") or ("CURR",). Only
+        written to the instrument when it changes.
+        """
+        elements = tuple(elements)
+        if elements != self.elements:
+            self.instrument.write(f":FORM:ELEM {','.join(elements)}")
+            self.elements = elements
+
+    def query(self, command, n_readings, elements=("VOLT", "CURR")):
+        """
+        Sends a query returning readings (ie :READ?, :TRAC:DATA?, :CALC3:DATA?) and decodes the
+        binary reply
+
+        Returns:
+            np.ndarray: (n_readings, len(elements)) float32 array
+        """
+        self.set_elements(elements)
+        self.instrument.write(command)
+        n_bytes = len(HEADER) + n_readings * len(elements) * self.dtype.itemsize
+        raw = self.connection.read_bytes(n_bytes)
+        self.connection.read_bytes(1)  # line feed terminating the block
+        if raw[: len(HEADER)] != HEADER:
+            raise ValueError(f"Unexpected binary block header {raw[:len(HEADER)]!r} in reply to {command}")
+        return np.frombuffer(raw, dtype=self.dtype, offset=len(HEADER)).reshape(
+            n_readings, len(elements)
+        )
+
+    def ascii(self):
+        """
+        Restores the ASCII format pymeasure expects, before using its own measurement properties
+        """
+        self.instrument.write(":FORM:DATA ASCII")
+        self.instrument.write(":FORM:ELEM VOLT,CURR,RES,TIME,STAT")
+        self.elements = None
+
+    @contextmanager
+    def ascii_readings(self):
+        """
+        Switches to ASCII for the duration of a with block, then back to binary:
+
+            with transfer.ascii_readings() as keithley:
+                current = keithley.current
+        """
+        self.ascii()
+        try:
+            yield self.instrument
+        finally:
+            self.binary()
@@ -1,15 +1,30 @@
 import os
 import yaml
 import numpy as np
+from functools import lru_cache
 from jvbot.hardware.gantry import Gantry
 
 MODULE_DIR = os.path.dirname(__file__)
 TRAY_VERSIONS_DIR = os.path.join(MODULE_DIR, "..", "tray_versions")
-AVAILABLE_VERSIONS = {
-    os.path.splitext(f)[0]: os.path.join(TRAY_VERSIONS_DIR, f)
-    for f in os.listdir(TRAY_VERSIONS_DIR)
-    if ".yaml" in f
-}
+
+
+@lru_cache(maxsize=None)
+def available_versions():
+    """
+    maps tray version name -> yaml path. the directory is only listed on first use
+    """
+    return {
+        os.path.splitext(f)[0]: os.path.join(TRAY_VERSIONS_DIR, f)
+        for f in os.listdir(TRAY_VERSIONS_DIR)
+        if ".yaml" in f
+    }
+
+
+def __getattr__(name):
+    # AVAILABLE_VERSIONS was a module constant, it is now listed on first access
+    if name == "AVAILABLE_VERSIONS":
+        return available_versions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Tray:
@@ -21,21 +36,26 @@ class Tray:
     def __init__(self, version: str, gantry: Gantry, calibrate:bool = False):
         self._calibrated = False  # set to True after calibration routine has been run
         self.gantry = gantry
+        self._last_target = None  # last slot position moved to through self.moveto
         self._load_version(version, calibrate=calibrate)  # generates grid of sample slot coordinates
 
         # coordinate system properties
 
     def _load_version(self, version, calibrate=False):
-        if version not in AVAILABLE_VERSIONS:
+        if version not in available_versions():
             raise Exception(
-                f'Invalid tray version "{version}".\n Available versions are: {list(AVAILABLE_VERSIONS.keys())}.'
+                f'Invalid tray version "{version}".\n Available versions are: {list(available_versions().keys())}.'
             )
-        with open(AVAILABLE_VERSIONS[version], "r") as f:
+        with open(available_versions()[version], "r") as f:
             constants = yaml.load(f, Loader=yaml.FullLoader)
         self.version = version
         self.pitch = (constants["xpitch"], constants["ypitch"])
         self.gridsize = (constants["numx"], constants["numy"])
-        self.z_clearance = constants["z_clearance"]
+        self.z_clearance = constants["z_clearance"]  # lift (mm) needed for the probe to clear the tray between slots
+        self.adjacent_distance = constants.get(
+            "adjacent_distance", float(np.hypot(*self.pitch))
+        )  # moves up to this lateral distance (mm) only lift by z_clearance, default includes diagonal neighbours
+        self.motion_profile = constants.get("motion_profile", "default")  # see gantry motion_profiles
         self.__generate_coordinates()
 
         if 'offset' in constants:
@@ -138,6 +158,46 @@ class Tray:
     def __call__(self, name):
         return self.get_slot_coordinates(name)
 
+    def moveto(self, name, jitter=None):
+        """
+        Moves the gantry onto a slot, optionally offset by jitter [x, y, z] (mm). Between
+        neighbouring slots the probe is only lifted by z_clearance, see zhop_height.
+        """
+        target = self(name)
+        if jitter is not None:
+            target = target + np.asarray(jitter)
+        self.gantry.moveto(target, zhop_height=self.zhop_height(target))
+        self._last_target = target
+
+    def zhop_height(self, target):
+        """
+        Plans the lift for a move from the current gantry position to target. Returns z_clearance
+        (capped at the gantry's full zhop height) if the gantry is still sitting on the last slot
+        this tray moved it to and target is within adjacent_distance of it, else None to use the
+        full zhop height.
+        """
+        if self._last_target is None or None in self.gantry.position:
+            return None
+        if not np.allclose(
+            self.gantry.position, self._last_target, atol=self.gantry.POSITIONTOLERANCE
+        ):
+            return None  # gantry was moved elsewhere since, ie to the load position
+        return self._zhop_between(self._last_target, target)
+
+    def _zhop_between(self, start, target):
+        lateral = np.linalg.norm(np.asarray(target[:2]) - np.asarray(start[:2]))
+        if lateral > self.adjacent_distance + self.gantry.POSITIONTOLERANCE:
+            return None
+        return min(self.z_clearance, abs(self.gantry.ZHOP_HEIGHT))
+
+    def move_duration(self, start, end):
+        """
+        nominal time (s) moveto(end) takes with the gantry sitting on slot start, see
+        Gantry.move_duration
+        """
+        start, end = self(start), self(end)
+        return self.gantry.move_duration(start, end, zhop_height=self._zhop_between(start, end))
+
     def calibrate(self):
         """Calibrate the coordinate system of this workspace."""
         print(f"Make contact with device {self.CALIBRATIONSLOT} to calibrate the tray position")
@@ -148,7 +208,7 @@ class Tray:
 
         self.__calibrated = True
 
-        with open(AVAILABLE_VERSIONS[self.version], "r") as f:
+        with open(available_versions()[self.version], "r") as f:
             constants = yaml.load(f, Loader=yaml.FullLoader)
             print("In function calibrate, constants:", constants)
         constants['offset'] = {k:float(v) for k,v in zip(['x', 'y', 'z'], self.offset)}
@@ -156,5 +216,5 @@ class Tray:
         print(" also here is 'constants[offset]': ",constants['offset'])
 
 
-        with open(AVAILABLE_VERSIONS[self.version], "w") as f:
+        with open(available_versions()[self.version], "w") as f:
             yaml.dump(constants, f)
\ No newline at end of file
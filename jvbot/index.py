@@ -0,0 +1,211 @@
+"""
+SQLite index of every JV and SPO file written, so scans can be found by slot, device, tray or
+date with an index lookup instead of walking directories and parsing file names:
+
+    index = ScanIndex()
+    index.find(slot="B2", tray="10mm_v2", since="2026-10-01")
+    index.find(name="05", kind="jv", light=True)
+
+Control_Keithley adds a row as _format_jv and _format_spo save. The slot and tray are not part
+of the file name; the scan loops of Control and run_batch set them with set_context. Files
+written before the index existed can be added with add_directory.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from jvbot.analysis import METRICS, P_IN, parse_name, jv_metrics, load_jv
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".jvbot", "scan_index.sqlite")
+FIELDS = ["path", "kind", "name", "pixel", "attempt", "scan", "direction", "light", "slot", "tray", "timestamp", "area", "extra"]
+INDEXED = ["name", "slot", "tray", "timestamp"]
+
+
+def _attempt(repeat):
+    # S1 -> 1, retries of scan_tray are S2, S3...
+    try:
+        return int(repeat.lstrip("S"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse(path, kind):
+    if kind == "jv":
+        return parse_name(path)
+    # {name}_SPO.csv, ie x05_P1_S1_SPO.csv
+    stem = os.path.basename(path).rsplit("_SPO", 1)[0]
+    info = dict(zip(["name", "pixel", "repeat"], stem.split("_")))
+    info["name"] = info["name"].lstrip("x")
+    info["light"] = True
+    return info
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _finite(value):
+    value = float(value)
+    return value if np.isfinite(value) else None  # NULL in sqlite
+
+
+class ScanIndex:
+    def __init__(self, fpath=DEFAULT_INDEX_PATH):
+        """
+        Args:
+            fpath (str = DEFAULT_INDEX_PATH): sqlite database, created if missing
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(fpath)), exist_ok=True)
+        self.fpath = fpath
+        self.context = {}  # slot and tray of the scan being measured, see set_context
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fpath, check_same_thread=False)
+        columns = ", ".join(
+            ["path TEXT PRIMARY KEY", "kind TEXT NOT NULL", "name TEXT", "pixel TEXT", "attempt INTEGER",
+             "scan TEXT", "direction TEXT", "light INTEGER", "slot TEXT", "tray TEXT",
+             "timestamp REAL NOT NULL", "area REAL", "extra TEXT"]
+            + [f"{m} REAL" for m in METRICS]
+        )
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS scans ({columns})")
+        for column in INDEXED:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS scans_{column} ON scans ({column})")
+        self._conn.commit()
+
+    def set_context(self, **fields):
+        """
+        Sets fields recorded with every following file that are not in its name, ie
+        set_context(slot="A1", tray="10mm_v2"). None clears a field
+        """
+        self.context.update(fields)
+        self.context = {k: v for k, v in self.context.items() if v is not None}
+
+    def add(self, path, kind, metrics=None, area=None, timestamp=None, **extra):
+        """
+        Records one file, replacing any earlier row for the same path
+
+        Args:
+            path (str): file written
+            kind (str): "jv" or "spo"
+            metrics (dict = None): values for the METRICS columns
+            area (float = None): device area (cm2)
+            timestamp (float = None): unix time, defaults to now
+            **extra: fields overriding the current context or stored as json in extra
+        """
+        info = _parse(path, kind)
+        row = {
+            "path": os.path.abspath(path),
+            "kind": kind,
+            "name": info.get("name"),
+            "pixel": info.get("pixel"),
+            "attempt": _attempt(info.get("repeat")),
+            "scan": info.get("scan"),
+            "direction": info.get("direction"),
+            "light": info.get("light"),
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "area": area,
+        }
+        fields = {**self.context, **extra}
+        row.update({k: fields.pop(k) for k in list(fields) if k in FIELDS})
+        row["extra"] = json.dumps(fields) if fields else None
+        row.update({m: _finite(v) for m, v in (metrics or {}).items() if m in METRICS})
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO scans ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()),
+            )
+            self._conn.commit()
+        return row
+
+    def add_jv(self, path, v, j, area=None, **extra):
+        """
+        Records a JV file along with its metrics, see analysis.jv_metrics
+        """
+        return self.add(path, "jv", metrics=jv_metrics(v, j), area=area, **extra)
+
+    def add_spo(self, path, v, j, area=None, **extra):
+        """
+        Records an SPO file. pce, vmpp and jmpp hold the stabilized values, averaged over the
+        points given (ie the last ones of the run)
+        """
+        v, j = np.asarray(v, dtype=float), np.asarray(j, dtype=float)
+        metrics = {}
+        if len(v):
+            metrics = {"vmpp": v.mean(), "jmpp": j.mean(), "pce": (v * j).mean() / P_IN * 100}
+        return self.add(path, "spo", metrics=metrics, area=area, **extra)
+
+    def add_directory(self, rootdir=".", **extra):
+        """
+        Indexes JV csvs in a directory (not recursive) that are not in the index yet, ie from
+        before the index existed. Their file modification time is used as the timestamp
+
+        Returns:
+            int: files added
+        """
+        with self._lock:
+            known = {p for (p,) in self._conn.execute("SELECT path FROM scans")}
+        fpaths = [
+            os.path.abspath(os.path.join(rootdir, f))
+            for f in sorted(os.listdir(rootdir))
+            if f.endswith("_light.csv") or f.endswith("_dark.csv")
+        ]
+        fpaths = [f for f in fpaths if f not in known]
+        added = 0
+        for f in fpaths:
+            try:
+                v, j = load_jv(f)
+            except (ValueError, OSError) as e:
+                print(f"Could not index {f}: {e}")
+                continue
+            self.add(f, "jv", metrics=jv_metrics(v, j), timestamp=os.path.getmtime(f), **extra)
+            added += 1
+        return added
+
+    def find(self, name=None, slot=None, tray=None, kind=None, direction=None, light=None, since=None, until=None):
+        """
+        Looks up indexed files. Every argument given must match; since and until take unix
+        times or ISO dates
+
+        Returns:
+            pd.DataFrame: one row per file, oldest first
+        """
+        import pandas as pd
+
+        where, params = [], []
+        for column, value in (("name", name), ("slot", slot), ("tray", tray), ("kind", kind), ("direction", direction), ("light", light)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(_timestamp(until))
+        query = "SELECT * FROM scans"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        with self._lock:
+            df = pd.read_sql_query(query + " ORDER BY timestamp", self._conn, params=params)
+        df["light"] = df["light"].astype("boolean")
+        return df
+
+    def remove_missing(self):
+        """
+        Drops rows whose file no longer exists
+
+        Returns:
+            int: rows removed
+        """
+        with self._lock:
+            paths = [p for (p,) in self._conn.execute("SELECT path FROM scans")]
+            missing = [(p,) for p in paths if not os.path.exists(p)]
+            self._conn.executemany("DELETE FROM scans WHERE path = ?", missing)
+            self._conn.commit()
+        return len(missing)
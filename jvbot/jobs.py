@@ -0,0 +1,322 @@
+"""
+In-process job queue in front of Control, so one station can be shared and kept busy:
+
+    from jvbot.jobs import JobQueue
+    q = JobQueue(c)
+    q.submit("scan_tray", tray_version="10mm_v2", direction="fwdrev", vmin=-0.1, vmax=1.2,
+             final_slot="H4", output="/data/alice", estimate=1800)
+    q.submit("spo", priority=10, tray="10mm_v2", slot="B2", name="x06_P1", vstart=0.9,
+             vstep=0.01, vdelay=0.1, interval=1, interval_count=60, output="/data/bob")
+    q.status()
+
+A worker thread runs jobs back to back, highest priority first and in submission order within a
+priority. Tray scans and batches are pre-empted between slots when a higher priority job is
+waiting: the slots measured so far are in the job's own scan journal (scan_journal_<id>.jsonl in
+its output directory), and the scan resumes from there once it is back at the front of the
+queue. Other jobs run to completion.
+
+The hardware code writes files relative to the working directory, so the worker changes into a
+job's output directory while it runs and changes back afterwards. Avoid relying on the working
+directory from other threads while the queue is busy.
+Jobs never change the physical tray; every job on the queue is expected to target the tray
+that is loaded.
+"""
+import os
+import time
+import heapq
+import itertools
+import threading
+
+from jvbot.journal import ScanInterrupted
+
+# jobs that check for pre-emption between slots
+PREEMPTIBLE = ("scan_tray", "batch")
+# Control_Keithley measurements, optionally after moving to a slot
+MEASUREMENTS = ("jv", "spo", "jv_time", "jsc_time", "voc_time")
+KINDS = PREEMPTIBLE + ("stability_tray",) + MEASUREMENTS
+
+QUEUED = "queued"
+RUNNING = "running"
+PREEMPTED = "preempted"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    def __init__(self, job_id, kind, params, priority=0, estimate=None, owner=None, output="."):
+        """
+        Args:
+            kind (str): one of KINDS
+            params (dict): keyword arguments of the Control (or Control_Keithley) method
+            priority (int = 0): higher runs first
+            estimate (float = None): expected duration (s), used for the queue ETA
+            owner (str = None): who submitted the job, for display only
+            output (str = "."): directory the job runs in
+        """
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.estimate = estimate
+        self.owner = owner
+        self.output = os.path.abspath(output)
+        self.state = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.runtime = 0.0  # s spent running, summed over pre-emptions
+        self.preemptions = 0
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the job is done, failed or cancelled
+
+        Returns:
+            object: what the job returned
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.id} still {self.state} after {timeout} s")
+        if self.state == FAILED:
+            raise self.error
+        return self.result
+
+    def remaining(self):
+        """
+        Returns:
+            float: estimated time (s) left, None if no estimate was given
+        """
+        if self.estimate is None:
+            return None
+        return max(self.estimate - self.runtime, 0)
+
+    def info(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "owner": self.owner,
+            "priority": self.priority,
+            "state": self.state,
+            "estimate": self.estimate,
+            "runtime": round(self.runtime, 1),
+            "preemptions": self.preemptions,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "output": self.output,
+            "error": None if self.error is None else f"{type(self.error).__name__}: {self.error}",
+        }
+
+
+class JobQueue:
+    def __init__(self, control, start=True):
+        """
+        Args:
+            control (Control): connected jvbot Control, only used from the worker thread
+            start (bool = True): start the worker right away
+        """
+        self.control = control
+        self.jobs = {}  # id -> Job, every job submitted
+        self._heap = []  # (-priority, id) of queued and pre-empted jobs, ids follow submission order
+        self._ids = itertools.count(1)
+        self._running = None
+        self._cond = threading.Condition()
+        self._stop = False
+        self._worker = None
+        if start:
+            self.start()
+
+    def submit(self, kind, priority=0, estimate=None, owner=None, output=".", **params):
+        """
+        Adds a job to the queue
+
+        Args:
+            kind (str): scan_tray, batch, stability_tray, or a Control_Keithley measurement (jv,
+                spo, jv_time, jsc_time, voc_time)
+            priority (int = 0): higher runs first. A queued job with a higher priority than a
+                running tray scan or batch pre-empts it at the next slot
+            estimate (float = None): expected duration (s)
+            owner (str = None): who submitted the job
+            output (str = "."): directory the job runs in, relative paths are taken from here
+            **params: arguments of the job. batch takes the recipe as recipe=. Every kind also
+                accepts tray= (and profile=) to set the tray before running, and measurements
+                accept slot= to move there first
+
+        Returns:
+            Job
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown job kind {kind}, must be one of {KINDS}")
+        with self._cond:
+            job = Job(next(self._ids), kind, params, priority, estimate, owner, output)
+            self.jobs[job.id] = job
+            self._push(job)
+            self._cond.notify_all()
+        return job
+
+    def cancel(self, job_id):
+        """
+        Removes a queued or pre-empted job. A running job is not interrupted
+
+        Returns:
+            bool: whether the job was cancelled
+        """
+        with self._cond:
+            job = self.jobs[job_id]
+            if job.state not in (QUEUED, PREEMPTED):
+                return False
+            self._heap = [entry for entry in self._heap if entry[1] != job_id]
+            heapq.heapify(self._heap)
+            self._finish(job, CANCELLED)
+            return True
+
+    def status(self):
+        """
+        Returns:
+            list(dict): running job first, then waiting jobs in the order they will run, each with
+                the estimated start time of the job (eta, None when an estimate ahead is missing)
+        """
+        with self._cond:
+            jobs = [self.jobs[entry[1]] for entry in sorted(self._heap)]
+            if self._running is not None:
+                jobs.insert(0, self._running)
+            rows = []
+            now = time.time()
+            ahead = 0.0  # estimated time (s) until the next job starts, None once unknown
+            for job in jobs:
+                row = job.info()
+                row["eta"] = None if job.state == RUNNING or ahead is None else now + ahead
+                rows.append(row)
+                remaining = job.remaining()
+                ahead = None if ahead is None or remaining is None else ahead + remaining
+            return rows
+
+    def history(self):
+        """
+        Returns:
+            list(dict): finished, failed and cancelled jobs, oldest first
+        """
+        with self._cond:
+            return [j.info() for j in self.jobs.values() if j.state in (DONE, FAILED, CANCELLED)]
+
+    def start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._stop = False
+            self._worker = threading.Thread(target=self._work, name="jvbot-jobs", daemon=True)
+            self._worker.start()
+
+    def stop(self, wait=True):
+        """
+        Stops the worker after the running job. Queued jobs stay queued
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if wait and self._worker is not None:
+            self._worker.join()
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (-job.priority, job.id))  # a pre-empted job keeps its place
+
+    def _should_yield(self):
+        """
+        interrupt callback of the running job: True when a higher priority job is waiting
+        """
+        with self._cond:
+            return bool(self._heap) and -self._heap[0][0] > self._running.priority
+
+    def _finish(self, job, state, result=None, error=None):
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        job._done.set()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                job = self.jobs[heapq.heappop(self._heap)[1]]
+                job.state = RUNNING
+                if job.started is None:
+                    job.started = time.time()
+                self._running = job
+            t0 = time.time()
+            try:
+                result = self._execute(job)
+            except ScanInterrupted as e:
+                print(f"Job {job.id} ({job.kind}) pre-empted: {e}")
+                with self._cond:
+                    job.runtime += time.time() - t0
+                    job.preemptions += 1
+                    job.params["resume"] = True
+                    job.state = PREEMPTED
+                    self._running = None
+                    self._push(job)
+                continue
+            except Exception as e:
+                print(f"Job {job.id} ({job.kind}) failed: {type(e).__name__}: {e}")
+                with self._cond:
+                    job.runtime += time.time() - t0
+                    self._running = None
+                    self._finish(job, FAILED, error=e)
+                continue
+            with self._cond:
+                job.runtime += time.time() - t0
+                self._running = None
+                self._finish(job, DONE, result=result)
+
+    def _execute(self, job):
+        os.makedirs(job.output, exist_ok=True)
+        cwd = os.getcwd()
+        os.chdir(job.output)
+        try:
+            return self._run_job(job)
+        finally:
+            os.chdir(cwd)
+
+    def _run_job(self, job):
+        control = self.control
+        params = dict(job.params)
+        tray = params.pop("tray", None)
+        profile = params.pop("profile", None)
+        slot = params.pop("slot", None)
+        if job.kind in PREEMPTIBLE:
+            # a journal per job, so scans sharing an output directory never resume from each other
+            params.setdefault("journal", os.path.join(job.output, f"scan_journal_{job.id}.jsonl"))
+
+        if job.kind == "scan_tray":
+            tray = params["tray_version"]
+        if tray is not None and getattr(getattr(control, "tray", None), "version", None) != tray:
+            control.set_tray(tray, profile=profile)
+        elif profile is not None:
+            control.gantry.set_motion_profile(profile)
+
+        if job.kind == "scan_tray":
+            params.setdefault("preview", False)
+            return control.scan_tray(interrupt=self._should_yield, **params)
+        if job.kind == "batch":
+            from jvbot.batch import run_batch
+
+            params.setdefault("preview", False)
+            return run_batch(control, interrupt=self._should_yield, **params)
+        if job.kind == "stability_tray":
+            return control.stability_tray(**params)
+        params.setdefault("preview", False)
+        if slot is None:
+            return getattr(control.control_keithley, job.kind)(**params)
+        index = getattr(control, "index", None)
+        if index is not None:
+            index.set_context(slot=slot, tray=control.tray.version)
+        try:
+            control.tray.moveto(slot)
+            return getattr(control.control_keithley, job.kind)(**params)
+        finally:
+            if index is not None:
+                index.set_context(slot=None, tray=None)
@@ -0,0 +1,131 @@
+import os
+import json
+from datetime import datetime
+
+JOURNAL_FNAME = "scan_journal.jsonl"
+
+
+class JournalMismatch(ValueError):
+    """
+    a resumed scan has different settings than the one recorded in the journal
+    """
+
+
+class ScanInterrupted(Exception):
+    """
+    a scan stopped between two slots on request. Everything finished so far is in the journal,
+    so running it again with resume=True picks up at the next slot
+    """
+
+
+class ScanJournal:
+    """
+    Append-only JSONL record of completed tray slots. A line is written, flushed and
+    fsync'd as soon as a slot finishes, so a run that dies halfway through a tray can
+    be resumed without re-measuring the cells that were already done.
+    """
+
+    def __init__(self, fpath=JOURNAL_FNAME):
+        self.fpath = fpath
+
+    def begin(self, settings, resume=False):
+        """
+        Starts a run, or resumes the one in the journal. The settings of the run (ie tray
+        version, direction, voltages) are stored as the first line, and resuming with different
+        settings is refused, so slots measured one way are never taken as done for another.
+
+        Args:
+            settings (dict): json-serializable settings identifying the run
+            resume (boolean = False): keep the slots already recorded. If False the journal is
+                cleared.
+
+        Returns:
+            dict: slot name -> last journal entry, as completed()
+        """
+        settings = json.loads(json.dumps(settings))  # tuples -> lists, as read back
+        if resume and os.path.exists(self.fpath):
+            recorded = self.settings()
+            if recorded is not None:
+                if recorded != settings:
+                    changed = sorted(k for k in set(recorded) | set(settings) if recorded.get(k) != settings.get(k))
+                    raise JournalMismatch(
+                        f"Cannot resume {self.fpath}: {changed} differ from the interrupted run, "
+                        "use resume=False or another output directory"
+                    )
+                return self.completed()
+            print(f"{self.fpath} has no recorded settings, resuming without checking them")
+        else:
+            self.clear()
+        self._append({"settings": settings})
+        return self.completed()
+
+    def settings(self):
+        """
+        Returns:
+            dict: settings stored by begin, None if the journal has none
+        """
+        for entry in self._entries():
+            if "settings" in entry:
+                return entry["settings"]
+        return None
+
+    def completed(self):
+        """
+        Reads back the journal
+
+        Returns:
+            dict: slot name -> last journal entry recorded for that slot
+        """
+        done = {}
+        for entry in self._entries():
+            if "slot" in entry:
+                done[entry["slot"]] = entry
+        return done
+
+    def _entries(self):
+        if not os.path.exists(self.fpath):
+            return
+        with open(self.fpath, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line left behind by a crash mid-write
+                if isinstance(entry, dict):
+                    yield entry
+
+    def record(self, slot, **info):
+        """
+        Marks a slot as completed
+
+        Args:
+            slot (string): tray slot name, ie "A1"
+            **info: any extra json-serializable fields to store with the entry
+        """
+        entry = {"slot": slot, "time": datetime.now().isoformat(timespec="seconds")}
+        entry.update(info)
+        self._append(entry)
+        return entry
+
+    def _append(self, entry):
+        line = json.dumps(entry) + "\n"
+        if self._ends_midline():
+            line = "\n" + line  # dont glue onto a half-written line
+        with open(self.fpath, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        """
+        Deletes the journal, used when starting a fresh (non-resumed) run
+        """
+        if os.path.exists(self.fpath):
+            os.remove(self.fpath)
+
+    def _ends_midline(self):
+        if not os.path.exists(self.fpath) or os.path.getsize(self.fpath) == 0:
+            return False
+        with open(self.fpath, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
@@ -2,48 +2,78 @@ import os
 import yaml
 import shutil
 import pickle as pkl
-from natsort import natsorted
 import csv
+import time
+import tempfile
 from datetime import datetime
-from tqdm import tqdm
-from frgtools import jv
-
 
-MODULE_DIR = os.path.dirname(__file__)
-TRAY_VERSIONS_DIR = os.path.join(MODULE_DIR, "tray_versions")
-AVAILABLE_VERSIONS = {
-    os.path.splitext(f)[0]: os.path.join(TRAY_VERSIONS_DIR, f)
-    for f in os.listdir(TRAY_VERSIONS_DIR)
-    if ".yaml" in f
-}
 
 from jvbot.hardware.gantry import Gantry
 from jvbot.hardware.control3 import Control_Keithley 
-from jvbot.hardware.tray import Tray
+from jvbot.hardware.tray import Tray, available_versions
+from jvbot.journal import ScanJournal, ScanInterrupted, JOURNAL_FNAME
+from jvbot.analysis import analyze_files, analyze_directory, jv_files, MetricsCache, jv_metrics, load_jv, parse_name, METRICS
+from jvbot.stability import StabilityScheduler
+from jvbot.hardware.transcript import Transcript
+
+
+def __getattr__(name):
+    # tray versions used to be listed here at import, see jvbot.hardware.tray.available_versions
+    if name == "AVAILABLE_VERSIONS":
+        return available_versions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Control:
-    def __init__(self, area=0.07, savedir="."):
+    def __init__(self, area=0.07, savedir=".", trace=False, record=None, gantry=None, control_keithley=None, status=None, index=None):
+        """
+            Args:
+                trace (boolean = False): record Keithley SCPI traffic, see Control_Keithley.tracer
+                record (string = None): transcript file to record all gantry and Keithley traffic
+                    to, see jvbot/hardware/transcript.py
+                gantry, control_keithley: already built hardware to use instead of connecting,
+                    ie replaying a transcript
+                status (StatusFeed = None): publish scan progress and curves for remote
+                    monitoring, see jvbot/status.py
+                index (ScanIndex = None): database recording every file saved, see
+                    jvbot/index.py. Defaults to ~/.jvbot/scan_index.sqlite, False disables it
+        """
         print('deniz 9/9/22')
         self.area = area  # cm2
         self.pause = 0.05
-        self.control_keithley = Control_Keithley() ## control_keithley class communicates with keithley code
-        self.gantry = Gantry()
+        self.transcript = None if record is None else Transcript(record)
+        if control_keithley is None:
+            control_keithley = Control_Keithley(area=area, trace=trace, record=self.transcript)
+        self.control_keithley = control_keithley ## control_keithley class communicates with keithley code
+        self.status = status
+        self.control_keithley.status = status
+        if index is None:
+            from jvbot.index import ScanIndex
+
+            index = ScanIndex()
+        self.index = index or None
+        self.control_keithley.index = self.index
+        self.gantry = Gantry(record=self.transcript) if gantry is None else gantry
         self.savedir = savedir
+        self.metrics_cache = MetricsCache()
 
     def open_shutter(self):
-        # self.shutter.write(b'1')
-        # self._shutteropen = True
-        return
+        self.control_keithley.open_shutter()
 
     def close_shutter(self):
-        # self.shutter.write(b'0')
-        # self._shutteropen = False
-        return
+        self.control_keithley.close_shutter()
 
-    def set_tray(self, version:str, calibrate:bool = False):
+    def set_tray(self, version:str, calibrate:bool = False, profile=None):
+        """
+            Args:
+                version (string): tray version, see jvbot/tray_versions
+                calibrate (boolean = False): run the tray calibration routine
+                profile (string or dict = None): gantry motion profile, overrides the one named
+                    by the tray version
+        """
         self.gantry.moveto([55,24,30])
         self.tray = Tray(version=version, gantry=self.gantry, calibrate=calibrate)
+        self.gantry.set_motion_profile(self.tray.motion_profile if profile is None else profile)
 
     def _save_to_csv(self, slot, vmeas, i, direction):
         fpath = os.path.join(self.savedir, f"{slot}_{direction}.csv")
@@ -117,45 +147,208 @@ class Control:
         vsteps = 50,
         final_slot=None,
         slots=None,
-        retry=False
+        retry=False,
+        resume=False,
+        preview=True,
+        light_and_dark=False,
+        interrupt=None,
+        journal=JOURNAL_FNAME
         ## Added the necessary arguments here
     ):
+        """
+            Scans every slot in the tray, recording each finished slot in a journal
+
+            Args:
+                resume (boolean = False): skip slots already recorded as done in the
+                    journal from a previous (interrupted) run. If False, the journal is
+                    cleared and the whole tray is scanned. Resuming a run recorded with a
+                    different tray, direction, voltages or light_and_dark raises JournalMismatch.
+                preview (boolean = True): plot each JV as it is measured. False for headless runs.
+                light_and_dark (boolean = False): measure every slot under light and then dark
+                    without lifting the probe, instead of light only
+                interrupt (callable = None): checked before every slot, returning True stops the
+                    scan there with ScanInterrupted. Resume it later with resume=True.
+                journal (string = JOURNAL_FNAME): journal file, relative to the scan directory.
+                    Scans sharing a directory need their own journals to be resumable.
+
+            Returns:
+                list: slots flagged with abnormal pce/ff
+        """
+        from natsort import natsorted
+        from tqdm import tqdm
+        from jvbot.status import ScanProgress
+
         if final_slot is not None:
             allslots = natsorted(list(self.tray._coordinates.keys()))
             final_idx = allslots.index(final_slot)
             slots = allslots[: final_idx + 1]
         if slots is None:
             raise ValueError("Either final_slot or slots must be specified!")
+        if light_and_dark:
+            self.control_keithley.require_shutter()
         
         if retry == True:
-            i = 0
-            os.mkdir("retries")
+            os.makedirs("retries", exist_ok=True)
             os.chdir("retries")
-            jitter_list = [[0,0.5,1],[0.5,0,1],[0,0,2],[0,0.5,2]]
-            j = 0
-            for slot in tqdm(slots, desc="Scanning Tray"):
-                self.gantry.moveto(self.tray(slot)+jitter_list[j])
-                name_jv = "x"+str(self.position_to_number(slot)).zfill(2)+"_P1_S"+str(j+2)
-                i = i+1
-                name = name_jv
-                self.control_keithley.jv(name, direction, vmin, vmax) 
 
-        else:
-            i = 0
-            for slot in tqdm(slots, desc="Scanning Tray"):
-                self.gantry.moveto(self.tray(slot))
-                name_keithley = "x"+str(i+1).zfill(2)+"_P1_S1"
-                i = i+1
-                name = name_keithley
-                self.control_keithley.jv(name, direction, vmin, vmax) 
+        journal = ScanJournal(journal)
+        settings = dict(tray=tray_version, direction=direction, vmin=vmin, vmax=vmax, vsteps=vsteps, light_and_dark=light_and_dark)
+        done = journal.begin(settings, resume=resume)
+        pending = [(i, slot) for i, slot in enumerate(slots) if slot not in done]
+        if len(pending) < len(slots):
+            print(f"Resuming tray, skipping {len(slots) - len(pending)} completed slots")
 
+        progress = ScanProgress(self.status, len(pending), scan=tray_version)
+        try:
+            if retry == True:
+                jitter_list = [[0,0.5,1],[0.5,0,1],[0,0,2],[0,0.5,2]]
+                j = 0
+                for i, slot in tqdm(pending, desc="Scanning Tray"):
+                    self._check_interrupt(interrupt, slot)
+                    progress.slot(slot)
+                    self._index_context(slot=slot, tray=tray_version)
+                    self.tray.moveto(slot, jitter=jitter_list[j])
+                    name_jv = "x"+str(self.position_to_number(slot)).zfill(2)+"_P1_S"+str(j+2)
+                    name = name_jv
+                    n_saved = len(self.control_keithley.saved_files)
+                    progress.phase("measuring")
+                    self.control_keithley.jv(name, direction, vmin, vmax, vsteps=vsteps, preview=preview, light_and_dark=light_and_dark)
+                    files = self.control_keithley.saved_files[n_saved:]
+                    journal.record(slot, name=name, direction=direction, vmin=vmin, vmax=vmax, light_and_dark=light_and_dark, files=files)
+                    progress.slot_done()
+
+            else:
+                for i, slot in tqdm(pending, desc="Scanning Tray"):
+                    self._check_interrupt(interrupt, slot)
+                    progress.slot(slot)
+                    self._index_context(slot=slot, tray=tray_version)
+                    self.tray.moveto(slot)
+                    name_keithley = "x"+str(i+1).zfill(2)+"_P1_S1"
+                    name = name_keithley
+                    n_saved = len(self.control_keithley.saved_files)
+                    progress.phase("measuring")
+                    self.control_keithley.jv(name, direction, vmin, vmax, vsteps=vsteps, preview=preview, light_and_dark=light_and_dark)
+                    files = self.control_keithley.saved_files[n_saved:]
+                    journal.record(slot, name=name, direction=direction, vmin=vmin, vmax=vmax, light_and_dark=light_and_dark, files=files)
+                    progress.slot_done()
+        finally:
+            self._index_context(slot=None, tray=None)
+
+        progress.phase("analyzing")
         self.gantry.movetoload()
-        self.copy_rename_csv()
-        retry_slots = self.flag_function()
+        files = [f for entry in journal.completed().values() for f in entry.get("files", [])]
+        self.copy_rename_csv([f for f in files if f.endswith("_light.csv")])  # dark JVs stay out of the light analysis
+        retry_slots = self.flag_function(files)
+        progress.finish()
         #if retry is not True:
         #    self.scan_tray(tray_version,direction,vmin,vmax,vsteps = 50, slots = retry_slots, retry = True)
+        return retry_slots
+
+    def _index_context(self, **fields):
+        if self.index is not None:
+            self.index.set_context(**fields)
+
+    def _check_interrupt(self, interrupt, slot):
+        if interrupt is not None and interrupt():
+            raise ScanInterrupted(f"Scan interrupted before slot {slot}")
 
     
+    def stability_tray(
+        self,
+        slots,
+        direction,
+        vmin,
+        vmax,
+        period,
+        cycles,
+        vsteps = 50,
+        light = True,
+        preview = False,
+        on_infeasible = "raise"
+    ):
+        """
+            Tray-level stability test: cycles the gantry through several slots every `period`
+            seconds, sweeping each one, and keeps a metrics time series per slot in
+            {name}_stability.csv next to the individual JV files.
+
+            Args:
+                slots (list): slot names to cycle through, in order
+                direction (string): direction -- fwd, rev, fwdrev, or revfwd
+                vmin (float): minimum voltage for JV sweep (V)
+                vmax (float): maximum voltage for JV sweep (V)
+                period (float): time between the starts of consecutive cycles (s)
+                cycles (int): number of cycles
+                vsteps (int = 50): number of voltage steps between max and min
+                light (boolean = True): boolean to describe status of light
+                preview (boolean = False): boolean to determine if data is plotted
+                on_infeasible (string = "raise"): what to do if the period is too short to visit
+                    every slot, checked before the first cycle from the sweep settings and tray
+                    geometry and again with the times measured in it -- "raise", or "stretch" to
+                    lengthen the period
+        """
+        from natsort import natsorted
+
+        allslots = natsorted(list(self.tray._coordinates.keys()))
+        names = {slot: "x"+str(allslots.index(slot)+1).zfill(2)+"_P1_S1" for slot in slots}
+        scheduler = StabilityScheduler(slots, period)
+        sweep_time = self.control_keithley.jv_duration(direction, vsteps)
+        for k, slot in enumerate(slots):
+            # each cycle reaches its first slot from the last slot of the previous one
+            scheduler.estimate(slot, move_time=self.tray.move_duration(slots[k - 1], slot), sweep_time=sweep_time)
+        self._check_period(scheduler, on_infeasible, "estimated")
+        stime = time.time()
+
+        try:
+            for cycle in range(cycles):
+                wait = scheduler.cycle_start(stime, cycle) - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                elif cycle > 0:
+                    print(f"Cycle {cycle} starting {-wait:.1f} s late")
+
+                for slot in slots:
+                    t0 = time.time()
+                    self._index_context(slot=slot, tray=self.tray.version)
+                    self.tray.moveto(slot)
+                    t1 = time.time()
+                    n_saved = len(self.control_keithley.saved_files)
+                    self.control_keithley.jv(names[slot], direction, vmin, vmax, vsteps=vsteps, light=light, preview=preview, scan_number=int(t1 - stime))
+                    t2 = time.time()
+                    scheduler.record(slot, move_time=t1 - t0, sweep_time=t2 - t1)
+                    self._append_stability(names[slot], t1 - stime, cycle, self.control_keithley.saved_files[n_saved:])
+
+                if cycle == 0:
+                    self._check_period(scheduler, on_infeasible, "measured")
+        finally:
+            self._index_context(slot=None, tray=None)
+            self.gantry.movetoload()
+        return scheduler
+
+    def _check_period(self, scheduler, on_infeasible, source):
+        if scheduler.feasible():
+            return
+        period, needed = scheduler.period, scheduler.cycle_time()
+        if on_infeasible == "stretch":
+            print(f"Period of {period} s is too short for {len(scheduler.slots)} slots, stretching to {needed:.1f} s ({source})")
+            scheduler.period = needed
+        else:
+            raise ValueError(f"Period of {period} s is infeasible, one cycle over {len(scheduler.slots)} slots takes {needed:.1f} s ({source})")
+
+    def _append_stability(self, name, elapsed, cycle, files):
+        fpath = os.path.join(os.getcwd(), f"{name}_stability.csv")
+        new_file = not os.path.exists(fpath)
+        with open(fpath, "a", newline="") as f:
+            writer = csv.writer(f, delimiter=",")
+            if new_file:
+                writer.writerow(["Time Elapsed (s)", "Cycle", "Direction"] + METRICS)
+            for fname in files:
+                try:
+                    metrics = jv_metrics(*load_jv(fname))
+                except (ValueError, OSError) as e:
+                    print(f"Could not analyze {fname}, leaving it out of {fpath}: {e}")
+                    continue
+                writer.writerow([round(elapsed, 2), cycle, parse_name(fname)["direction"]] + [metrics[m] for m in METRICS])
+
     def position_to_number(self, position):
         try:
             row, column = position[0], int(position[1:])
@@ -187,8 +380,96 @@ class Control:
    
 
 
-    def flag_function(self):
-            rawdf = jv.jv_metrics_pkl(rootdir=os.getcwd(), pce_cutoff=None, voc_cutoff=None, export_raw=True, area=.07) #.21
+    FRGTOOLS_COLUMNS = ['name','pixel','repeat','direction','light','pce','ff','voc','jsc','rsh','rs']
+
+    def _frgtools_metrics(self, jv, files):
+        """
+            Runs frgtools on the files missing from the metrics cache, one file at a time since
+            jv_metrics_pkl only reads whole directories.
+
+            Args:
+                jv: frgtools.jv module
+                files (list): JV csv paths
+
+            Returns:
+                pd.DataFrame: FRGTOOLS_COLUMNS of every file frgtools could analyze
+        """
+        import pandas as pd
+
+        cache = self.metrics_cache
+        keys = {}
+        for fpath in files:
+            key = MetricsCache.file_key(fpath)
+            if key is not None:
+                keys[fpath] = "frgtools:" + key  # frgtools rows, not jvbot.analysis metrics
+        cached = cache.get_many(keys.values()) if cache is not None else {}
+
+        rows, new = [], {}
+        for fpath in files:
+            key = keys.get(fpath)
+            if key in cached:
+                rows.append(cached[key])
+                continue
+            row = self._frgtools_file(jv, fpath)
+            if row is None:
+                continue
+            rows.append(row)
+            if key is not None:
+                new[key] = row
+        if cache is not None and new:
+            cache.put_many(new)
+        return pd.DataFrame(rows, columns=self.FRGTOOLS_COLUMNS)
+
+    def _frgtools_file(self, jv, fpath):
+        """
+            Returns:
+                dict: FRGTOOLS_COLUMNS of the file as computed by frgtools, None if it failed
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dst = os.path.join(tmpdir, os.path.basename(fpath))
+            try:
+                try:
+                    os.link(fpath, dst)
+                except OSError:
+                    shutil.copy2(fpath, dst)
+                df = jv.jv_metrics_pkl(rootdir=tmpdir, pce_cutoff=None, voc_cutoff=None, export_raw=True, area=.07) #.21
+            except Exception as e:
+                print(f"frgtools could not analyze {fpath}: {type(e).__name__}: {e}")
+                return None
+        if df is None or len(df) == 0:
+            return None
+        row = df.iloc[0]
+        # numpy scalars -> python, so the row can be stored in the cache
+        return {c: (row[c].item() if hasattr(row[c], 'item') else row[c]) if c in row else None for c in self.FRGTOOLS_COLUMNS}
+
+    def flag_function(self, files=None):
+            """
+                Computes metrics for the tray and returns slots with abnormal pce/ff. The metrics come
+                from frgtools (jv.jv_metrics_pkl), which the pce/ff thresholds below were chosen for,
+                and are cached per file so only new or rewritten files are analyzed again. Without
+                frgtools installed, jvbot.analysis is used instead, computed in parallel for large
+                trays; its pce/ff can differ slightly from frgtools, so treat the flagged slots as
+                approximate.
+
+                Args:
+                    files (list = None): JV csv paths to analyze. If None, every JV csv in the
+                        current directory.
+            """
+            try:
+                from frgtools import jv
+            except ImportError:
+                jv = None
+            if files is None:
+                files = jv_files(os.getcwd())
+            if jv is not None:
+                rawdf = self._frgtools_metrics(jv, files)
+            else:
+                print("frgtools not installed, flagging with jvbot.analysis metrics")
+                rawdf = analyze_files(files, cache=self.metrics_cache)
+            if rawdf is None or len(rawdf) == 0 or 'light' not in rawdf:
+                print("No light JV curves to flag")
+                return []
+            rawdf = rawdf[rawdf['light'] == True]
             print(rawdf[['name','pixel','repeat','direction','pce','ff','voc','jsc','rsh','rs']].sort_values(by = ['name'], ascending = True))
  
             column_ranges = {
@@ -215,34 +496,36 @@ class Control:
             print(positions)
             return(positions)
 
-    def copy_rename_csv(self):
-
-        # Get the current working directory
-        current_directory = os.getcwd()
-        os.mkdir("light")
-
-        # List all files in the current directory
-        files = os.listdir(current_directory)
-
-        # Filter only the CSV files
-        csv_files = [file for file in files if file.endswith('.csv')]
-
-        # Iterate through CSV files and make a copy with modified names
-        for csv_file in csv_files:
-             # Extract the filename without extension
-             filename, extension = os.path.splitext(csv_file)
-                    
-             # Remove the first character from the filename
-             new_filename = filename[1:] + extension
-                    
-             # Construct the old and new file paths
-             old_path = os.path.join(current_directory, csv_file)
-             new_path = os.path.join(current_directory+"\\light", new_filename)
-                    
-             # Make a copy with the modified name
-             shutil.copy2(old_path, new_path)
+    def copy_rename_csv(self, files=None):
+        """
+            Exposes each JV csv under light/ with the first character of its name dropped
+            (x01_P1_S1_fwd_light.csv -> light/01_P1_S1_fwd_light.csv), which is the naming
+            the analysis expects. Files are hard-linked rather than copied, and links that
+            already point at the right file are left alone, so this costs O(new files).
 
-        print("Copies of CSV files with modified names created successfully.")
+            Args:
+                files (list = None): csv paths to expose. If None, every csv in the current
+                    directory is used.
+        """
+        if files is None:
+            files = [os.path.abspath(f) for f in os.listdir(os.getcwd()) if f.endswith(".csv")]
+
+        n_linked = 0
+        for old_path in files:
+            lightdir = os.path.join(os.path.dirname(old_path), "light")
+            os.makedirs(lightdir, exist_ok=True)
+            new_path = os.path.join(lightdir, os.path.basename(old_path)[1:])
+            if os.path.exists(new_path):
+                if os.path.samefile(old_path, new_path):
+                    continue  # already linked
+                os.remove(new_path)  # stale entry from an earlier scan with the same name
+            try:
+                os.link(old_path, new_path)
+            except OSError:
+                shutil.copy2(old_path, new_path)  # filesystem without hard link support
+            n_linked += 1
+
+        print(f"Linked {n_linked} CSV files into light/ with modified names.")
 
     # def _preview(self, v, j, label):
     #     def handle_close(evt, self):
@@ -412,3 +695,4 @@ class Control:
     #     self.__previewFigure.canvas.flush_events()
     #     time.sleep(1e-4)  # pause allows plot to update during series of measurements
     """
+
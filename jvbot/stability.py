@@ -0,0 +1,56 @@
+class StabilityScheduler:
+    """
+    Timing model for cycling the gantry over several slots on a fixed period. Move and sweep
+    durations are measured per slot as the run goes (exponentially smoothed), and the time one
+    cycle needs is estimated from them to decide whether the requested period is feasible.
+    """
+
+    def __init__(self, slots, period, smoothing=0.5):
+        self.slots = list(slots)
+        self.period = period
+        self.smoothing = smoothing  # weight of the newest measurement
+        self.move_time = {}
+        self.sweep_time = {}
+        self.estimates = {}  # slot -> (move, sweep) time (s) expected before it is measured
+
+    def record(self, slot, move_time, sweep_time):
+        for store, value in ((self.move_time, move_time), (self.sweep_time, sweep_time)):
+            if slot in store:
+                store[slot] = self.smoothing * value + (1 - self.smoothing) * store[slot]
+            else:
+                store[slot] = value
+
+    def estimate(self, slot, move_time, sweep_time):
+        """
+            Sets the times expected for a slot from the settings, used until it is measured
+        """
+        self.estimates[slot] = (move_time, sweep_time)
+
+    def cycle_time(self):
+        """
+            Returns:
+                float: estimated duration (s) of one cycle over every slot, from the measured times
+                    or else the estimates. None if any slot has neither
+        """
+        total = 0
+        for slot in self.slots:
+            if slot in self.sweep_time:
+                total += self.move_time[slot] + self.sweep_time[slot]
+            elif slot in self.estimates:
+                total += sum(self.estimates[slot])
+            else:
+                return None
+        return total
+
+    def feasible(self, period=None):
+        if period is None:
+            period = self.period
+        cycle = self.cycle_time()
+        return cycle is None or cycle <= period
+
+    def cycle_start(self, stime, cycle):
+        """
+            Returns:
+                float: wall time (s, time.time() based) the given cycle should start at
+        """
+        return stime + cycle * self.period
@@ -0,0 +1,248 @@
+"""
+Live status of a running scan for remote monitoring, instead of the matplotlib preview on the
+station PC. The scan loop publishes the current slot, phase, ETA and a decimated copy of every
+JV curve to a StatusFeed; a StatusServer serves it on a local HTTP port:
+
+    feed = StatusFeed()
+    StatusServer(feed, port=8765).start()
+    c = Control(status=feed)
+    c.scan_tray(..., preview=False)
+
+    GET /          minimal live page (slot, phase, ETA and the latest JV)
+    GET /status    json snapshot of the current state
+    GET /events    WebSocket streaming every event as json
+
+Publishing only appends to a bounded deque under a short lock, so it never waits on the network.
+Clients read from that deque on their own threads; a client that falls further behind than the
+deque length skips the oldest events (drop-oldest) and carries on from the latest state.
+"""
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+CURVE_POINTS = 100  # max points per streamed curve
+
+
+def decimate(x, y, max_points=CURVE_POINTS):
+    """
+    evenly strided subset of a curve, always keeping the last point
+
+    Returns:
+        tuple(list, list): x, y
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) > max_points:
+        idx = np.unique(np.linspace(0, len(x) - 1, max_points).round().astype(int))
+        x, y = x[idx], y[idx]
+    return x.round(6).tolist(), y.round(6).tolist()
+
+
+class StatusFeed:
+    def __init__(self, maxlen=256):
+        """
+        Args:
+            maxlen (int = 256): events kept for clients, older ones are dropped
+        """
+        self.events = deque(maxlen=maxlen)  # (sequence, event)
+        self.state = {}  # kind -> latest event of that kind, sent to clients as they connect
+        self.sequence = 0
+        self._cond = threading.Condition()
+
+    def publish(self, kind, **fields):
+        """
+        Records an event, ie publish("slot", slot="A1", index=0, total=32, eta=1200). Never blocks
+        on clients
+        """
+        event = {"kind": kind, "time": time.time(), **fields}
+        with self._cond:
+            self.sequence += 1
+            self.events.append((self.sequence, event))
+            self.state[kind] = event
+            self._cond.notify_all()
+
+    def curve(self, label, x, y, **fields):
+        """
+        Publishes a decimated curve, ie a JV just measured
+        """
+        x, y = decimate(x, y)
+        self.publish("curve", label=label, x=x, y=y, **fields)
+
+    def snapshot(self):
+        with self._cond:
+            return self.sequence, dict(self.state)
+
+    def since(self, sequence, timeout=None):
+        """
+        Waits up to timeout (s) for events newer than sequence
+
+        Returns:
+            tuple(int, list): latest sequence, new events (the oldest ones are missing if the
+                reader fell behind by more than maxlen)
+        """
+        with self._cond:
+            if self.sequence <= sequence:
+                self._cond.wait(timeout)
+            return self.sequence, [e for n, e in self.events if n > sequence]
+
+
+class ScanProgress:
+    """
+    publishes slot-by-slot progress of a scan and estimates the time left from the slots
+    measured so far. does nothing without a feed
+    """
+
+    def __init__(self, feed, total, scan="scan"):
+        self.feed = feed  # StatusFeed or None
+        self.total = total
+        self.scan = scan
+        self.done = 0
+        self.start = time.time()
+
+    def _publish(self, kind, **fields):
+        if self.feed is not None:
+            self.feed.publish(kind, **fields)
+
+    def slot(self, slot):
+        """
+        publishes the slot about to be measured, with the gantry moving to it
+        """
+        eta = None
+        if self.done:
+            eta = (time.time() - self.start) / self.done * (self.total - self.done)
+        self._publish("slot", scan=self.scan, slot=slot, index=self.done, total=self.total, eta=eta)
+        self.phase("moving")
+
+    def phase(self, phase):
+        self._publish("phase", phase=phase)
+
+    def slot_done(self):
+        self.done += 1
+
+    def finish(self):
+        self._publish("slot", scan=self.scan, slot=None, index=self.done, total=self.total, eta=0)
+        self.phase("idle")
+
+
+class StatusServer:
+    def __init__(self, feed, host="127.0.0.1", port=8765):
+        """
+        Args:
+            feed (StatusFeed): what to serve
+            host (str = "127.0.0.1"): interface to listen on, "0.0.0.0" to allow remote machines
+            port (int = 8765): tcp port, 0 picks a free one (see self.port)
+        """
+        self.feed = feed
+        handler = type("Handler", (_StatusHandler,), {"feed": feed})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="jvbot-status", daemon=True)
+        self._thread.start()
+        print(f"jvbot status on http://{self._server.server_address[0]}:{self.port}/")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    feed = None
+
+    def log_message(self, format, *args):
+        pass  # keep the scan output clean
+
+    def do_GET(self):
+        if self.path == "/events" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._websocket()
+        elif self.path == "/status":
+            self._send(200, "application/json", json.dumps(self.feed.snapshot()[1]).encode())
+        elif self.path == "/":
+            self._send(200, "text/html", PAGE.encode())
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _websocket(self):
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        sequence, state = self.feed.snapshot()
+        try:
+            self._frame(json.dumps({**state, "kind": "snapshot"}))
+            while True:
+                sequence, events = self.feed.since(sequence, timeout=15)
+                for event in events:
+                    self._frame(json.dumps(event))
+                if not events:
+                    self._frame(b"", opcode=0x9)  # ping, finds clients that went away
+        except (ConnectionError, OSError):
+            pass  # client disconnected
+        self.close_connection = True
+
+    def _frame(self, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        n = len(payload)
+        if n < 126:
+            header = bytes([0x80 | opcode, n])
+        elif n < 1 << 16:
+            header = bytes([0x80 | opcode, 126]) + n.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + n.to_bytes(8, "big")
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+
+PAGE = """<!doctype html>
+<html><head><title>jvbot</title></head>
+<body style="font-family: sans-serif">
+<h3 id="status">connecting...</h3>
+<canvas id="jv" width="600" height="400" style="border: 1px solid #ccc"></canvas>
+<p id="label"></p>
+<script>
+const ws = new WebSocket(`ws://${location.host}/events`);
+const st = {};
+function draw(c) {
+  const cv = document.getElementById("jv"), g = cv.getContext("2d");
+  g.clearRect(0, 0, cv.width, cv.height);
+  const xmin = Math.min(...c.x), xmax = Math.max(...c.x), ymin = Math.min(0, ...c.y), ymax = Math.max(...c.y);
+  const px = x => (x - xmin) / (xmax - xmin || 1) * (cv.width - 20) + 10;
+  const py = y => cv.height - 10 - (y - ymin) / (ymax - ymin || 1) * (cv.height - 20);
+  g.beginPath();
+  c.x.forEach((x, i) => i ? g.lineTo(px(x), py(c.y[i])) : g.moveTo(px(x), py(c.y[i])));
+  g.stroke();
+  document.getElementById("label").textContent = c.label;
+}
+ws.onmessage = m => {
+  const e = JSON.parse(m.data);
+  if (e.kind === "snapshot") Object.assign(st, e); else st[e.kind] = e;
+  if (st.curve && (e.kind === "curve" || e.kind === "snapshot")) draw(st.curve);
+  const s = st.slot || {}, eta = s.eta == null ? "" : ` | ETA ${Math.round(s.eta / 60)} min`;
+  document.getElementById("status").textContent =
+    `${s.slot ?? "-"} (${s.index ?? 0}/${s.total ?? "?"}) | ${st.phase ? st.phase.phase : "idle"}${eta}`;
+};
+ws.onclose = () => document.getElementById("status").textContent += " (disconnected)";
+</script>
+</body></html>
+"""
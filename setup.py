@@ -49,9 +49,10 @@ setup(
         "Topic :: Scientific/Engineering :: Chemistry",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
-    # entry_points={
-    #     'console_scripts': [
-    #         'meg = megnet.cli.meg:main',
-    #     ]
-    # }
+    entry_points={
+        'console_scripts': [
+            'jvbot = jvbot.cli:main',
+            'jvbot-daemon = jvbot.daemon:main',
+        ]
+    }
 )
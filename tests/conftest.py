@@ -0,0 +1,120 @@
+import os
+
+import serial
+import pytest
+
+
+class FakeGantry:
+    def __init__(self):
+        self.moves = []
+
+    def movetoload(self):
+        self.moves.append("load")
+
+    def moveto(self, target, **kwargs):
+        self.moves.append(list(target))
+
+    def set_motion_profile(self, profile):
+        pass
+
+
+class FakeTray:
+    def __init__(self, version, rows="ABCD", columns=4, pitch=10):
+        self.version = version
+        self._coordinates = {
+            f"{r}{c + 1}": [c * pitch, i * pitch, 0] for i, r in enumerate(rows) for c in range(columns)
+        }
+        self.visited = []
+
+    def moveto(self, slot, jitter=None):
+        self.visited.append(slot)
+
+    def move_duration(self, start, end):
+        return 1.0
+
+
+class FakeSerial:
+    """
+    answers every command with ok and a position report, until the link is broken
+    """
+
+    def __init__(self):
+        self.broken = False
+        self.sent = []
+        self._lines = []
+
+    def write(self, data):
+        if self.broken:
+            raise serial.SerialException("device disconnected")
+        self.sent.append(data.decode().strip())
+        self._lines += [b"X:10.00 Y:20.00 Z:30.00 E:0.00\n", b"ok\n"]
+
+    def readline(self):
+        return self._lines.pop(0) if self._lines else b""
+
+    def reset_input_buffer(self):
+        self._lines.clear()
+
+    def close(self):
+        pass
+
+
+class FakeKeithley:
+    """
+    writes an empty csv per call, the way the real measurements add to saved_files
+    """
+
+    def __init__(self):
+        self.saved_files = []
+        self.calls = []
+        self.status = None
+        self.index = None
+
+    def _save(self, fname):
+        fpath = os.path.abspath(fname)
+        open(fpath, "w").close()
+        self.saved_files.append(fpath)
+
+    def jv(self, name, direction, vmin, vmax, vsteps=50, light=True, preview=True, scan_number=None, light_and_dark=False):
+        self.calls.append(("jv", name))
+        for dir in ("fwd", "rev") if direction in ("fwdrev", "revfwd") else (direction,):
+            for lit in ([True, False] if light_and_dark else [light]):
+                self._save(f"{name}_{dir}_{'light' if lit else 'dark'}.csv")
+
+    def jv_duration(self, direction, vsteps=50, light_and_dark=False):
+        return 2.0
+
+    def require_shutter(self):
+        pass
+
+    def spo(self, name, vstart, vstep, vdelay, interval, interval_count, preview=True, algorithm="po", vseed_max=None):
+        self.calls.append(("spo", name))
+        self._save(f"{name}_SPO.csv")
+
+
+class FakeControl:
+    def __init__(self):
+        self.gantry = FakeGantry()
+        self.control_keithley = FakeKeithley()
+        self.tray = None
+        self.status = None
+        self.index = None
+
+    def set_tray(self, version, calibrate=False, profile=None):
+        self.tray = FakeTray(version)
+
+
+@pytest.fixture
+def control():
+    return FakeControl()
+
+
+@pytest.fixture
+def fake_serial():
+    return FakeSerial()
+
+
+@pytest.fixture
+def in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,135 @@
+import sys
+
+import numpy as np
+import pytest
+
+from jvbot import analysis
+from jvbot.analysis import MetricsCache, analyze_files, jv_metrics
+from jvbot.jvbot import Control
+
+JSC = 20.0  # mA/cm2
+J0 = 1e-9  # mA/cm2
+NVT = 1.5 * 0.0257  # V
+
+
+def diode(v, rsh=None):
+    j = JSC - J0 * (np.exp(v / NVT) - 1)
+    if rsh is not None:
+        j -= v / rsh * 1000  # rsh in ohm cm2, j in mA/cm2
+    return j
+
+
+def write_jv(path, v, j):
+    with open(path, "w") as f:
+        f.write("Voltage (V),Current Density (mA/cm2),Measured Voltage (V)\n")
+        for v_, j_ in zip(v, j):
+            f.write(f"{v_},{j_},{v_}\n")
+
+
+def test_jv_metrics_on_model_diode():
+    v = np.linspace(-0.1, 1.0, 1101)
+    j = diode(v)
+    m = jv_metrics(v, j)
+
+    voc = NVT * np.log(JSC / J0 + 1)
+    fine = np.linspace(0, voc, 100001)
+    pmax = (fine * diode(fine)).max()
+    assert m["jsc"] == pytest.approx(JSC, rel=1e-6)
+    assert m["voc"] == pytest.approx(voc, abs=1e-3)
+    assert m["pce"] == pytest.approx(pmax / analysis.P_IN * 100, rel=1e-3)
+    assert m["ff"] == pytest.approx(pmax / (voc * JSC) * 100, rel=1e-3)
+    assert m["vmpp"] * m["jmpp"] == pytest.approx(pmax, rel=1e-3)
+
+
+def test_jv_metrics_sorts_reverse_scans_and_finds_shunt():
+    v = np.linspace(1.0, -0.1, 1101)  # rev scan
+    m = jv_metrics(v, diode(v, rsh=1000))
+    assert m["rsh"] == pytest.approx(1000, rel=1e-2)
+    assert m["voc"] < NVT * np.log(JSC / J0 + 1)
+
+
+def test_jv_metrics_without_voc_is_nan():
+    v = np.linspace(0, 0.5, 51)
+    m = jv_metrics(v, np.full_like(v, 5.0))
+    assert m["jsc"] == 5.0
+    assert np.isnan(m["voc"]) and np.isnan(m["pce"])
+
+
+def test_analyze_files_small_batches_run_serially(tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started for a handful of files")
+
+    monkeypatch.setattr(analysis, "ProcessPoolExecutor", no_pool)
+    v = np.linspace(-0.1, 1.0, 111)
+    fpaths = []
+    for k in range(4):
+        fpath = str(tmp_path / f"x0{k}_P1_S1_fwd_light.csv")
+        write_jv(fpath, v, diode(v))
+        fpaths.append(fpath)
+    df = analyze_files(fpaths)
+    assert list(df["name"]) == ["00", "01", "02", "03"]
+    assert df["light"].all()
+    assert df["pce"].notna().all()
+
+
+def test_analyze_files_empty_keeps_columns():
+    df = analyze_files([])
+    assert len(df) == 0
+    assert {"light", "name", "pce", "ff"} <= set(df.columns)
+
+
+def test_cache_skips_missing_and_unreadable_files(tmp_path):
+    cache = MetricsCache(str(tmp_path / "cache.sqlite"))
+    good = str(tmp_path / "x01_P1_S1_fwd_light.csv")
+    bad = str(tmp_path / "x02_P1_S1_fwd_light.csv")
+    missing = str(tmp_path / "x03_P1_S1_fwd_light.csv")
+    v = np.linspace(-0.1, 1.0, 111)
+    write_jv(good, v, diode(v))
+    open(bad, "w").close()  # still being written
+
+    df = analyze_files([good, bad, missing], cache=cache)
+    assert list(df["pce"].notna()) == [True, False, False]
+    assert MetricsCache.file_key(missing) is None
+    assert list(cache.get_many([MetricsCache.file_key(good), MetricsCache.file_key(bad)])) == [MetricsCache.file_key(good)]
+
+
+def test_flag_function_without_files(in_tmp, monkeypatch):
+    monkeypatch.setitem(sys.modules, "frgtools", None)  # use jvbot.analysis
+    c = Control.__new__(Control)
+    c.metrics_cache = None
+    assert c.flag_function([]) == []
+    assert c.flag_function() == []
+
+
+def test_flag_function_runs_frgtools_only_on_new_files(in_tmp, tmp_path, monkeypatch):
+    import types
+
+    import pandas as pd
+
+    analyzed = []
+
+    def jv_metrics_pkl(rootdir, **kwargs):
+        rows = []
+        for fname in sorted(analysis.os.listdir(rootdir)):
+            analyzed.append(fname)
+            m = jv_metrics(*analysis.load_jv(analysis.os.path.join(rootdir, fname)))
+            rows.append(dict(analysis.parse_name(fname), pce=m["pce"], ff=m["ff"], voc=m["voc"], jsc=m["jsc"], rsh=m["rsh"], rs=m["rs"]))
+        return pd.DataFrame(rows)
+
+    frgtools = types.ModuleType("frgtools")
+    frgtools.jv = types.SimpleNamespace(jv_metrics_pkl=jv_metrics_pkl)
+    monkeypatch.setitem(sys.modules, "frgtools", frgtools)
+
+    v = np.linspace(-0.1, 1.0, 111)
+    for k in range(1, 4):
+        write_jv(f"x0{k}_P1_S1_fwd_light.csv", v, diode(v))
+    c = Control.__new__(Control)
+    c.metrics_cache = MetricsCache(str(tmp_path / "cache.sqlite"))
+
+    assert c.flag_function() == []
+    assert analyzed == ["x01_P1_S1_fwd_light.csv", "x02_P1_S1_fwd_light.csv", "x03_P1_S1_fwd_light.csv"]
+
+    analyzed.clear()
+    write_jv("x02_P1_S1_fwd_light.csv", v, diode(v, rsh=1))  # remeasured, now shunted
+    assert c.flag_function() == ["A2"]
+    assert analyzed == ["x02_P1_S1_fwd_light.csv"]
@@ -0,0 +1,69 @@
+import pytest
+
+from jvbot.batch import validate_batch_recipe, run_batch, plan_tray, park_for_tray_change, TrayChangeRequired
+
+JV = {"type": "jv", "direction": "fwd", "vmin": -0.1, "vmax": 1.2}
+
+
+def recipe(*trays):
+    return {"trays": [{"version": v, "groups": {"g": ["A1", "A2"]}, "protocols": [JV]} for v in trays]}
+
+
+def test_validate_rejects_missing_protocol_keys():
+    bad = recipe("10mm_v2")
+    bad["trays"][0]["protocols"] = [{"type": "jv", "direction": "fwd", "vmin": 0}]
+    with pytest.raises(ValueError, match="vmax"):
+        validate_batch_recipe(bad)
+
+
+def test_validate_rejects_unknown_protocol_keys():
+    bad = recipe("10mm_v2")
+    bad["trays"][0]["protocols"] = [{**JV, "vmaxx": 1.2}]
+    with pytest.raises(ValueError, match="vmaxx"):
+        validate_batch_recipe(bad)
+
+
+def test_plan_tray_runs_one_pass_per_kind_in_serpentine_order(control):
+    control.set_tray("t")
+    tray = {
+        "groups": {"g": ["A1", "A2", "A3", "B1", "B2", "B3"]},
+        "protocols": [
+            {"type": "spo", "vstart": 0.9, "vstep": 0.01, "vdelay": 0, "interval": 1, "interval_count": 1},
+            {**JV, "light": False},
+            JV,
+        ],
+    }
+    passes = plan_tray(tray, control.tray._coordinates)
+    kinds = [{step[2]["type"] + str(step[2].get("light", True)) for step in p} for p in passes]
+    assert kinds == [{"jvTrue"}, {"jvFalse"}, {"spoTrue"}]
+    first = [step[0] for step in passes[0]]
+    assert first == ["A1", "A2", "A3", "B3", "B2", "B1"]
+    # the next pass starts where the previous one ended
+    assert passes[1][0][0] == "B1"
+
+
+def test_unattended_batch_parks_at_tray_change_and_resumes(control, in_tmp):
+    r = recipe("trayA", "trayB")
+    with pytest.raises(TrayChangeRequired) as e:
+        run_batch(control, r, on_tray_change=park_for_tray_change)
+    assert e.value.version == "trayB"
+    assert control.gantry.moves[-1] == "load"
+    assert control.tray.visited == ["A1", "A2"]
+
+    control.tray.visited = []
+    result = run_batch(control, r, resume=True, on_tray_change=park_for_tray_change)
+    assert control.tray.visited == ["A1", "A2"]  # only the second tray
+    assert len(result["completed_steps"]) == 4
+    assert not any(key.endswith(":load") for key in result["completed_steps"])
+
+
+def test_dark_protocol_without_shutter_fails_before_moving(control, in_tmp):
+    def simulated():
+        raise RuntimeError("Dark measurement requested but the shutter is simulated")
+
+    control.control_keithley.require_shutter = simulated
+    r = recipe("trayA")
+    r["trays"][0]["protocols"] = [JV, {**JV, "light": False}]
+    with pytest.raises(RuntimeError, match="simulated"):
+        run_batch(control, r)
+    assert control.tray is None and control.control_keithley.calls == []
@@ -0,0 +1,67 @@
+import os
+import stat
+import time
+import threading
+
+import pytest
+from multiprocessing import AuthenticationError
+
+from jvbot import daemon
+from jvbot.daemon import DaemonError, HardwareDaemon, connect, load_authkey
+
+pytestmark = pytest.mark.skipif(daemon.FAMILY != "AF_UNIX", reason="uses a unix socket")
+
+
+class Station:
+    def __init__(self):
+        self.tray = type("Tray", (), {"version": "10mm_v2"})()
+
+    def area(self, scale=1):
+        return 0.07 * scale
+
+    def lock(self):
+        return threading.Lock()  # cannot be pickled
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "DEFAULT_AUTHKEY_PATH", str(tmp_path / "daemon.key"))
+    address = str(tmp_path / "jvbot.sock")
+    server = HardwareDaemon(Station(), address=address)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    while not os.path.exists(address):
+        time.sleep(0.01)
+    yield address
+    server.shutdown()
+
+
+def test_default_key_is_private_and_shared(served, tmp_path):
+    fpath = tmp_path / "daemon.key"
+    assert stat.S_IMODE(os.stat(fpath).st_mode) == 0o600
+    assert load_authkey() == load_authkey(str(fpath))
+    c = connect(served)
+    assert c.area(2) == pytest.approx(0.14)
+    assert c.tray.version == "10mm_v2"
+    c.close()
+
+
+def test_wrong_key_is_rejected(served):
+    with pytest.raises(AuthenticationError):
+        connect(served, authkey=b"guess")
+
+
+def test_unpicklable_result_raises_in_client(served):
+    c = connect(served)
+    with pytest.raises(DaemonError, match="lock"):
+        c.lock()
+    assert c.area() == pytest.approx(0.07)  # connection still usable
+    c.close()
+
+
+def test_world_readable_key_is_refused(tmp_path):
+    fpath = tmp_path / "daemon.key"
+    fpath.write_text("secret")
+    os.chmod(fpath, 0o644)
+    with pytest.raises(PermissionError):
+        load_authkey(str(fpath))
@@ -0,0 +1,46 @@
+import pytest
+
+from jvbot.hardware.gantry import Gantry, GantryConnectionError
+
+
+@pytest.fixture
+def gantry(fake_serial):
+    g = Gantry(handle=fake_serial)
+    g.RECONNECT_DELAY = 0
+    return g
+
+
+def test_reconnect_gives_up_when_the_link_keeps_dropping(gantry):
+    gantry._handle.broken = True
+    with pytest.raises(GantryConnectionError, match="attempts"):
+        gantry.write("M17")
+    assert not gantry._reconnecting
+
+
+def test_reconnect_restores_defaults_and_position(gantry):
+    gantry.position = [10.0, 20.0, 30.0]
+    handle = gantry._handle
+    handle.broken = True
+    handle.sent.clear()
+    original_close = handle.close
+    handle.close = lambda: setattr(handle, "broken", False)  # comes back on reopen
+    gantry.write("M17")
+    handle.close = original_close
+    assert handle.sent[0] == "M501"  # set_defaults ran again
+    assert handle.sent[-1] == "M17"
+    assert gantry.position == [10.0, 20.0, 30.0]
+
+
+def test_move_speed_and_acceleration_override_the_traverse(gantry):
+    gantry.VERIFY_EVERY = 0
+    gantry.position = [10.0, 20.0, 30.0]
+    gantry._handle.sent.clear()
+    gantry.moverel(x=5, speed=10, acceleration=80)
+    assert gantry._handle.sent[:2] == ["M204 T80", "G0 X15.0 Y20.0 Z30.0 F600"]
+
+    gantry._handle.sent.clear()
+    gantry.moveto(10.0, 20.0, 30.0, speed=20)  # z hop: only the traverse is overridden
+    moves = [c for c in gantry._handle.sent if c.startswith("G0")]
+    assert moves[1].endswith(" F1200")
+    assert moves[0].endswith(f' F{gantry.motion_profile["lift"]["speed"] * 60:g}')
+    assert f'M204 T{gantry.motion_profile["traverse"]["acceleration"]}' in gantry._handle.sent  # back to the profile's
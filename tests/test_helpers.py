@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from jvbot.hardware import helpers
+
+GANTRY = {"vid": 7855, "pid": 4}
+
+
+@pytest.fixture
+def ports(tmp_path, monkeypatch):
+    monkeypatch.setattr(helpers, "PORT_CACHE_PATH", str(tmp_path / "ports.json"))
+    monkeypatch.setattr(helpers, "which_os", lambda: "Windows")
+    listed = []
+    monkeypatch.setattr(helpers.lp, "comports", lambda: listed)
+    return listed
+
+
+def test_cached_port_is_reused_while_it_matches(ports):
+    ports.append(SimpleNamespace(device="COM3", vid=7855, pid=4))
+    assert helpers.get_port(GANTRY) == "COM3"
+    ports.insert(0, SimpleNamespace(device="COM1", vid=7855, pid=4))
+    assert helpers.get_port(GANTRY) == "COM3"  # from the cache, not the first match
+
+
+def test_cached_port_taken_by_another_device_is_looked_up_again(ports):
+    ports.append(SimpleNamespace(device="COM3", vid=7855, pid=4))
+    assert helpers.get_port(GANTRY) == "COM3"
+    ports[:] = [
+        SimpleNamespace(device="COM3", vid=1027, pid=24577),  # re-plugged, now another board
+        SimpleNamespace(device="COM4", vid=7855, pid=4),
+    ]
+    assert helpers.get_port(GANTRY) == "COM4"
+    ports.clear()
+    with pytest.raises(ValueError):
+        helpers.get_port(GANTRY)
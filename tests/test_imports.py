@@ -0,0 +1,18 @@
+import sys
+import json
+import subprocess
+
+from jvbot.hardware import tray
+
+
+def test_available_versions_still_importable():
+    from jvbot.jvbot import AVAILABLE_VERSIONS
+
+    assert "10mm_v2" in AVAILABLE_VERSIONS
+    assert tray.AVAILABLE_VERSIONS == AVAILABLE_VERSIONS == tray.available_versions()
+
+
+def test_import_leaves_optional_modules_unloaded():
+    probe = "import sys, json, jvbot; print(json.dumps(sorted(sys.modules)))"
+    loaded = set(json.loads(subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout))
+    assert not loaded & {"jvbot.status", "jvbot.index", "pandas", "matplotlib", "pymeasure", "http.server"}
@@ -0,0 +1,63 @@
+import pytest
+
+from jvbot.index import ScanIndex
+from jvbot.jobs import JobQueue
+from jvbot.jvbot import Control
+from jvbot.hardware.control3 import Control_Keithley
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ScanIndex(str(tmp_path / "index.sqlite"))
+
+
+def test_find_by_context_kind_and_time(index):
+    index.set_context(slot="A1", tray="10mm_v2")
+    index.add("x01_P1_S1_fwd_light.csv", "jv", metrics={"pce": 18.5, "ff": 80.0}, timestamp=100)
+    index.add("x01_P1_S1_rev_dark.csv", "jv", timestamp=200)
+    index.set_context(slot=None)
+    index.add("x02_P1_S1_SPO.csv", "spo", timestamp=300)
+
+    assert list(index.find(slot="A1")["direction"]) == ["fwd", "rev"]
+    assert list(index.find(tray="10mm_v2")["name"]) == ["01", "01", "02"]
+    assert index.find(kind="spo")["slot"].isna().all()
+    light = index.find(name="01", light=True)
+    assert len(light) == 1 and light["pce"][0] == 18.5
+    assert list(index.find(since=150, until=300)["timestamp"]) == [200]
+    assert len(index.find(since="2999-01-01")) == 0
+
+
+def test_scan_tray_clears_context_when_a_slot_fails(control, in_tmp, index):
+    def broken_jv(name, *args, **kwargs):
+        raise RuntimeError("keithley timeout")
+
+    c = Control.__new__(Control)  # no hardware
+    c.gantry, c.control_keithley, c.status, c.index = control.gantry, control.control_keithley, None, index
+    control.set_tray("10mm_v2")
+    c.tray = control.tray
+    control.control_keithley.jv = broken_jv
+    with pytest.raises(RuntimeError):
+        c.scan_tray("10mm_v2", "fwd", -0.1, 1.2, slots=["A1"], preview=False)
+    assert index.context == {}
+
+
+def test_slot_job_indexes_its_slot(control, index, tmp_path):
+    seen = []
+    control.index = index
+    control.control_keithley.spo = lambda name, **kwargs: seen.append(dict(index.context))
+    queue = JobQueue(control)
+    queue.submit("spo", tray="10mm_v2", slot="B2", name="x06_P1", output=str(tmp_path)).wait(5)
+    queue.stop()
+    assert seen == [{"slot": "B2", "tray": "10mm_v2"}]
+    assert index.context == {}
+
+
+def test_index_failure_does_not_abort_measurement(capsys):
+    class BrokenIndex:
+        def add_jv(self, *args, **kwargs):
+            raise ValueError("bad curve")
+
+    ck = Control_Keithley.__new__(Control_Keithley)  # no instrument
+    ck.index = BrokenIndex()
+    ck._index_file("x01_P1_S1_fwd_light.csv", "add_jv", [0, 1], [1, 0])
+    assert "Could not index x01_P1_S1_fwd_light.csv: ValueError: bad curve" in capsys.readouterr().out
@@ -0,0 +1,87 @@
+import os
+import time
+
+from jvbot.jobs import JobQueue, DONE, FAILED, CANCELLED
+from jvbot.journal import ScanJournal, ScanInterrupted
+
+
+class ScanControl:
+    """
+    scan_tray that journals like the real one and sleeps per slot, so jobs can be pre-empted
+    """
+
+    def __init__(self):
+        self.tray = None
+        self.log = []
+
+    def set_tray(self, version, profile=None):
+        self.tray = type("Tray", (), {"version": version})()
+
+    def scan_tray(self, tray_version, direction, vmin, vmax, slots, resume=False, preview=False, interrupt=None, journal=None):
+        journal = ScanJournal(journal)
+        done = journal.begin({"tray": tray_version, "vmax": vmax}, resume=resume)
+        for slot in slots:
+            if slot in done:
+                continue
+            if interrupt is not None and interrupt():
+                raise ScanInterrupted(slot)
+            self.log.append((vmax, slot))
+            time.sleep(0.05)
+            journal.record(slot)
+        return sorted(journal.completed())
+
+
+def scan(queue, vmax, output, **kwargs):
+    return queue.submit("scan_tray", tray_version="t", direction="fwd", vmin=0, vmax=vmax,
+                        slots=["A1", "A2", "A3", "A4"], output=str(output), **kwargs)
+
+
+def wait_for(predicate, timeout=5):
+    end = time.time() + timeout
+    while not predicate():
+        assert time.time() < end
+        time.sleep(0.005)
+
+
+def test_priority_order_and_failures(tmp_path):
+    control = ScanControl()
+    queue = JobQueue(control, start=False)
+    low = scan(queue, 1.0, tmp_path, estimate=10)
+    high = scan(queue, 1.1, tmp_path, priority=5, estimate=20)
+    bad = queue.submit("scan_tray", tray_version="t", output=str(tmp_path))  # missing arguments
+    gone = scan(queue, 1.2, tmp_path)
+    rows = queue.status()
+    assert [r["id"] for r in rows] == [high.id, low.id, bad.id, gone.id]
+    assert rows[1]["eta"] - rows[0]["eta"] == 20
+    assert queue.cancel(gone.id)
+
+    queue.start()
+    assert high.wait(5) == ["A1", "A2", "A3", "A4"]
+    assert low.wait(5) == ["A1", "A2", "A3", "A4"]
+    bad._done.wait(5)
+    queue.stop()
+    assert [v for v, _ in control.log] == [1.1] * 4 + [1.0] * 4
+    assert (high.state, low.state, bad.state, gone.state) == (DONE, DONE, FAILED, CANCELLED)
+
+
+def test_preempted_scan_resumes_without_losing_slots_in_shared_directory(tmp_path):
+    control = ScanControl()
+    queue = JobQueue(control)
+    first = scan(queue, 1.0, tmp_path)
+    wait_for(lambda: len(control.log) == 2)
+    second = scan(queue, 1.1, tmp_path, priority=5)
+    first.wait(5)
+    second.wait(5)
+    queue.stop()
+    assert first.preemptions == 1
+    # every slot of both scans measured exactly once, the second between slots of the first
+    assert control.log == [(1.0, "A1"), (1.0, "A2")] + [(1.1, s) for s in ("A1", "A2", "A3", "A4")] + [(1.0, "A3"), (1.0, "A4")]
+
+
+def test_worker_restores_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queue = JobQueue(ScanControl())
+    scan(queue, 1.0, tmp_path / "out").wait(5)
+    queue.stop()
+    assert os.getcwd() == str(tmp_path)
+    assert os.path.exists(tmp_path / "out" / "scan_journal_1.jsonl")
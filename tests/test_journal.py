@@ -0,0 +1,59 @@
+import json
+import pytest
+
+from jvbot.journal import ScanJournal, JournalMismatch
+
+SETTINGS = {"tray": "10mm_v2", "direction": "fwdrev", "vmin": -0.1, "vmax": 1.2}
+
+
+def test_completed_keeps_last_entry_per_slot(tmp_path):
+    journal = ScanJournal(str(tmp_path / "j.jsonl"))
+    journal.begin(SETTINGS)
+    journal.record("A1", files=["a"])
+    journal.record("A1", files=["b"])
+    journal.record("A2")
+    done = journal.completed()
+    assert list(done) == ["A1", "A2"]
+    assert done["A1"]["files"] == ["b"]
+
+
+def test_partial_line_is_skipped_and_not_glued_onto(tmp_path):
+    fpath = tmp_path / "j.jsonl"
+    journal = ScanJournal(str(fpath))
+    journal.begin(SETTINGS)
+    journal.record("A1")
+    with open(fpath, "a") as f:
+        f.write('{"slot": "A2", "ti')  # crash mid-write
+    assert list(journal.completed()) == ["A1"]
+    journal.record("A3")
+    assert list(journal.completed()) == ["A1", "A3"]
+    assert json.loads(fpath.read_text().splitlines()[-1])["slot"] == "A3"
+
+
+def test_begin_without_resume_clears(tmp_path):
+    journal = ScanJournal(str(tmp_path / "j.jsonl"))
+    journal.begin(SETTINGS)
+    journal.record("A1")
+    assert journal.begin(SETTINGS, resume=False) == {}
+
+
+def test_resume_with_same_settings_keeps_slots(tmp_path):
+    journal = ScanJournal(str(tmp_path / "j.jsonl"))
+    journal.begin(SETTINGS)
+    journal.record("A1")
+    assert list(journal.begin(dict(SETTINGS), resume=True)) == ["A1"]
+
+
+def test_resume_with_other_settings_is_refused(tmp_path):
+    journal = ScanJournal(str(tmp_path / "j.jsonl"))
+    journal.begin(SETTINGS)
+    journal.record("A1")
+    with pytest.raises(JournalMismatch, match="vmax"):
+        journal.begin({**SETTINGS, "vmax": 1.0}, resume=True)
+    assert list(journal.completed()) == ["A1"]  # left untouched
+
+
+def test_resume_of_missing_journal_starts_fresh(tmp_path):
+    journal = ScanJournal(str(tmp_path / "j.jsonl"))
+    assert journal.begin(SETTINGS, resume=True) == {}
+    assert journal.settings() == SETTINGS
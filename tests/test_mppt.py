@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from jvbot.hardware.mppt import MPPT_ALGORITHMS, GoldenSection, MPPTracker
+
+AREA = 0.07  # cm2
+JSC = 20.0  # mA/cm2
+J0 = 1e-9  # mA/cm2
+NVT = 1.5 * 0.0257  # V
+
+
+def generated_current(v):
+    # model diode, in A
+    return (JSC - J0 * (np.exp(v / NVT) - 1)) * AREA / 1000
+
+
+def true_mpp():
+    v = np.linspace(0, 1, 100001)
+    p = v * generated_current(v)
+    return v[np.argmax(p)], p.max()
+
+
+def track(tracker, steps=60):
+    """
+    runs the tracker on the model diode, returns the voltages of the last 20 points
+    """
+    v, history = tracker.start(), []
+    for _ in range(steps):
+        v = tracker.update(v, generated_current(v))
+        history.append(v)
+    return np.array(history[-20:])
+
+
+def make_tracker(algorithm):
+    if algorithm == "golden":
+        vseed = np.linspace(0, 1.2, 15)
+        return GoldenSection.from_jv(vseed, generated_current(vseed), 0.01)
+    return MPPT_ALGORITHMS[algorithm](0.5, 0.02)
+
+
+def test_tracker_base_class_needs_update():
+    with pytest.raises(TypeError):
+        MPPTracker(0.5, 0.01)
+
+
+@pytest.mark.parametrize("algorithm", sorted(MPPT_ALGORITHMS))
+def test_trackers_settle_at_mpp(algorithm):
+    vmpp, pmax = true_mpp()
+    v = track(make_tracker(algorithm))
+    # settled around the MPP: dithering (or golden's re-opened bracket) costs under 1% power
+    assert np.abs(v - vmpp).min() < 0.005
+    assert (v * generated_current(v)).mean() > 0.99 * pmax
+
+
+def test_golden_section_brackets_mpp_of_coarse_jv():
+    tracker = make_tracker("golden")
+    assert tracker.a < true_mpp()[0] < tracker.b
+
+
+def test_trackers_stay_within_limits():
+    tracker = MPPT_ALGORITHMS["po"](1.9, 0.5, vlimits=(0, 2))
+    v = tracker.start()
+    for _ in range(20):
+        v = tracker.update(v, generated_current(v))
+        assert 0 <= v <= 2
@@ -0,0 +1,27 @@
+import os
+
+from jvbot.jvbot import Control
+
+
+def make_control(control):
+    c = Control.__new__(Control)  # no hardware
+    c.area = 0.07
+    c.gantry = control.gantry
+    c.control_keithley = control.control_keithley
+    c.status = None
+    c.index = None
+    c.set_tray = lambda version, **kwargs: control.set_tray(version)
+    control.set_tray("10mm_v2")
+    c.tray = control.tray
+    c.flag_function = lambda files=None: []
+    return c
+
+
+def test_light_and_dark_scan_links_only_light_files(control, in_tmp):
+    c = make_control(control)
+    c.scan_tray("10mm_v2", "fwdrev", -0.1, 1.2, slots=["A1", "A2"], preview=False, light_and_dark=True)
+    assert sorted(os.listdir("light")) == [
+        f"{n}_P1_S1_{d}_light.csv" for n in ("01", "02") for d in ("fwd", "rev")
+    ]
+    assert len([f for f in os.listdir(".") if f.endswith("_dark.csv")]) == 4
+    assert control.gantry.moves[-1] == "load"
@@ -0,0 +1,28 @@
+import pytest
+
+from jvbot.hardware.control3 import Control_Keithley
+from jvbot.hardware.shutter import SimulatedShutter
+
+
+def keithley(shutter):
+    ck = Control_Keithley.__new__(Control_Keithley)  # no instrument
+    ck.shutter = shutter
+
+    def no_sweep(*args, **kwargs):
+        raise AssertionError("swept with the lamp on")
+
+    ck._jv_sweeps = no_sweep
+    return ck
+
+
+@pytest.mark.parametrize("kwargs", [{"light": False}, {"light_and_dark": True}])
+def test_dark_jv_refused_with_simulated_shutter(kwargs):
+    ck = keithley(SimulatedShutter())
+    with pytest.raises(RuntimeError, match="shutter is simulated"):
+        ck.jv("x01_P1", "fwd", -0.1, 1.2, preview=False, **kwargs)
+    with pytest.raises(RuntimeError, match="shutter is simulated"):
+        ck._list_sweep([0.0, 0.5], light=False)
+
+
+def test_replayed_shutter_allows_dark_sweeps():
+    keithley(SimulatedShutter(blocks_light=True)).require_shutter()
@@ -0,0 +1,58 @@
+import pytest
+
+from jvbot.jvbot import Control
+from jvbot.stability import StabilityScheduler
+from jvbot.hardware.gantry import Gantry
+
+
+def make_control(control):
+    c = Control.__new__(Control)  # no hardware
+    c.gantry, c.control_keithley, c.status, c.index = control.gantry, control.control_keithley, None, None
+    control.set_tray("10mm_v2")
+    c.tray = control.tray
+    return c
+
+
+def test_scheduler_uses_estimates_until_measured():
+    scheduler = StabilityScheduler(["A1", "A2"], period=10)
+    assert scheduler.cycle_time() is None
+    scheduler.estimate("A1", move_time=1, sweep_time=2)
+    scheduler.estimate("A2", move_time=1, sweep_time=2)
+    assert scheduler.cycle_time() == 6
+    scheduler.record("A1", move_time=3, sweep_time=4)
+    assert scheduler.cycle_time() == 10
+    assert scheduler.feasible() and not scheduler.feasible(period=9)
+
+
+def test_infeasible_period_raises_before_the_first_cycle(control, in_tmp):
+    c = make_control(control)
+    # 4 slots x (1 s move + 2 s sweep) do not fit in 10 s
+    with pytest.raises(ValueError, match="estimated"):
+        c.stability_tray(["A1", "A2", "A3", "A4"], "fwd", -0.1, 1.2, period=10, cycles=3)
+    assert control.tray.visited == []
+    assert control.gantry.moves == []  # never left
+
+
+def test_stretched_run_survives_unreadable_files_and_returns_to_load(control, in_tmp, capsys):
+    c = make_control(control)
+    scheduler = c.stability_tray(["A1", "A2"], "fwd", -0.1, 1.2, period=1, cycles=1, on_infeasible="stretch")
+    assert scheduler.period == pytest.approx(6)
+    assert control.tray.visited == ["A1", "A2"]
+    assert control.gantry.moves[-1] == "load"
+    # FakeKeithley writes empty csvs, which cannot be analyzed
+    assert capsys.readouterr().out.count("Could not analyze") == 2
+
+
+def test_gantry_move_duration_follows_motion_profile():
+    g = Gantry.__new__(Gantry)  # no serial port
+    g.motion_profile = {
+        "traverse": {"speed": 50},
+        "lift": {"speed": 1.0},
+        "approach": {"speed": 0.25},
+        "approach_distance": 0.5,
+    }
+    g.ZHOP_HEIGHT = -15
+    g._Gantry__ZLIM = 0
+    # lift 15 mm, traverse 10 mm, lower 14.5 mm, approach 0.5 mm
+    assert g.move_duration([0, 0, 50], [10, 0, 50]) == pytest.approx(15 + 0.2 + 14.5 + 2)
+    assert g.move_duration([0, 0, 50], [10, 0, 50], zhop_height=2) == pytest.approx(2 + 0.2 + 1.5 + 2)
@@ -0,0 +1,52 @@
+import json
+import threading
+import time
+import urllib.request
+
+from jvbot.status import CURVE_POINTS, ScanProgress, StatusFeed, StatusServer, decimate
+
+
+def test_slow_reader_drops_oldest_events():
+    feed = StatusFeed(maxlen=4)
+    for n in range(10):
+        feed.publish("slot", slot=f"A{n}")
+    sequence, events = feed.since(0, timeout=0)
+    assert sequence == 10
+    assert [e["slot"] for e in events] == ["A6", "A7", "A8", "A9"]  # A0-A5 were dropped
+    assert feed.snapshot()[1]["slot"]["slot"] == "A9"  # latest state survives
+    assert feed.since(10, timeout=0) == (10, [])
+
+
+def test_since_wakes_up_on_publish():
+    feed = StatusFeed()
+    threading.Timer(0.05, feed.publish, args=("phase",), kwargs={"phase": "measuring"}).start()
+    t0 = time.time()
+    sequence, events = feed.since(0, timeout=5)
+    assert time.time() - t0 < 2
+    assert (sequence, [e["phase"] for e in events]) == (1, ["measuring"])
+
+
+def test_curves_are_decimated_keeping_the_last_point():
+    x, y = decimate(range(1000), range(1000))
+    assert len(x) <= CURVE_POINTS
+    assert (x[0], x[-1], y[-1]) == (0, 999, 999)
+    assert decimate([0, 1], [2, 3]) == ([0, 1], [2, 3])
+
+
+def test_progress_and_status_endpoint():
+    feed = StatusFeed()
+    progress = ScanProgress(feed, total=2, scan="10mm_v2")
+    progress.slot("A1")
+    progress.slot_done()
+    progress.slot("A2")
+    server = StatusServer(feed, port=0).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/status", timeout=5) as reply:
+            state = json.load(reply)
+    finally:
+        server.stop()
+    assert state["slot"]["slot"] == "A2" and state["slot"]["index"] == 1
+    assert state["slot"]["eta"] is not None
+    assert state["phase"]["phase"] == "moving"
+    progress.finish()
+    assert feed.snapshot()[1]["phase"]["phase"] == "idle"
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from jvbot.hardware.control3 import Control_Keithley
+from jvbot.hardware.timeseries import TimeSeriesBuffer
+
+
+def test_buffer_spills_full_chunks_and_reads_everything_back(tmp_path):
+    fpath = tmp_path / "x01_jsc.csv"
+    buffer = TimeSeriesBuffer(str(fpath), ["Time", "Jsc (mA/cm2)"], chunk_size=4, flush_interval=1e9)
+    for n in range(10):
+        buffer.append(n, n * 0.5)
+    lines = fpath.read_text().splitlines()
+    assert lines[0] == ",Time,Jsc (mA/cm2)"
+    assert len(lines) == 1 + 8  # two full chunks spilled, two rows still in memory
+
+    assert np.array_equal(buffer.tail(), [[6, 3.0], [7, 3.5], [8, 4.0], [9, 4.5]])
+    assert np.array_equal(buffer.column("Time", 2), [8, 9])
+
+    data = buffer.read()
+    assert len(buffer) == len(data) == 10
+    assert list(data.index) == list(range(10))
+    assert np.allclose(data["Jsc (mA/cm2)"], np.arange(10) * 0.5)
+
+
+def test_buffer_flushes_on_interval_and_close(tmp_path):
+    fpath = tmp_path / "x01_voc.csv"
+    with TimeSeriesBuffer(str(fpath), ["Time", "Voc (V)"], chunk_size=100, flush_interval=0) as buffer:
+        buffer.append(0.0, 1.1)
+        assert len(fpath.read_text().splitlines()) == 2  # flush_interval elapsed
+        buffer._last_flush = float("inf")
+        buffer.append(1.0, 1.2)
+    assert len(fpath.read_text().splitlines()) == 3  # written on close
+
+
+def test_spo_returns_saved_series_as_dataframe(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    area = 0.07
+
+    def generated_current(v):  # model diode, in A
+        return (20 - 1e-9 * (np.exp(v / 0.0386) - 1)) * area / 1000
+
+    ck = Control_Keithley.__new__(Control_Keithley)  # no instrument
+    ck.area, ck.compliance_voltage, ck.status, ck.index = area, 2, None, None
+    ck.keithley = SimpleNamespace(source_voltage=0, enable_source=lambda: None, disable_source=lambda: None)
+    ck._source_voltage_measure_current = ck.open_shutter = ck.close_shutter = lambda: None
+    ck._measure = lambda: (ck.keithley.source_voltage, -generated_current(ck.keithley.source_voltage))
+    data = ck.spo("x01_P1", 0.5, 0.02, 0, 0, 30, preview=False)
+    assert len(data) == 30
+    v = np.linspace(0, 1, 10001)
+    pmax = (v * generated_current(v)).max() / area * 1000  # mW/cm2
+    assert data["Power Density (mW/cm2)"].iloc[-1] == pytest.approx(pmax, rel=0.01)
+    assert len((tmp_path / "x01_P1_SPO.csv").read_text().splitlines()) == 31
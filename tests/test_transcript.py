@@ -0,0 +1,64 @@
+import pytest
+
+from jvbot.hardware.gantry import Gantry
+from jvbot.hardware.transcript import (
+    ReplayConnection,
+    ReplaySerial,
+    RecordingConnection,
+    Transcript,
+    TranscriptMismatch,
+)
+
+
+def session(gantry):
+    gantry.write("M17")
+    gantry.update()
+    return gantry.position
+
+
+def test_gantry_session_replays_with_recorded_replies(fake_serial, tmp_path):
+    fpath = str(tmp_path / "run.jsonl")
+    transcript = Transcript(fpath)
+    recorded = session(Gantry(handle=fake_serial, record=transcript))
+    transcript.close()
+
+    replay = ReplaySerial(Transcript(fpath, mode="r"))
+    assert session(Gantry(port="replay", handle=replay)) == recorded == [10.0, 20.0, 30.0]
+    assert replay.done
+
+
+def test_replay_fails_at_the_first_divergent_command(fake_serial, tmp_path):
+    fpath = str(tmp_path / "run.jsonl")
+    transcript = Transcript(fpath)
+    session(Gantry(handle=fake_serial, record=transcript))
+    transcript.close()
+
+    gantry = Gantry(port="replay", handle=ReplaySerial(Transcript(fpath, mode="r")))
+    with pytest.raises(TranscriptMismatch, match="M18"):
+        gantry.write("M18")
+    loose = Gantry(port="replay", handle=ReplaySerial(Transcript(fpath, mode="r"), strict=False))
+    loose.write("M18")  # replies are replayed in order regardless
+
+
+def test_visa_bytes_and_errors_round_trip(tmp_path):
+    class Resource:
+        def read_bytes(self, n):
+            return bytes(range(256))[:n]
+
+        def enable_event(self, *args):
+            raise NotImplementedError("no events on this interface")
+
+    fpath = str(tmp_path / "run.jsonl")
+    transcript = Transcript(fpath)
+    connection = RecordingConnection(Resource(), transcript)
+    raw = connection.read_bytes(256)
+    with pytest.raises(NotImplementedError):
+        connection.enable_event(1, 2)
+    transcript.close()
+
+    replay = ReplayConnection(Transcript(fpath, mode="r"))
+    assert replay.read_bytes(256) == raw
+    with pytest.raises(NotImplementedError, match="no events"):
+        replay.enable_event(1, 2)
+    with pytest.raises(TranscriptMismatch, match="end of the transcript"):
+        replay.read_bytes(1)
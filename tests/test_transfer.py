@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from jvbot.hardware.transfer import HEADER, BinaryTransfer
+
+
+class FakeInstrument:
+    """
+    logs writes and replies to the next query with a binary block of the given readings
+    """
+
+    def __init__(self):
+        self.written = []
+        self.reply = b""
+        self.adapter = SimpleNamespace(connection=SimpleNamespace(read_bytes=self.read_bytes))
+
+    def write(self, command):
+        self.written.append(command)
+
+    def read_bytes(self, n):
+        chunk, self.reply = self.reply[:n], self.reply[n:]
+        return chunk
+
+    def queue(self, readings, dtype="<f4", header=HEADER):
+        self.reply = header + np.asarray(readings, dtype=dtype).tobytes() + b"\n"
+
+
+def test_query_decodes_readings_and_sets_elements_once():
+    instrument = FakeInstrument()
+    transfer = BinaryTransfer(instrument)
+    readings = [[0.1, -2e-3], [0.2, -1e-3], [0.3, 5e-4]]
+    instrument.queue(readings)
+    out = transfer.query(":READ?", 3)
+    assert out.shape == (3, 2)
+    assert np.allclose(out, readings)
+    assert instrument.reply == b""  # line feed consumed
+
+    instrument.queue([[1e-3]])
+    assert transfer.query(":CALC3:DATA?", 1, ("CURR",))[0, 0] == pytest.approx(1e-3)
+    instrument.queue([[1e-3]])
+    transfer.query(":CALC3:DATA?", 1, ("CURR",))
+    assert instrument.written.count(":FORM:ELEM CURR") == 1
+
+
+def test_big_endian_and_bad_header():
+    instrument = FakeInstrument()
+    transfer = BinaryTransfer(instrument, little_endian=False)
+    assert ":FORM:BORD NORM" in instrument.written
+    instrument.queue([[1.5, 2.5]], dtype=">f4")
+    assert list(transfer.query(":READ?", 1)[0]) == [1.5, 2.5]
+    instrument.queue([[1.5, 2.5]], dtype=">f4", header=b"1.")
+    with pytest.raises(ValueError, match="header"):
+        transfer.query(":READ?", 1)
+
+
+def test_ascii_readings_restores_binary():
+    instrument = FakeInstrument()
+    transfer = BinaryTransfer(instrument)
+    transfer.set_elements(("CURR",))
+    instrument.written.clear()
+    with transfer.ascii_readings() as keithley:
+        assert keithley is instrument
+        assert instrument.written[0] == ":FORM:DATA ASCII"
+    assert instrument.written[-2:] == [":FORM:DATA SREAL", ":FORM:BORD SWAP"]
+    assert transfer.elements is None  # written again on the next query